@@ -2,6 +2,7 @@
 import json
 import uuid
 import time
+import threading
 from typing import Optional, Dict, Any
 
 import re
@@ -115,32 +116,54 @@ def _coerce_json(s):
         raise
 
 # =========================================
-# ===== Module-level evaluator agent ======
+# ===== Lazily built evaluator model ======
 # =========================================
+# Built on the first evaluation or "ping" rather than at import, so the
+# container starts quickly and the generator's pre-warm pays for the build.
+# The model is shared; each evaluation gets its own Agent, so concurrent
+# evaluations in one session never share (or grow) a conversation history.
+_started_at = time.time()
+_served = 0
+_model_lock = threading.Lock()
+evaluator_model: Optional[BedrockModel] = None
+
+
+def get_evaluator_model() -> BedrockModel:
+    global evaluator_model
+    with _model_lock:
+        if evaluator_model is None:
+            evaluator_model = BedrockModel(
+                model_id=EVALUATOR_MODEL_ID,
+                max_tokens=8192,
+                temperature=0.8,
+                top_k=50,
+                top_p=0.95,
+            )
+        return evaluator_model
+
+
+def build_evaluator_agent() -> Agent:
+    # Prepare evaluator agent configuration
+    evaluator_agent_kwargs = {"model": get_evaluator_model()}
+
+    # Add tools if available
+    try:
+        evaluator_agent_kwargs["tools"] = [build_eval_plan_v2, load_analyzer_runs_v2]
+    except Exception as e:
+        print(f"Tool listing failed: {e}")
 
-# Step 1: Initialize BedrockModel at module load (only if tool is available)
-evaluator_model = BedrockModel(
-    model_id=EVALUATOR_MODEL_ID,
-    max_tokens=8192,
-    temperature=0.8,
-    top_k=50,
-    top_p=0.95,
-)
-
-# Prepare evaluator agent configuration
-evaluator_agent_kwargs = {"model": evaluator_model}
-
-# Add tools if available
-try:
-    evaluator_agent_kwargs["tools"] = [build_eval_plan_v2, load_analyzer_runs_v2]
-except Exception as e:
-    print(f"Tool listing failed: {e}")
+    # Add system prompt
+    evaluator_agent_kwargs["system_prompt"] = evaluator_system_prompt()
+    return Agent(**evaluator_agent_kwargs)
 
-# Add system prompt
-evaluator_agent_kwargs["system_prompt"] = evaluator_system_prompt()
 
-# Initialize evaluator agent once with the right capabilities
-evaluator_agent = Agent(**evaluator_agent_kwargs)
+def _instance_info() -> Dict[str, Any]:
+    """Whether this request is the instance's first (its cold start) and how long it has been up."""
+    global _served
+    with _model_lock:
+        _served += 1
+        cold = _served == 1
+    return {"cold_start": cold, "uptime_s": round(time.time() - _started_at, 1)}
 
 # =========================================
 # ===== Bedrock AgentCore Entrypoint --- Initialize the agentcore runtime ======
@@ -150,7 +173,16 @@ app = BedrockAgentCoreApp()
 @app.entrypoint
 def invoke(payload: Dict[str, Any]):
     """AgentCore Runtime entrypoint function"""
+    instance = _instance_info()
     try:
+        if payload.get("action") == "ping":
+            # Pre-warm from the generator: build the model now, before the first evaluation
+            get_evaluator_model()
+            return {
+                "statusCode": 200,
+                "body": json.dumps({"status": "ready", "instance": instance})
+            }
+
         analyzer_payload = payload.get("analyzer_payload")
         if not analyzer_payload:
             return {
@@ -160,7 +192,7 @@ def invoke(payload: Dict[str, Any]):
 
         # Step 1: Run the evaluator agent
         text = "Please analyze this analyzer output and provide evaluation metrics: " + json.dumps(analyzer_payload)
-        response = evaluator_agent(text)
+        response = build_evaluator_agent()(text)
 
         # Step 2: Parse agent output using the same helper function as smart goal generator
         parsed = _coerce_json(response)
@@ -170,7 +202,8 @@ def invoke(payload: Dict[str, Any]):
             "run_id": str(uuid.uuid4()),
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
             "evaluator_output": parsed,
-            "analyzer_input": analyzer_payload
+            "analyzer_input": analyzer_payload,
+            "instance": instance
         }
 
         # Step 4: Return HTTP-style response
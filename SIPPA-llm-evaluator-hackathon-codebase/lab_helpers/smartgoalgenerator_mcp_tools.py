@@ -10,11 +10,13 @@ import chardet
 from docx import Document
 from PyPDF2 import PdfReader
 
-import json, time, uuid, re, mimetypes
+import glob, json, time, uuid, re, mimetypes, heapq, mmap
 from typing import Tuple, List, Optional
 
 from botocore.exceptions import BotoCoreError, ClientError
 
+from lab_helpers.smartgoalgenerator_run_store import get_indexed_runs, get_run_store
+
 
 # Globals
 s3_client = boto3.client("s3")
@@ -128,7 +130,13 @@ def _save_formatted_to_file(formatted_text: str, log_path: str):
         f.write(formatted_text + "\n")
 
 
-def _read_jsonl(path: str):
+def _read_jsonl(path: str, limit: int | None = None):
+    """
+    Read JSONL records in file order. With 'limit', only the newest 'limit'
+    records are read, from the end of the file (see _tail_jsonl).
+    """
+    if limit:
+        return _tail_jsonl(path, limit)
     items = []
     if not os.path.exists(path):
         return items
@@ -144,25 +152,138 @@ def _read_jsonl(path: str):
     return items
 
 
+def _iter_jsonl_reverse(path: str):
+    """
+    Yield JSONL records from the last line backwards.
+    The file is memory-mapped and each step only scans back to the previous
+    newline, so reading k records touches just the last k lines' pages.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = size
+            while end > 0:
+                start = mm.rfind(b"\n", 0, end) + 1
+                line = mm[start:end].strip()
+                end = start - 1
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # e.g. a partially written last line
+
+
+def _log_segments(path: str) -> list:
+    """
+    path and its rotated segments ({base}-*{ext}, as the results writer names
+    them), newest first.
+    """
+    base, ext = os.path.splitext(path)
+    rotated = []
+    for segment in glob.glob(f"{base}-*{ext}"):
+        try:
+            rotated.append((os.path.getmtime(segment), segment))
+        except FileNotFoundError:
+            continue
+    current = [path] if os.path.exists(path) else []
+    return current + [segment for _, segment in sorted(rotated, reverse=True)]
+
+
+def _tail_jsonl(path: str, limit: int) -> list:
+    """
+    Newest 'limit' records, oldest first, in O(limit) regardless of file size.
+    Reads backwards through the live file and then its rotated segments, newest
+    first, until 'limit' records are found. Relies on results.jsonl being
+    appended in timestamp order; if the records seen while reading backwards
+    are out of order, falls back to a full scan with a bounded heap.
+    """
+    segments = _log_segments(path)
+    ts = lambda r: str(r.get("timestamp", ""))
+
+    tail, in_order = [], True
+    for rec in (rec for segment in segments for rec in _iter_jsonl_reverse(segment)):
+        if tail and ts(rec) > ts(tail[-1]):
+            in_order = False
+            break
+        if len(tail) == limit:
+            break  # one record past the tail was checked for ordering
+        tail.append(rec)
+
+    if in_order:
+        return tail[::-1]
+
+    print(f"⚠️ {path} is not in timestamp order; scanning the whole log")
+    records = (rec for segment in segments for rec in _read_jsonl(segment))
+    return sorted(heapq.nlargest(limit, records, key=ts), key=ts)
+
+
 # --- Internal helper function ----
 # ---------- Build SMART-goal cases (rubric-driven) ----------
 # @tool  ---------- Low-level loaders as tools ----------
-def load_analyzer_runs_v2(analyzer_json_src: str, limit: int | None = None) -> dict:
-    # Need to define input source
+def load_analyzer_runs_v2(
+    analyzer_json_src: str,
+    limit: int | None = None,
+    data_source: str | None = None,
+    model_id: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+) -> dict:
     """
-    Load analyzer outputs (JSONL), sorted by timestamp ASC. Optionally keep only latest 'limit'.
+    Load analyzer runs sorted by timestamp ASC. Optionally keep only the latest 'limit',
+    and filter by data_source, model_id and a start/end timestamp window.
+    analyzer_json_src is either a results .jsonl path (answered from its index) or the runs themselves.
     """
-    #runs = _read_jsonl(analyzer_json_src)
-    runs = analyzer_json_src
-    runs.sort(key=lambda r: r.get("timestamp", ""))
+    return {"runs": _load_runs(analyzer_json_src, limit, data_source, model_id, start, end)}
+
+
+def _load_runs(analyzer_json_src, limit=None, data_source=None, model_id=None, start=None, end=None) -> list:
+    """
+    Resolve analyzer_json_src to runs, oldest first.
+    - path to a results .jsonl log: latest-N without filters is read from the end of the
+      file; filtered queries go through the indexed run store (also for a .sqlite index path)
+    - list / dict / JSON string of runs passed inline: filtered, then the latest 'limit' are
+      selected with a bounded heap instead of a full sort
+    """
+    src = analyzer_json_src
+    if isinstance(src, str):
+        if os.path.exists(src):
+            if limit and not (data_source or model_id or start or end) and not src.endswith(".sqlite"):
+                return _read_jsonl(src, limit)
+            store = get_run_store(src) if src.endswith(".sqlite") else get_indexed_runs(src)
+            return store.find(limit=limit, data_source=data_source, model_id=model_id, start=start, end=end)
+        try:
+            src = json.loads(src)
+        except json.JSONDecodeError:
+            return []
+    if isinstance(src, dict):
+        src = src.get("runs") or [src]
+
+    ts = lambda r: str(r.get("timestamp", ""))
+    runs = [
+        r for r in (src or [])
+        if isinstance(r, dict)
+        and (not data_source or r.get("data_source") == data_source)
+        and (not model_id or r.get("model_id") == model_id)
+        and (not start or ts(r) >= start)
+        and (not end or ts(r) <= end)
+    ]
     if limit:
-        runs = runs[-limit:]
-    return {"runs": runs}
+        return sorted(heapq.nlargest(limit, runs, key=ts), key=ts)
+    return sorted(runs, key=ts)
 
 # @tool  ---------- Planning tool that abstracts use cases ----------
-def build_eval_plan_v2(analyzer_json_src: str, limit=50) -> dict:
+def build_eval_plan_v2(
+    analyzer_json_src: str,
+    limit=50,
+    data_source: str | None = None,
+    model_id: str | None = None,
+) -> dict:
     """
     Decide which evaluation to run based on analyzer_outputs.jsonl contents.
+    Only the latest 'limit' runs (optionally for one data_source / model_id) are read.
     Returns a plan with:
       {
         "evaluation_type": "engagement_vs_clinician" | "smart_goals_rubric",
@@ -171,7 +292,7 @@ def build_eval_plan_v2(analyzer_json_src: str, limit=50) -> dict:
         "cases": [ ... normalized cases ... ]
       }
     """
-    runs = load_analyzer_runs_v2(analyzer_json_src=analyzer_json_src, limit=limit)["runs"]
+    runs = _load_runs(analyzer_json_src, limit=limit, data_source=data_source, model_id=model_id)
     cases = runs
 #    cases = _build_smart_goal_cases_v2(runs)
     return {
@@ -0,0 +1,255 @@
+"""
+Indexed store for analyzer runs (the records in outputs/results.jsonl).
+
+results.jsonl stays the append-only log; this SQLite sidecar indexes it by
+timestamp, model_id and data_source so the evaluator can ask for
+"latest N runs", "runs for data_source X" or "runs for model Y between dates"
+in O(log n + k) instead of reading and sorting the whole history.
+The sidecar remembers the byte offset (and inode) it has ingested up to, so each
+sync only reads lines appended since the last query and survives log rotation:
+rotated segments ({base}-*{ext}) written since then are ingested too.
+"""
+import glob
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp   TEXT NOT NULL DEFAULT '',
+    model_id    TEXT,
+    data_source TEXT,
+    record      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_timestamp   ON runs (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_runs_data_source ON runs (data_source, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_runs_model       ON runs (model_id, timestamp, id);
+CREATE TABLE IF NOT EXISTS log_position (
+    log_path TEXT PRIMARY KEY,
+    inode    INTEGER,
+    offset   INTEGER
+);
+"""
+
+
+def index_path_for(jsonl_path: str) -> str:
+    """Sidecar index location for a JSONL log."""
+    return f"{jsonl_path}.index.sqlite"
+
+
+class RunStore:
+    """SQLite index over analyzer runs; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction; IMMEDIATE so concurrent syncs (threads or workers) serialize."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # ----- writes -----
+    @staticmethod
+    def _insert(conn, records: List[dict]):
+        rows = [
+            (
+                str(r.get("timestamp", "")),
+                r.get("model_id"),
+                r.get("data_source"),
+                json.dumps(r, ensure_ascii=False),
+            )
+            for r in records
+        ]
+        conn.executemany(
+            "INSERT INTO runs (timestamp, model_id, data_source, record) VALUES (?, ?, ?, ?)", rows
+        )
+
+    def add_runs(self, records: List[dict]):
+        with self._transaction() as conn:
+            self._insert(conn, records)
+
+    def sync_from_jsonl(self, jsonl_path: str) -> int:
+        """
+        Ingest lines appended to jsonl_path since the last sync. The first sync
+        ingests every rotated segment, oldest first; after rotations, the
+        remainder of the segment last read and every newer segment come first.
+        Returns the number of records added.
+        """
+        key = os.path.abspath(jsonl_path)
+        try:
+            st = os.stat(jsonl_path)
+        except FileNotFoundError:
+            return 0
+
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT inode, offset FROM log_position WHERE log_path = ?", (key,)
+            ).fetchone()
+            inode, offset = row if row else (None, 0)
+
+            records = []
+            if inode is None:
+                for segment, _ in self._rotated_segments(jsonl_path, st.st_ino):
+                    records += self._read_from(segment, 0)[0]
+            elif inode != st.st_ino:
+                records += self._read_rotated_since(conn, jsonl_path, st.st_ino, inode, offset)
+                offset = 0
+            elif st.st_size < offset:
+                offset = 0  # truncated in place
+
+            if st.st_size > offset:
+                new_records, offset = self._read_from(jsonl_path, offset)
+                records += new_records
+
+            if records:
+                self._insert(conn, records)
+            conn.execute(
+                "INSERT INTO log_position (log_path, inode, offset) VALUES (?, ?, ?) "
+                "ON CONFLICT(log_path) DO UPDATE SET inode = excluded.inode, offset = excluded.offset",
+                (key, st.st_ino, offset),
+            )
+        return len(records)
+
+    @staticmethod
+    def _read_from(path: str, offset: int):
+        """Complete JSONL records after offset, and the offset just past the last one."""
+        records = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial line still being written
+                offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records, offset
+
+    @staticmethod
+    def _rotated_segments(jsonl_path: str, current_inode: int) -> List[Tuple[str, int]]:
+        """(path, inode) of the rotated segments of jsonl_path, oldest first."""
+        base, ext = os.path.splitext(jsonl_path)
+        segments = []
+        for candidate in glob.glob(f"{base}-*{ext}"):
+            try:
+                st = os.stat(candidate)
+            except FileNotFoundError:
+                continue
+            if st.st_ino != current_inode:
+                segments.append((st.st_mtime, candidate, st.st_ino))
+        return [(path, inode) for _, path, inode in sorted(segments)]
+
+    def _read_rotated_since(self, conn, jsonl_path: str, current_inode: int, inode: int, offset: int) -> List[dict]:
+        """Records rotated out of jsonl_path since the last sync, which stopped at offset in inode."""
+        segments = self._rotated_segments(jsonl_path, current_inode)
+        inodes = [i for _, i in segments]
+        if inode in inodes:
+            k = inodes.index(inode)
+            records = self._read_from(segments[k][0], offset)[0]
+            for segment, _ in segments[k + 1:]:
+                records += self._read_from(segment, 0)[0]
+            return records
+        # The segment we were reading is gone (deleted or archived): take what is newer than the index
+        newest = conn.execute("SELECT MAX(timestamp) FROM runs").fetchone()[0] or ""
+        return [
+            r for segment, _ in segments for r in self._read_from(segment, 0)[0]
+            if str(r.get("timestamp", "")) > newest
+        ]
+
+    # ----- queries (results are returned oldest first, like the JSONL loader) -----
+    def _query(self, where: str, params: tuple, limit: Optional[int]) -> List[dict]:
+        sql = f"SELECT record FROM runs {where} ORDER BY timestamp DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params = params + (int(limit),)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(r[0]) for r in reversed(rows)]
+
+    def find(
+        self,
+        limit: Optional[int] = None,
+        data_source: Optional[str] = None,
+        model_id: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> List[dict]:
+        """
+        Runs matching every given filter, newest `limit` of them.
+        start/end bound the timestamp inclusively ("%Y-%m-%d %H:%M:%S" strings).
+        """
+        clauses, params = [], ()
+        if data_source:
+            clauses, params = clauses + ["data_source = ?"], params + (data_source,)
+        if model_id:
+            clauses, params = clauses + ["model_id = ?"], params + (model_id,)
+        if start:
+            clauses, params = clauses + ["timestamp >= ?"], params + (start,)
+        if end:
+            clauses, params = clauses + ["timestamp <= ?"], params + (end,)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        return self._query(where, params, limit)
+
+    def latest(self, limit: Optional[int] = 50) -> List[dict]:
+        return self.find(limit=limit)
+
+    def for_data_source(self, data_source: str, limit: Optional[int] = None) -> List[dict]:
+        return self.find(limit=limit, data_source=data_source)
+
+    def for_model(
+        self,
+        model_id: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        return self.find(limit=limit, model_id=model_id, start=start, end=end)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+
+# =========================================
+# ===== One store per index file ==========
+# =========================================
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_run_store(path: str) -> RunStore:
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = RunStore(path)
+            _stores[key] = store
+        return store
+
+
+def get_indexed_runs(jsonl_path: str) -> RunStore:
+    """Run store indexing jsonl_path, brought up to date with the log."""
+    store = get_run_store(index_path_for(jsonl_path))
+    store.sync_from_jsonl(jsonl_path)
+    return store
@@ -1,4 +1,5 @@
 import json
+import threading
 import time
 import uuid
 import urllib.parse
@@ -71,6 +72,31 @@ def invoke_endpoint_streaming(
             print("Failed to invoke agent endpoint: %s", str(e))
             raise
 
+def prewarm_runtime(agent_arn: str, region: str, session_id: str, bearer_token: str, actor_id: str = None):
+    """
+    Fire-and-forget "prewarm" for this session (run at login): starts the
+    runtime session and its evaluator instance before the first generation.
+    Runs in a thread, so it never delays the page.
+    """
+    escaped_arn = urllib.parse.quote(agent_arn, safe="")
+    url = f"https://bedrock-agentcore.{region}.amazonaws.com/runtimes/{escaped_arn}/invocations"
+    headers = {
+        "Authorization": f"Bearer {bearer_token}",
+        "Content-Type": "application/json",
+        "X-Amzn-Bedrock-AgentCore-Runtime-Session-Id": session_id,
+    }
+    body = {"action": "prewarm", "session_id": session_id, "actor_id": actor_id}
+
+    def _send():
+        try:
+            response = requests.post(url, params={"qualifier": "DEFAULT"}, headers=headers, json=body, timeout=30)
+            print(f"🔥 Pre-warm: {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            print(f"Pre-warm failed: {e}")
+
+    threading.Thread(target=_send, daemon=True).start()
+
+
 class ChatManager:
     def format_response_text(self, text):
         """Format response text by unescaping quotes and newlines"""
@@ -273,7 +299,7 @@ class ChatManager:
             accumulated_response = ""
 
             # Include model_id in payload if available
-            payload_data = {"prompt": prompt, "actor_id": actor_id}
+            payload_data = {"prompt": prompt, "actor_id": actor_id, "priority": "interactive"}
             if "selected_model_id" in st.session_state:
                 payload_data["model_id"] = st.session_state["selected_model_id"]
 
@@ -356,6 +382,7 @@ class ChatManager:
                 payload_data = {
                     "prompt": default_prompt,
                     "actor_id": actor_id,
+                    "priority": "interactive",
                 }
                 if "selected_model_id" in st.session_state:
                     payload_data["model_id"] = st.session_state["selected_model_id"]
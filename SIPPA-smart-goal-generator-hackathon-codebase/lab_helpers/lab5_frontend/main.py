@@ -1,6 +1,6 @@
 import os
 import streamlit as st
-from chat import ChatManager, invoke_endpoint_streaming
+from chat import ChatManager, invoke_endpoint_streaming, prewarm_runtime
 import uuid
 from streamlit_cognito_auth import CognitoAuthenticator
 import json
@@ -46,12 +46,16 @@ qualifier = "DEFAULT"
 # Available model IDs
 AVAILABLE_MODELS = {
     "Claude 3.7 Sonnet": "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+    "Auto (routed per document)": "auto",
     "OpenAI GPT": "openai.gpt-oss-120b-1:0",
     "Amazon Nova Premier": "us.amazon.nova-premier-v1:0",
     "Cohere Command-R": "cohere.command-r-v1:0", 
     "Mistral 7b Instruct": "mistral.mistral-7b-instruct-v0:2"
 }
 
+# Fast model whose goals are shown while the selected model is still refining
+DRAFT_MODEL_NAME = "Mistral 7b Instruct"
+
 def format_response_text(text):
     """Format response text by unescaping quotes and newlines"""
     if not text:
@@ -188,6 +192,81 @@ def parse_smart_goals(response_text):
         print(f"Error parsing goals: {e}")
         return [{"goal_number": 1, "description": response_text}]
 
+def render_goal_cards(goals):
+    """Render goals as cards"""
+    for i, goal in enumerate(goals, 1):
+        st.markdown(f"""
+        <div class="goal-card">
+            <h5>🎯 Goal {i}</h5>
+            <p>{goal.get('description', 'No description available')}</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+
+def stream_progressive_goals(payload, placeholder):
+    """
+    Read the runtime's progressive events: the draft goals are shown in the
+    placeholder as soon as they arrive and cleared when the refined set is in.
+    Returns (final response text, draft info or None).
+    """
+    final_text = None
+    draft_info = None
+    model_names = {model_id: name for name, model_id in AVAILABLE_MODELS.items()}
+
+    for chunk in invoke_endpoint_streaming(
+        agent_arn=st.session_state["agent_arn"],
+        payload=payload,
+        bearer_token=st.session_state["auth_access_token"],
+        session_id=st.session_state["session_id"],
+    ):
+        try:
+            event = json.loads(chunk)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(event, dict) or "event" not in event:
+            # Plain response (runtime without progressive mode)
+            final_text = chunk
+            continue
+
+        response = event.get("response") or {}
+        if event["event"] == "draft":
+            body = json.loads(response.get("body") or "{}")
+            goals = body.get("model_output", {}).get("smart_goals", [])
+            draft_info = {
+                "model_used": model_names.get(event["model_id"], event["model_id"]),
+                "elapsed_time": event["latency_ms"] / 1000,
+            }
+            with placeholder.container():
+                st.info(
+                    f"⚡ Draft from {draft_info['model_used']} in {draft_info['elapsed_time']:.1f}s "
+                    "- refining with the selected model..."
+                )
+                render_goal_cards(goals)
+        elif event["event"] == "final":
+            final_text = json.dumps(response)
+
+    placeholder.empty()
+    return final_text or "", draft_info
+
+
+def cancel_abandoned_request():
+    """
+    A run that was interrupted (new upload, rerun, button click) leaves its
+    request in flight; ask the runtime to stop generating for this session.
+    """
+    st.session_state["request_in_flight"] = False
+    try:
+        response = chat_manager.invoke_endpoint_nostreaming(
+            agent_arn=st.session_state["agent_arn"],
+            payload=json.dumps({"action": "cancel", "session_id": st.session_state["session_id"]}),
+            bearer_token=st.session_state["auth_access_token"],
+            session_id=st.session_state["session_id"],
+        )
+        print(f"🛑 Cancel of abandoned request: {getattr(response, 'text', response)}")
+    except Exception as e:
+        print(f"Could not cancel abandoned request: {e}")
+
+
 # Configure page
 st.set_page_config(
     page_title="SMART Goal Generator",
@@ -290,6 +369,21 @@ if "error_message" not in st.session_state:
 
 chat_manager = ChatManager("default")
 
+# Warm this session's runtime and evaluator instances while the user picks a file
+if not st.session_state.get("prewarm_sent"):
+    st.session_state["prewarm_sent"] = True
+    prewarm_runtime(
+        st.session_state["agent_arn"],
+        st.session_state["region"],
+        st.session_state["session_id"],
+        st.session_state["auth_access_token"],
+        st.session_state.get("auth_username"),
+    )
+
+# The previous run ended without reading its response
+if st.session_state.get("request_in_flight") and not st.session_state.get("processing", False):
+    cancel_abandoned_request()
+
 # Main interface layout
 col1, col2 = st.columns([1, 1])
 
@@ -308,6 +402,13 @@ with col1:
     
     st.info(f"**Selected:** {selected_model_name}")
     st.caption(f"Model optimized for healthcare goal generation")
+
+    st.session_state["progressive_results"] = st.checkbox(
+        "⚡ Show a fast draft first",
+        value=True,
+        disabled=selected_model_name == DRAFT_MODEL_NAME,
+        help=f"Shows goals from {DRAFT_MODEL_NAME} within seconds and replaces them with the selected model's goals when ready",
+    )
     st.markdown('</div>', unsafe_allow_html=True)
 
 with col2:
@@ -387,46 +488,70 @@ if st.session_state.get("processing", False) and "uploaded_file_for_processing"
             # Prepare payload
             payload_data = {
                 "prompt": prompt,
+                "session_id": st.session_state["session_id"],
                 "actor_id": st.session_state["auth_username"],
-                "model_id": st.session_state["selected_model_id"]
+                "model_id": st.session_state["selected_model_id"],
+                "priority": "interactive",
             }
+            use_progressive = (
+                st.session_state.get("progressive_results")
+                and selected_model_name_to_process != DRAFT_MODEL_NAME
+            )
+            if use_progressive:
+                payload_data["progressive"] = True
+                payload_data["draft_model_id"] = AVAILABLE_MODELS[DRAFT_MODEL_NAME]
             payload = json.dumps(payload_data)
             
             # Call the agent
             start_time = time.time()
-            response = chat_manager.invoke_endpoint_nostreaming(
-                agent_arn=st.session_state["agent_arn"],
-                payload=payload,
-                bearer_token=st.session_state["auth_access_token"],
-                session_id=st.session_state["session_id"]
-            )
+            draft_info = None
+            st.session_state["request_in_flight"] = True
+            if use_progressive:
+                response_text, draft_info = stream_progressive_goals(payload, st.empty())
+                elapsed_time = time.time() - start_time
+                debug_info = {
+                    "status_code": 200,
+                    "headers": {},
+                    "raw_content": response_text,
+                    "content_type": "text/event-stream"
+                }
+            else:
+                response = chat_manager.invoke_endpoint_nostreaming(
+                    agent_arn=st.session_state["agent_arn"],
+                    payload=payload,
+                    bearer_token=st.session_state["auth_access_token"],
+                    session_id=st.session_state["session_id"]
+                )
             
-            elapsed_time = time.time() - start_time
+                elapsed_time = time.time() - start_time
             
-            # TEMPORARY DEBUG: Store full HTTP response details
-            debug_info = {
-                "status_code": getattr(response, 'status_code', 'Unknown'),
-                "headers": dict(getattr(response, 'headers', {})),
-                "raw_content": None,
-                "content_type": getattr(response, 'headers', {}).get('content-type', 'Unknown')
-            }
+                # TEMPORARY DEBUG: Store full HTTP response details
+                debug_info = {
+                    "status_code": getattr(response, 'status_code', 'Unknown'),
+                    "headers": dict(getattr(response, 'headers', {})),
+                    "raw_content": None,
+                    "content_type": getattr(response, 'headers', {}).get('content-type', 'Unknown')
+                }
             
-            # Extract and parse the response
-            if hasattr(response, 'text'):
-                response_text = response.text
-                debug_info["raw_content"] = response_text
-            elif hasattr(response, 'content'):
-                response_text = response.content.decode('utf-8') if isinstance(response.content, bytes) else str(response.content)
-                debug_info["raw_content"] = response_text
-            else:
-                response_text = str(response)
-                debug_info["raw_content"] = response_text
+                # Extract and parse the response
+                if hasattr(response, 'text'):
+                    response_text = response.text
+                    debug_info["raw_content"] = response_text
+                elif hasattr(response, 'content'):
+                    response_text = response.content.decode('utf-8') if isinstance(response.content, bytes) else str(response.content)
+                    debug_info["raw_content"] = response_text
+                else:
+                    response_text = str(response)
+                    debug_info["raw_content"] = response_text
             
+            st.session_state["request_in_flight"] = False
+
             # Store debug info in session state for display
             st.session_state["debug_response"] = debug_info
             
             # Parse the HTTP response to extract the actual agent output
             filtered_output = {}
+            routing = None
             try:
                 # Try to parse as JSON (HTTP response format)
                 if response_text.strip().startswith('{"statusCode"'):
@@ -445,6 +570,7 @@ if st.session_state.get("processing", False) and "uploaded_file_for_processing"
                             filtered_output['smart_goals'] = agent_output['model_output']['smart_goals']
                         if 'evaluator_result' in agent_output:
                             filtered_output['evaluator_result'] = agent_output['evaluator_result']
+                        routing = agent_output.get('metadata', {}).get('routing')
                         
                         # Convert back to formatted text for display
                         formatted_response = json.dumps(filtered_output, indent=2)
@@ -468,7 +594,9 @@ if st.session_state.get("processing", False) and "uploaded_file_for_processing"
                 "raw_response": formatted_response,
                 "elapsed_time": elapsed_time,
                 "model_used": selected_model_name_to_process,
-                "file_name": uploaded_file_to_process.name
+                "routing": routing,
+                "file_name": uploaded_file_to_process.name,
+                "draft": draft_info
             }
             
             # Add evaluator result if it exists in the filtered output
@@ -564,15 +692,20 @@ if st.session_state.get("generated_goals"):
         st.metric("Model Used", results['model_used'])
     with col3:
         st.metric("Processing Time", f"{results['elapsed_time']:.2f}s")
+    if results.get("routing"):
+        routed_names = {model_id: name for name, model_id in AVAILABLE_MODELS.items()}
+        routed_model = results["routing"]["model_id"]
+        st.caption(
+            f"🧭 Auto-routed to {routed_names.get(routed_model, routed_model)}: {results['routing']['reason']}"
+        )
+    if results.get("draft"):
+        st.caption(
+            f"⚡ Draft from {results['draft']['model_used']} was shown after "
+            f"{results['draft']['elapsed_time']:.1f}s"
+        )
     
     # Display goals
-    for i, goal in enumerate(results['goals'], 1):
-        st.markdown(f"""
-        <div class="goal-card">
-            <h5>🎯 Goal {i}</h5>
-            <p>{goal.get('description', 'No description available')}</p>
-        </div>
-        """, unsafe_allow_html=True)
+    render_goal_cards(results['goals'])
 
 
      # Display goals as JSON
@@ -0,0 +1,332 @@
+"""
+Bedrock batch-inference mode for nightly cohort runs.
+
+Instead of one on-demand invocation per document, the whole cohort is rendered
+into a model-invocation JSONL (one analyzer prompt per document, with the
+document content already injected), submitted as a single
+create_model_invocation_job, and the job's output JSONL is ingested back
+through the runtime's _coerce_json/_normalize_output steps into results.jsonl.
+
+    export_batch_input   S3 prefix -> records.jsonl + manifest (recordId -> data_source)
+    submit_batch_job     upload + create_model_invocation_job
+    ingest_batch_output  *.jsonl.out -> outputs/results.jsonl
+    run_local_batch      process records.jsonl with a local stand-in model (no AWS)
+
+modelInput/modelOutput bodies differ per model family; see _render_model_input
+and _extract_output_text.
+"""
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import boto3
+
+from lab_helpers.smartgoalgenerator_mcp_tools import (
+    _list_s3_uris,
+    _parse_s3_uri,
+    _read_s3_object,
+    fetch_data,
+)
+from lab_helpers.smartgoalgenerator_structured_output import record as record_parse_event, repair_json
+from lab_helpers.smartgoalgenerator_model_util import (
+    get_analyzer_prompt,
+    model_supports_system_prompt,
+)
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+MAX_TOKENS = 4096
+TEMPERATURE = 0.8
+TOP_P = 0.95
+MIN_BATCH_RECORDS = 100   # Bedrock rejects smaller batch inference jobs
+BATCH_USER_PROMPT = "Generate SMART goals for the patient summary above."
+SOURCE_EXTENSIONS = [".docx", ".pdf", ".txt", ".csv", ".json"]
+
+
+def _model_family(model_id: str) -> str:
+    # Cross-region inference profiles prefix the provider with a region group ("us.anthropic...")
+    provider = model_id.split(".")[1] if model_id.split(".")[0] in ("us", "eu", "apac") else model_id.split(".")[0]
+    return provider
+
+
+def _render_model_input(model_id: str, system_prompt: str, user_prompt: str) -> dict:
+    """Native InvokeModel request body for model_id's family."""
+    family = _model_family(model_id)
+    if not model_supports_system_prompt(model_id):
+        user_prompt, system_prompt = f"{system_prompt}\n\nUser request: {user_prompt}", ""
+
+    if family == "anthropic":
+        body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": MAX_TOKENS,
+            "temperature": TEMPERATURE,
+            "messages": [{"role": "user", "content": [{"type": "text", "text": user_prompt}]}],
+        }
+        if system_prompt:
+            body["system"] = system_prompt
+        return body
+    if family == "mistral":
+        prompt = f"{system_prompt}\n\n{user_prompt}" if system_prompt else user_prompt
+        return {"prompt": f"<s>[INST] {prompt} [/INST]", "max_tokens": MAX_TOKENS,
+                "temperature": TEMPERATURE, "top_p": TOP_P}
+    if family == "meta":
+        prompt = "<|begin_of_text|>"
+        if system_prompt:
+            prompt += f"<|start_header_id|>system<|end_header_id|>\n\n{system_prompt}<|eot_id|>"
+        prompt += (f"<|start_header_id|>user<|end_header_id|>\n\n{user_prompt}<|eot_id|>"
+                   "<|start_header_id|>assistant<|end_header_id|>\n\n")
+        return {"prompt": prompt, "max_gen_len": MAX_TOKENS, "temperature": TEMPERATURE, "top_p": TOP_P}
+    if family == "amazon":
+        body = {
+            "schemaVersion": "messages-v1",
+            "messages": [{"role": "user", "content": [{"text": user_prompt}]}],
+            "inferenceConfig": {"maxTokens": MAX_TOKENS, "temperature": TEMPERATURE, "topP": TOP_P},
+        }
+        if system_prompt:
+            body["system"] = [{"text": system_prompt}]
+        return body
+    if family == "cohere":
+        body = {"message": user_prompt, "max_tokens": MAX_TOKENS, "temperature": TEMPERATURE, "p": TOP_P}
+        if system_prompt:
+            body["preamble"] = system_prompt
+        return body
+    if family == "openai":
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        messages.append({"role": "user", "content": user_prompt})
+        return {"messages": messages, "max_completion_tokens": MAX_TOKENS, "temperature": TEMPERATURE, "top_p": TOP_P}
+    raise ValueError(f"Batch inference is not supported for model family '{family}' ({model_id})")
+
+
+def _extract_output_text(model_id: str, model_output: dict) -> str:
+    """Generated text from a native InvokeModel response body."""
+    family = _model_family(model_id)
+    if family == "anthropic":
+        return "".join(c.get("text", "") for c in model_output.get("content", []))
+    if family == "mistral":
+        return "".join(o.get("text", "") for o in model_output.get("outputs", []))
+    if family == "meta":
+        return model_output.get("generation", "")
+    if family == "amazon":
+        return "".join(c.get("text", "") for c in model_output["output"]["message"]["content"])
+    if family == "cohere":
+        return model_output.get("text", "")
+    if family == "openai":
+        return "".join(c["message"].get("content") or "" for c in model_output.get("choices", []))
+    raise ValueError(f"Unknown output format for {model_id}")
+
+
+def _render_model_output(model_id: str, text: str) -> dict:
+    """Inverse of _extract_output_text, used by the local stand-in."""
+    family = _model_family(model_id)
+    if family == "anthropic":
+        return {"type": "message", "role": "assistant", "content": [{"type": "text", "text": text}]}
+    if family == "mistral":
+        return {"outputs": [{"text": text, "stop_reason": "stop"}]}
+    if family == "meta":
+        return {"generation": text, "stop_reason": "stop"}
+    if family == "amazon":
+        return {"output": {"message": {"role": "assistant", "content": [{"text": text}]}}, "stopReason": "end_turn"}
+    if family == "cohere":
+        return {"text": text, "finish_reason": "COMPLETE"}
+    if family == "openai":
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]}
+    raise ValueError(f"Unknown output format for {model_id}")
+
+
+def manifest_path_for(records_path: str) -> str:
+    return f"{records_path}.manifest.json"
+
+
+# ==================================
+# ===== Export =====================
+# ==================================
+def export_batch_input(sources: List[str], model_id: str, records_path: str, max_chars: int = 200000) -> dict:
+    """
+    Render one modelInput record per document into records_path (JSONL) and write
+    a manifest mapping recordId -> data_source next to it.
+    sources may contain S3 prefixes ending with '/', which are expanded.
+    """
+    data_sources = []
+    for source in sources:
+        if source.lower().startswith("s3://") and source.endswith("/"):
+            data_sources += _list_s3_uris(source, extensions=SOURCE_EXTENSIONS)
+        else:
+            data_sources.append(source)
+
+    os.makedirs(os.path.dirname(records_path) or ".", exist_ok=True)
+    manifest = {"model_id": model_id, "created_at": time.strftime("%Y-%m-%d %H:%M:%S"), "records": {}}
+    skipped = []
+    with open(records_path, "w", encoding="utf-8") as f:
+        for i, ds in enumerate(data_sources):
+            file_result = fetch_data(ds)
+            if file_result.get("error") or not file_result.get("formatted_text"):
+                skipped.append({"data_source": ds, "error": file_result.get("error") or "No content extracted"})
+                continue
+            record_id = f"REC{i:08d}"
+            system_prompt = get_analyzer_prompt(ds, formatted_text=file_result["formatted_text"][:max_chars])
+            record = {"recordId": record_id, "modelInput": _render_model_input(model_id, system_prompt, BATCH_USER_PROMPT)}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            manifest["records"][record_id] = ds
+
+    manifest["skipped"] = skipped
+    with open(manifest_path_for(records_path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    count = len(manifest["records"])
+    print(f"📝 Wrote {count} batch records to {records_path} ({len(skipped)} skipped)")
+    if count < MIN_BATCH_RECORDS:
+        print(f"⚠️ Bedrock batch inference needs at least {MIN_BATCH_RECORDS} records; "
+              f"use on-demand invocation or the local stand-in for {count}.")
+    return manifest
+
+
+# ==================================
+# ===== Submit / status ============
+# ==================================
+def _upload(local_path: str, s3_uri: str):
+    bucket, key = _parse_s3_uri(s3_uri)
+    boto3.client("s3").upload_file(local_path, bucket, key)
+
+
+def submit_batch_job(
+    records_path: str,
+    input_s3_uri: str,
+    output_s3_prefix: str,
+    role_arn: str,
+    model_id: Optional[str] = None,
+    job_name: Optional[str] = None,
+) -> str:
+    """Upload the records (and manifest) and start a batch inference job; returns the job ARN."""
+    with open(manifest_path_for(records_path), encoding="utf-8") as f:
+        manifest = json.load(f)
+    model_id = model_id or manifest["model_id"]
+
+    _upload(records_path, input_s3_uri)
+    _upload(manifest_path_for(records_path), manifest_path_for(input_s3_uri))
+
+    job_name = job_name or f"smartgoals-{time.strftime('%Y%m%d-%H%M%S')}"
+    response = boto3.client("bedrock").create_model_invocation_job(
+        jobName=job_name,
+        roleArn=role_arn,
+        modelId=model_id,
+        inputDataConfig={"s3InputDataConfig": {"s3Uri": input_s3_uri, "s3InputFormat": "JSONL"}},
+        outputDataConfig={"s3OutputDataConfig": {"s3Uri": output_s3_prefix}},
+    )
+    print(f"🚀 Submitted batch job {job_name}: {response['jobArn']}")
+    return response["jobArn"]
+
+
+def get_batch_job_status(job_arn: str) -> dict:
+    job = boto3.client("bedrock").get_model_invocation_job(jobIdentifier=job_arn)
+    return {
+        "status": job.get("status"),
+        "message": job.get("message"),
+        "output_s3_uri": job.get("outputDataConfig", {}).get("s3OutputDataConfig", {}).get("s3Uri"),
+        "submit_time": str(job.get("submitTime")),
+        "end_time": str(job.get("endTime")),
+    }
+
+
+# ==================================
+# ===== Ingest =====================
+# ==================================
+def load_manifest(path: str) -> dict:
+    """Manifest written by export_batch_input, from a local path or S3."""
+    if path.lower().startswith("s3://"):
+        return json.loads(_read_s3_object(path))
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _iter_output_lines(output: str):
+    """Lines of a local *.out file, or of every *.jsonl.out object under an S3 prefix."""
+    if output.lower().startswith("s3://"):
+        for uri in _list_s3_uris(output, extensions=[".out"]):
+            if not uri.lower().endswith(".jsonl.out"):
+                continue  # manifest.json.out: Bedrock's job summary, not records
+            yield from _read_s3_object(uri).decode("utf-8").splitlines()
+        return
+    with open(output, encoding="utf-8") as f:
+        yield from f
+
+
+def ingest_batch_output(output: str, manifest: Dict) -> dict:
+    """
+    Parse batch output records into analyzer records and append them to
+    results.jsonl via the runtime's normalization and results writer.
+    """
+    # Imported lazily: the runtime pulls in the agent framework and its AWS clients
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+
+    model_id = manifest["model_id"]
+    records = manifest["records"]
+    stats = {"ingested": 0, "errors": 0, "empty": 0, "repaired": 0, "unparseable": 0}
+    for line in _iter_output_lines(output):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            # One truncated line must not stop the ingest halfway (a rerun would duplicate records)
+            stats["errors"] += 1
+            print(f"❌ Skipped an output line that is not valid JSON: {line[:80]}")
+            continue
+        data_source = records.get(row.get("recordId"), row.get("recordId"))
+        if row.get("error") or "modelOutput" not in row:
+            stats["errors"] += 1
+            print(f"❌ {data_source}: {row.get('error')}")
+            continue
+        text = _extract_output_text(model_id, row["modelOutput"])
+        record_parse_event(model_id, "generation")
+        try:
+            parsed = runtime._coerce_json(text)
+        except ValueError:
+            # No model round trip here: local repair only, unparseable records are reported
+            record_parse_event(model_id, "parse_failure")
+            parsed = repair_json(text)
+            if parsed is None:
+                stats["unparseable"] += 1
+                print(f"❌ {data_source}: output is not valid JSON")
+                continue
+            record_parse_event(model_id, "repaired_locally")
+            stats["repaired"] += 1
+        output_obj = runtime._normalize_output(parsed, model_id, data_source)
+        if not output_obj["smart_goals"]:
+            stats["empty"] += 1
+        output_obj["batch_inference"] = True
+        runtime._persist_outputs(output_obj, data_source)
+        stats["ingested"] += 1
+
+    runtime.get_results_writer(runtime.output_jsonl).flush()
+    print(f"📥 Ingested batch output: {stats}")
+    return stats
+
+
+# ==================================
+# ===== Local stand-in =============
+# ==================================
+def run_local_batch(
+    records_path: str, output_path: str, generate: Callable[[str, str], str], model_id: Optional[str] = None,
+) -> int:
+    """
+    Process a records file like Bedrock batch inference would, with
+    generate(model_id, prompt) standing in for the model (the CLI passes the
+    fake provider's), and write the output JSONL in Bedrock's format.
+    """
+    if model_id is None:
+        with open(manifest_path_for(records_path), encoding="utf-8") as f:
+            model_id = json.load(f)["model_id"]
+    count = 0
+    with open(records_path, encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = generate(model_id, json.dumps(record["modelInput"]))
+            record["modelOutput"] = _render_model_output(model_id, text)
+            dst.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
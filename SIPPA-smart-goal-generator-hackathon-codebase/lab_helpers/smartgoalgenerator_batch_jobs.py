@@ -0,0 +1,489 @@
+"""
+Durable batch jobs for SMART-goal generation and evaluation.
+
+A job is a list of data sources (S3 URIs, URLs or local files). Every document
+moves through
+
+    pending -> fetched -> generated -> evaluated        (or failed)
+
+and the result of each step (extracted text, analyzer record, evaluator output)
+is checkpointed in SQLite before the next one starts, so a runner that dies
+mid-job resumes each document from its last completed step. Failed steps are
+retried with exponential backoff; a document is marked failed after
+MAX_ATTEMPTS. A job has at most one live runner (any process: a server
+worker or the CLI), which holds the job's runner lease and renews it, with
+the leases of the documents it is working on, while it runs. A second runner
+is refused until that lease lapses; a runner that takes over a job frees the
+document leases left behind by one that died.
+
+Generation and evaluation reuse the runtime's pipeline steps at "batch"
+priority, so a running job never delays interactive requests.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from lab_helpers.smartgoalgenerator_mcp_tools import _list_s3_uris, fetch_data
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+JOBS_DB_PATH = os.environ.get("SMARTGOAL_JOBS_DB", "./outputs/batch_jobs.sqlite")
+MAX_ATTEMPTS = int(os.environ.get("SMARTGOAL_JOB_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY_S = float(os.environ.get("SMARTGOAL_JOB_RETRY_BASE_S", "5"))
+RETRY_MAX_DELAY_S = 300.0
+LEASE_S = 600.0
+RUNNER_LEASE_S = 60.0   # a dead runner blocks resuming its job for at most this long
+RUNNER_HEARTBEAT_S = RUNNER_LEASE_S / 4
+JOB_CONCURRENCY = int(os.environ.get("SMARTGOAL_JOB_CONCURRENCY", "4"))
+
+PENDING, FETCHED, GENERATED, EVALUATED, FAILED = "pending", "fetched", "generated", "evaluated", "failed"
+DOC_STATES = (PENDING, FETCHED, GENERATED, EVALUATED, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id     TEXT PRIMARY KEY,
+    model_id   TEXT NOT NULL,
+    evaluate   INTEGER NOT NULL,
+    actor_id   TEXT,
+    status     TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    runner_id    TEXT,
+    runner_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS documents (
+    job_id          TEXT NOT NULL,
+    doc_id          INTEGER NOT NULL,
+    data_source     TEXT NOT NULL,
+    state           TEXT NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    leased_until    REAL NOT NULL DEFAULT 0,
+    last_error      TEXT,
+    file_result     TEXT,
+    output          TEXT,
+    evaluation      TEXT,
+    updated_at      REAL NOT NULL,
+    PRIMARY KEY (job_id, doc_id)
+);
+CREATE INDEX IF NOT EXISTS idx_documents_ready ON documents (job_id, state, next_attempt_at);
+"""
+
+
+class JobRunningError(RuntimeError):
+    """Raised when a job already has a live runner (in this or another process)."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        super().__init__(f"Job {job_id} is already running")
+
+
+class JobStore:
+    """SQLite store of jobs and per-document checkpoints; safe to share between threads."""
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add the runner lease columns to job stores created before they existed."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, ddl in (("runner_id", "TEXT"), ("runner_until", "REAL NOT NULL DEFAULT 0")):
+            if column not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {ddl}")
+                except sqlite3.OperationalError:
+                    pass  # added concurrently by another process
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # ----- jobs -----
+    def create_job(
+        self,
+        data_sources: List[str],
+        model_id: str,
+        evaluate: bool = True,
+        actor_id: Optional[str] = None,
+    ) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, model_id, evaluate, actor_id, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'running', ?, ?)",
+                (job_id, model_id, int(evaluate), actor_id or f"job:{job_id}", now, now),
+            )
+            conn.executemany(
+                "INSERT INTO documents (job_id, doc_id, data_source, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, i, ds, PENDING, now) for i, ds in enumerate(data_sources)],
+            )
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        rows = self._query(
+            "SELECT job_id, model_id, evaluate, actor_id, status, created_at, updated_at FROM jobs WHERE job_id = ?",
+            (job_id,),
+        )
+        if not rows:
+            return None
+        keys = ("job_id", "model_id", "evaluate", "actor_id", "status", "created_at", "updated_at")
+        job = dict(zip(keys, rows[0]))
+        job["evaluate"] = bool(job["evaluate"])
+        return job
+
+    def list_jobs(self, limit: int = 20) -> List[dict]:
+        rows = self._query("SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self.progress(r[0]) for r in rows]
+
+    def set_job_status(self, job_id: str, status: str):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ?", (status, time.time(), job_id)
+            )
+
+    def final_state(self, job: dict) -> str:
+        return EVALUATED if job["evaluate"] else GENERATED
+
+    # ----- runner lease -----
+    def acquire_runner(self, job_id: str, runner_id: str) -> bool:
+        """Take the job's runner lease; False while another runner holds a live one."""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET runner_id = ?, runner_until = ? "
+                "WHERE job_id = ? AND (runner_id IS NULL OR runner_id = ? OR runner_until < ?)",
+                (runner_id, now + RUNNER_LEASE_S, job_id, runner_id, now),
+            ).rowcount == 1
+
+    def renew_runner(self, job_id: str, runner_id: str, doc_ids: List[int]) -> bool:
+        """Extend the runner lease and the leases of its in-flight documents; False if it was lost."""
+        now = time.time()
+        with self._transaction() as conn:
+            if conn.execute(
+                "UPDATE jobs SET runner_until = ? WHERE job_id = ? AND runner_id = ?",
+                (now + RUNNER_LEASE_S, job_id, runner_id),
+            ).rowcount != 1:
+                return False
+            conn.executemany(
+                "UPDATE documents SET leased_until = ? WHERE job_id = ? AND doc_id = ?",
+                [(now + LEASE_S, job_id, doc_id) for doc_id in doc_ids],
+            )
+            return True
+
+    def release_runner(self, job_id: str, runner_id: str):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET runner_id = NULL, runner_until = 0 WHERE job_id = ? AND runner_id = ?",
+                (job_id, runner_id),
+            )
+
+    def runner_active(self, job_id: str) -> bool:
+        rows = self._query("SELECT runner_until FROM jobs WHERE job_id = ?", (job_id,))
+        return bool(rows) and rows[0][0] >= time.time()
+
+    # ----- documents -----
+    def claim_ready(
+        self, job_id: str, final_state: str, limit: int, exclude: Optional[List[int]] = None
+    ) -> List[dict]:
+        """Lease up to `limit` documents whose next step is due, skipping the runner's in-flight ones."""
+        now = time.time()
+        exclude = list(exclude or [])
+        skip = f"AND doc_id NOT IN ({', '.join('?' * len(exclude))}) " if exclude else ""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT doc_id, data_source, state, attempts, file_result, output FROM documents "
+                "WHERE job_id = ? AND state NOT IN (?, ?) AND next_attempt_at <= ? AND leased_until <= ? "
+                + skip + "ORDER BY doc_id LIMIT ?",
+                (job_id, final_state, FAILED, now, now, *exclude, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE documents SET leased_until = ? WHERE job_id = ? AND doc_id = ?",
+                [(now + LEASE_S, job_id, r[0]) for r in rows],
+            )
+        keys = ("doc_id", "data_source", "state", "attempts", "file_result", "output")
+        docs = []
+        for r in rows:
+            doc = dict(zip(keys, r))
+            doc["file_result"] = json.loads(doc["file_result"]) if doc["file_result"] else None
+            doc["output"] = json.loads(doc["output"]) if doc["output"] else None
+            docs.append(doc)
+        return docs
+
+    def checkpoint(self, job_id: str, doc_id: int, state: str, **artifacts):
+        """Record a completed step (and its artifact) for one document; renews its lease."""
+        now = time.time()
+        sets = ["state = ?", "attempts = 0", "last_error = NULL", "leased_until = ?", "updated_at = ?"]
+        params = [state, now + LEASE_S, now]
+        for column in ("file_result", "output", "evaluation"):
+            if column in artifacts:
+                sets.append(f"{column} = ?")
+                params.append(json.dumps(artifacts[column], ensure_ascii=False))
+        if state in (GENERATED, EVALUATED):
+            sets.append("file_result = NULL")  # extracted text is no longer needed
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE documents SET {', '.join(sets)} WHERE job_id = ? AND doc_id = ?",
+                (*params, job_id, doc_id),
+            )
+
+    def record_failure(self, job_id: str, doc_id: int, attempts: int, error: str) -> bool:
+        """Schedule a retry with backoff; returns True when the document is now failed."""
+        attempts += 1
+        failed = attempts >= MAX_ATTEMPTS
+        delay = min(RETRY_MAX_DELAY_S, RETRY_BASE_DELAY_S * (2 ** (attempts - 1)))
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE documents SET attempts = ?, last_error = ?, next_attempt_at = ?, leased_until = 0, "
+                "updated_at = ?" + (", state = 'failed'" if failed else "") + " WHERE job_id = ? AND doc_id = ?",
+                (attempts, error[:2000], time.time() + delay, time.time(), job_id, doc_id),
+            )
+        return failed
+
+    def reset_leases(self, job_id: str) -> int:
+        """Free leases left by a runner that died; call once this runner holds the job's runner lease."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE documents SET leased_until = 0 WHERE job_id = ? AND leased_until > 0", (job_id,)
+            ).rowcount
+
+    def release_lease(self, job_id: str, doc_id: int):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE documents SET leased_until = 0 WHERE job_id = ? AND doc_id = ?", (job_id, doc_id)
+            )
+
+    def retry_failed(self, job_id: str) -> int:
+        """Put failed documents back in the queue at their last checkpoint."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE documents SET state = CASE "
+                "  WHEN output IS NOT NULL THEN 'generated' "
+                "  WHEN file_result IS NOT NULL THEN 'fetched' "
+                "  ELSE 'pending' END, "
+                "attempts = 0, next_attempt_at = 0, leased_until = 0, updated_at = ? "
+                "WHERE job_id = ? AND state = 'failed'",
+                (time.time(), job_id),
+            )
+            conn.execute("UPDATE jobs SET status = 'running' WHERE job_id = ?", (job_id,))
+            return cur.rowcount
+
+    def next_due(self, job_id: str, final_state: str) -> Optional[float]:
+        """Earliest time a remaining document can run, or None when nothing is left."""
+        rows = self._query(
+            "SELECT MIN(MAX(next_attempt_at, leased_until)) FROM documents "
+            "WHERE job_id = ? AND state NOT IN (?, ?)",
+            (job_id, final_state, FAILED),
+        )
+        return rows[0][0]
+
+    # ----- progress -----
+    def progress(self, job_id: str) -> Optional[dict]:
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        counts = {state: 0 for state in DOC_STATES}
+        for state, n in self._query(
+            "SELECT state, COUNT(*) FROM documents WHERE job_id = ? GROUP BY state", (job_id,)
+        ):
+            counts[state] = n
+        total = sum(counts.values())
+        done = counts[self.final_state(job)] + counts[FAILED]
+        errors = self._query(
+            "SELECT data_source, attempts, last_error FROM documents "
+            "WHERE job_id = ? AND last_error IS NOT NULL ORDER BY updated_at DESC LIMIT 5",
+            (job_id,),
+        )
+        return {
+            **job,
+            "runner_active": self.runner_active(job_id),
+            "documents": total,
+            "states": counts,
+            "percent_complete": round(100.0 * done / total, 1) if total else 100.0,
+            "recent_errors": [{"data_source": d, "attempts": a, "error": e} for d, a, e in errors],
+        }
+
+    def results(self, job_id: str) -> List[dict]:
+        rows = self._query(
+            "SELECT data_source, state, output, evaluation FROM documents WHERE job_id = ? ORDER BY doc_id",
+            (job_id,),
+        )
+        return [
+            {
+                "data_source": ds,
+                "state": state,
+                "model_output": json.loads(output) if output else None,
+                "evaluator_result": json.loads(evaluation) if evaluation else None,
+            }
+            for ds, state, output, evaluation in rows
+        ]
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store(path: str = JOBS_DB_PATH) -> JobStore:
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = JobStore(path)
+        return _store
+
+
+def expand_sources(sources: List[str]) -> List[str]:
+    """S3 prefixes (ending with '/') are expanded to the objects under them."""
+    expanded = []
+    for source in sources:
+        if source.lower().startswith("s3://") and source.endswith("/"):
+            expanded += _list_s3_uris(source, extensions=[".docx", ".pdf", ".txt", ".csv", ".json"])
+        else:
+            expanded.append(source)
+    return expanded
+
+
+# ==================================
+# ===== Per-document pipeline ======
+# ==================================
+async def _step_fetch(doc: dict) -> dict:
+    file_result = await asyncio.to_thread(fetch_data, doc["data_source"])
+    if file_result.get("error") or not file_result.get("formatted_text"):
+        raise RuntimeError(file_result.get("error") or "No content extracted")
+    # Only the formatted text is checkpointed; it is all the analyzer prompt needs
+    return {"formatted_text": file_result["formatted_text"]}
+
+
+async def _step_generate(job: dict, doc: dict) -> dict:
+    # Imported lazily: the runtime imports this module for its job actions
+    from lab_helpers.smartgoalgenerator_runtime import generate_goals
+
+    return await generate_goals(
+        job["model_id"], doc["data_source"], doc["file_result"], "batch", job["actor_id"]
+    )
+
+
+async def _step_evaluate(job: dict, doc: dict):
+    from lab_helpers.smartgoalgenerator_runtime import evaluate_goals
+
+    # One evaluator session per job keeps its documents on a warm instance
+    result = await evaluate_goals(doc["output"], job["job_id"], "batch", job["actor_id"])
+    if isinstance(result, dict) and result.get("error"):
+        raise RuntimeError(f"Evaluator failed: {result['error']}")
+    return result
+
+
+async def _process_document(store: JobStore, job: dict, doc: dict):
+    """Advance one document as far as it goes, checkpointing after each step."""
+    job_id, doc_id = job["job_id"], doc["doc_id"]
+    try:
+        if doc["state"] == PENDING:
+            doc["file_result"] = await _step_fetch(doc)
+            await asyncio.to_thread(store.checkpoint, job_id, doc_id, FETCHED, file_result=doc["file_result"])
+            doc["state"] = FETCHED
+
+        if doc["state"] == FETCHED:
+            doc["output"] = await _step_generate(job, doc)
+            await asyncio.to_thread(store.checkpoint, job_id, doc_id, GENERATED, output=doc["output"])
+            doc["state"] = GENERATED
+
+        if doc["state"] == GENERATED and job["evaluate"]:
+            evaluation = await _step_evaluate(job, doc)
+            await asyncio.to_thread(store.checkpoint, job_id, doc_id, EVALUATED, evaluation=evaluation)
+            doc["state"] = EVALUATED
+
+        await asyncio.to_thread(store.release_lease, job_id, doc_id)
+    except asyncio.CancelledError:
+        # Released inline: awaiting a thread here could be cancelled again
+        store.release_lease(job_id, doc_id)
+        raise
+    except Exception as e:
+        failed = await asyncio.to_thread(store.record_failure, job_id, doc_id, doc["attempts"], str(e))
+        print(f"{'❌' if failed else '🔁'} Job {job_id} doc {doc_id} ({doc['data_source']}) at {doc['state']}: {e}")
+
+
+async def run_job(job_id: str, store: Optional[JobStore] = None, concurrency: int = JOB_CONCURRENCY) -> dict:
+    """
+    Run (or resume) a job until every document is finished or failed.
+    Safe to call again after a crash: completed steps are not repeated.
+    Raises JobRunningError while another runner (in any process) holds the job.
+    """
+    store = store or get_job_store()
+    job = await asyncio.to_thread(store.get_job, job_id)
+    if job is None:
+        raise KeyError(f"Unknown job: {job_id}")
+    runner_id = uuid.uuid4().hex[:12]
+    if not await asyncio.to_thread(store.acquire_runner, job_id, runner_id):
+        raise JobRunningError(job_id)
+
+    in_flight: Dict[int, asyncio.Task] = {}
+    try:
+        final_state = store.final_state(job)
+        await asyncio.to_thread(store.reset_leases, job_id)
+        await asyncio.to_thread(store.set_job_status, job_id, "running")
+        progress = await asyncio.to_thread(store.progress, job_id)
+        print(f"▶️ Running job {job_id} ({progress['percent_complete']}% complete)")
+
+        heartbeat_at = time.time() + RUNNER_HEARTBEAT_S
+        while True:
+            if time.time() >= heartbeat_at:
+                # Documents queued behind interactive traffic keep their leases while they wait
+                if not await asyncio.to_thread(store.renew_runner, job_id, runner_id, list(in_flight)):
+                    raise JobRunningError(job_id)  # the lease lapsed and another runner took over
+                heartbeat_at = time.time() + RUNNER_HEARTBEAT_S
+
+            free = concurrency - len(in_flight)
+            if free > 0:
+                for doc in await asyncio.to_thread(store.claim_ready, job_id, final_state, free, list(in_flight)):
+                    in_flight[doc["doc_id"]] = asyncio.create_task(_process_document(store, job, doc))
+
+            if in_flight:
+                done, _ = await asyncio.wait(
+                    in_flight.values(), timeout=RUNNER_HEARTBEAT_S, return_when=asyncio.FIRST_COMPLETED
+                )
+                for doc_id in [d for d, t in in_flight.items() if t in done]:
+                    in_flight.pop(doc_id)
+                continue
+
+            due = await asyncio.to_thread(store.next_due, job_id, final_state)
+            if due is None:
+                break
+            await asyncio.sleep(max(0.1, min(due - time.time(), RETRY_MAX_DELAY_S, RUNNER_HEARTBEAT_S)))
+
+        progress = await asyncio.to_thread(store.progress, job_id)
+        status = "completed" if progress["states"][FAILED] == 0 else "completed_with_failures"
+        await asyncio.to_thread(store.set_job_status, job_id, status)
+        progress["status"] = status
+        print(f"✅ Job {job_id} {status}: {progress['states']}")
+        return progress
+    finally:
+        # Stop this runner's documents before another runner may take the job over
+        for task in in_flight.values():
+            task.cancel()
+        if in_flight:
+            await asyncio.gather(*in_flight.values(), return_exceptions=True)
+        store.release_runner(job_id, runner_id)
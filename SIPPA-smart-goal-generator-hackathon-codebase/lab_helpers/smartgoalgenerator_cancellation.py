@@ -0,0 +1,196 @@
+"""
+Cooperative cancellation of in-flight invocations.
+
+Every pipeline run gets a CancelToken registered under its session id. A token
+is cancelled by the "cancel" action (keyed by session_id; AgentCore routes the
+session to the same container) or, on the SSE path, when the client goes away.
+Cancelling cancels the run's task: the Bedrock stream is closed by
+stream_until_json_complete's cleanup, and stages that had not started yet
+(evaluator call, persistence) never run.
+
+The pipeline notes its current stage and the streams add the characters they
+received, so a cancelled run can report what it saved: the output tokens the
+model would still have produced (from the model's average), the input tokens
+if the model had not been called yet, and whether the evaluator was skipped.
+
+With several server workers a cancel can reach a worker that is not running
+the session: it is then also posted to the shared cache, and every worker's
+watch_shared_cancels() picks it up.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from typing import Dict, List, Optional
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+DEFAULT_OUTPUT_TOKENS = 600
+EWMA_ALPHA = 0.1
+GENERATION_STAGES = ("queued", "fetch_extract", "generate")
+
+current_token: "contextvars.ContextVar[Optional[CancelToken]]" = contextvars.ContextVar(
+    "smartgoal_cancel_token", default=None
+)
+
+
+class CancelToken:
+    """Cancellation state of one pipeline run."""
+
+    def __init__(self, session_id: Optional[str], model_id: Optional[str] = None):
+        self.session_id = session_id
+        self.model_id = model_id
+        self.reason: Optional[str] = None
+        self.stage = "queued"
+        self.input_chars = 0
+        self.streamed_chars = 0
+        self.started = time.perf_counter()
+        self.created_at = time.time()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str) -> bool:
+        """Request cancellation; False if already cancelled or finished."""
+        if self.reason is not None or (self.task is not None and self.task.done()):
+            return False
+        self.reason = reason
+        if self.task is not None:
+            self.task.get_loop().call_soon_threadsafe(self.task.cancel)
+        # else: the run has not started and stops as soon as it does
+        return True
+
+    def savings(self) -> dict:
+        """Estimated tokens and calls not spent because of the cancellation."""
+        expected = expected_output_tokens(self.model_id)
+        streamed = (self.streamed_chars + 3) // 4
+        before_model = self.stage in ("queued", "fetch_extract")
+        return {
+            "reason": self.reason,
+            "stage": self.stage,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "output_tokens_saved": max(0, expected - streamed) if self.stage in GENERATION_STAGES else 0,
+            "input_tokens_saved": (self.input_chars + 3) // 4 if before_model else 0,
+            "evaluator_skipped": self.stage != "evaluate",
+        }
+
+
+def note_stage(stage: str):
+    token = current_token.get()
+    if token is not None:
+        token.stage = stage
+
+
+def note_input(chars: int):
+    token = current_token.get()
+    if token is not None:
+        token.input_chars = chars
+
+
+def note_streamed(chars: int):
+    token = current_token.get()
+    if token is not None:
+        token.streamed_chars += chars
+
+
+# ==================================
+# ===== Registry ===================
+# ==================================
+_tokens: Dict[str, List[CancelToken]] = {}
+_lock = threading.Lock()
+_output_tokens: Dict[str, float] = {}
+_stats = {"cancelled": 0, "output_tokens_saved": 0, "input_tokens_saved": 0, "evaluator_calls_skipped": 0}
+_by_reason: Dict[str, int] = {}
+
+
+def register(token: CancelToken):
+    if token.session_id:
+        with _lock:
+            _tokens.setdefault(token.session_id, []).append(token)
+
+
+def unregister(token: CancelToken):
+    with _lock:
+        tokens = _tokens.get(token.session_id) or []
+        if token in tokens:
+            tokens.remove(token)
+        if not tokens:
+            _tokens.pop(token.session_id, None)
+
+
+def cancel_session(session_id: str, reason: str = "cancel_action") -> int:
+    """Cancel every in-flight run of a session; returns how many were cancelled."""
+    with _lock:
+        tokens = list(_tokens.get(session_id) or [])
+    return sum(1 for token in tokens if token.cancel(reason))
+
+
+def record_cancelled(token: CancelToken) -> dict:
+    savings = token.savings()
+    with _lock:
+        _stats["cancelled"] += 1
+        _stats["output_tokens_saved"] += savings["output_tokens_saved"]
+        _stats["input_tokens_saved"] += savings["input_tokens_saved"]
+        _stats["evaluator_calls_skipped"] += int(savings["evaluator_skipped"])
+        _by_reason[token.reason] = _by_reason.get(token.reason, 0) + 1
+    return savings
+
+
+def record_output_tokens(model_id: str, tokens: Optional[int]):
+    """Track each model's average output length (the basis of the savings estimate)."""
+    if not tokens:
+        return
+    with _lock:
+        prev = _output_tokens.get(model_id)
+        _output_tokens[model_id] = tokens if prev is None else prev + EWMA_ALPHA * (tokens - prev)
+
+
+def expected_output_tokens(model_id: Optional[str]) -> int:
+    return int(_output_tokens.get(model_id, DEFAULT_OUTPUT_TOKENS))
+
+
+# ==================================
+# ===== Across workers =============
+# ==================================
+SHARED_NAMESPACE = "cancel"
+SHARED_TTL_S = 300
+
+
+def post_shared_cancel(cache, session_id: str, reason: str):
+    """Ask every worker to cancel the session's runs that started before now."""
+    cache.set(SHARED_NAMESPACE, session_id, {"reason": reason, "at": time.time()}, SHARED_TTL_S)
+
+
+async def watch_shared_cancels(cache, interval_s: float = 0.25):
+    """Apply cancel requests posted by other workers to this worker's runs (runs forever)."""
+    checked_at = time.time()
+    while True:
+        await asyncio.sleep(interval_s)
+        with _lock:
+            in_flight = {session_id: list(tokens) for session_id, tokens in _tokens.items()}
+        if not in_flight:
+            checked_at = time.time()
+            continue
+        # Overlap the window a little: a mark written during the last query is not missed
+        since, checked_at = checked_at - 1.0, time.time()
+        try:
+            marks = await asyncio.to_thread(cache.since, SHARED_NAMESPACE, since)
+        except Exception as e:
+            print(f"⚠️ Reading shared cancel requests failed: {e}")
+            continue
+        for session_id, mark in marks:
+            for token in in_flight.get(session_id, ()):
+                if token.created_at < mark["at"]:
+                    token.cancel(mark["reason"])
+
+
+def cancellation_metrics() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "by_reason": dict(_by_reason),
+            "in_flight_sessions": len(_tokens),
+        }
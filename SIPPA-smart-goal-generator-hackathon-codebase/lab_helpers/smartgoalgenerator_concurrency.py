@@ -0,0 +1,194 @@
+"""
+Adaptive concurrency control for Bedrock model calls and the evaluator runtime.
+
+Each key (a model id, or "evaluator-runtime") gets an AIMD limiter: the number
+of calls allowed in flight grows by ~1 per window of successful calls and is
+halved when the service throttles. Throttled calls are retried with full-jitter
+exponential backoff, and a circuit breaker rejects calls outright for a
+cool-down period after a run of consecutive throttles, so a saturated quota
+does not turn into an error storm.
+Waiters are admitted through a PriorityScheduler, so interactive calls go ahead
+of queued evaluation and batch calls for the same model.
+"""
+import asyncio
+import os
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+from lab_helpers.smartgoalgenerator_scheduler import DEFAULT_PRIORITY, PriorityScheduler
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+# Limiters live in each process: with SMARTGOAL_WORKERS server workers the
+# container's limits are split between them, so together they still start at
+# (and never exceed) the configured values.
+SERVER_WORKERS = max(1, int(os.environ.get("SMARTGOAL_WORKERS", "1")))
+INITIAL_LIMIT = max(1.0, float(os.environ.get("SMARTGOAL_LIMIT_INITIAL", "4")) / SERVER_WORKERS)
+MAX_LIMIT = max(1.0, float(os.environ.get("SMARTGOAL_LIMIT_MAX", "64")) / SERVER_WORKERS)
+MAX_RETRIES = int(os.environ.get("SMARTGOAL_THROTTLE_RETRIES", "4"))
+RETRY_BASE_DELAY_S = 0.5
+RETRY_MAX_DELAY_S = 8.0
+BREAKER_THRESHOLD = 8          # consecutive throttles that open the breaker
+BREAKER_COOLDOWN_S = 15.0
+
+THROTTLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ServiceUnavailableException",
+}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a key's circuit breaker is open and the call is rejected."""
+
+    def __init__(self, key: str, retry_after_s: float):
+        self.key = key
+        self.retry_after_s = retry_after_s
+        super().__init__(f"Circuit open for {key}; retry in {retry_after_s:.1f}s")
+
+
+def is_throttle(exc: BaseException) -> bool:
+    """True for botocore throttling ClientErrors and Strands' ModelThrottledException."""
+    if type(exc).__name__ == "ModelThrottledException":
+        return True
+    code = (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+    if code in THROTTLE_CODES:
+        return True
+    return "ThrottlingException" in str(exc)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit plus circuit breaker for one key."""
+
+    def __init__(
+        self,
+        key: str,
+        initial: float = INITIAL_LIMIT,
+        min_limit: float = 1,
+        max_limit: float = MAX_LIMIT,
+        decrease_factor: float = 0.5,
+        breaker_threshold: int = BREAKER_THRESHOLD,
+        breaker_cooldown_s: float = BREAKER_COOLDOWN_S,
+    ):
+        self.key = key
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown_s = breaker_cooldown_s
+
+        self.consecutive_throttles = 0
+        self.opened_at: Optional[float] = None
+        self._last_decrease = 0.0
+        self.scheduler = PriorityScheduler(key, capacity=lambda: max(self.min_limit, int(self.limit)))
+        self.counters = {"calls": 0, "successes": 0, "throttles": 0, "rejections": 0, "errors": 0, "retries": 0}
+
+    @property
+    def in_flight(self) -> int:
+        return self.scheduler.in_flight
+
+    def _check_breaker(self):
+        if self.opened_at is None:
+            return
+        remaining = self.breaker_cooldown_s - (time.monotonic() - self.opened_at)
+        if remaining > 0:
+            self.counters["rejections"] += 1
+            raise CircuitOpenError(self.key, remaining)
+        # Half-open: let traffic through at the minimum limit; one success closes it
+        self.opened_at = None
+        self.limit = self.min_limit
+
+    async def acquire(self, priority: str = DEFAULT_PRIORITY, actor_id: Optional[str] = None):
+        self._check_breaker()
+        await self.scheduler.acquire(priority, actor_id)
+        self.counters["calls"] += 1
+
+    def release(self, outcome: str):
+        """outcome: "ok", "throttle", "error" or "cancelled". Synchronous so it also runs on cancellation."""
+        now = time.monotonic()
+        if outcome == "ok":
+            self.counters["successes"] += 1
+            self.consecutive_throttles = 0
+            # Additive increase: about +1 per limit's worth of successful calls
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+        elif outcome == "throttle":
+            self.counters["throttles"] += 1
+            self.consecutive_throttles += 1
+            # Multiplicative decrease, at most once per round trip of in-flight calls
+            if now - self._last_decrease > 1.0:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+            if self.consecutive_throttles >= self.breaker_threshold:
+                self.opened_at = now
+                print(f"⚠️ Circuit opened for {self.key} after {self.consecutive_throttles} throttles")
+        elif outcome == "error":
+            self.counters["errors"] += 1
+
+        # Frees the slot and admits waiters up to the (possibly changed) limit
+        self.scheduler.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "circuit_open": self.opened_at is not None,
+            **self.counters,
+            "scheduler": self.scheduler.snapshot()["classes"],
+        }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(key: str) -> AdaptiveLimiter:
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limiter = _limiters[key] = AdaptiveLimiter(key)
+    return limiter
+
+
+def limiter_metrics() -> Dict[str, Dict[str, Any]]:
+    """Current limit and counters for every key seen by this process."""
+    return {key: limiter.snapshot() for key, limiter in _limiters.items()}
+
+
+async def call_with_limit(
+    key: str,
+    fn: Callable,
+    *args,
+    retries: int = MAX_RETRIES,
+    priority: str = DEFAULT_PRIORITY,
+    actor_id: Optional[str] = None,
+    **kwargs,
+) -> Any:
+    """
+    Await fn(*args, **kwargs) under key's adaptive limit, queued by priority and actor.
+    Throttles are retried with full-jitter backoff; other errors propagate at once.
+    """
+    limiter = get_limiter(key)
+    attempt = 0
+    while True:
+        await limiter.acquire(priority, actor_id)
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            limiter.release("cancelled")
+            raise
+        except Exception as e:
+            if not is_throttle(e):
+                limiter.release("error")
+                raise
+            limiter.release("throttle")
+            if attempt >= retries:
+                raise
+            delay = random.uniform(0, min(RETRY_MAX_DELAY_S, RETRY_BASE_DELAY_S * (2 ** attempt)))
+            attempt += 1
+            limiter.counters["retries"] += 1
+            await asyncio.sleep(delay)
+            continue
+        limiter.release("ok")
+        return result
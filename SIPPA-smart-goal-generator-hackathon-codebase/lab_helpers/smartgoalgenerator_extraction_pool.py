@@ -0,0 +1,235 @@
+"""
+Process pool for CPU-bound document parsing.
+
+PyPDF2 and python-docx are pure Python: parsing a large upload inline holds the
+GIL for seconds and every other session in the process waits. Documents at or
+above SMARTGOAL_EXTRACTION_POOL_MIN_BYTES are parsed in a small, bounded pool of
+worker processes instead; small files stay inline, where a round trip would
+cost more than the parse.
+
+The document bytes travel through a shared-memory block rather than being
+pickled through the pool's pipe; only the block name and the extracted text
+cross it. Each job has a timeout (enforced in the worker, with a backstop in
+the caller) and each worker an address-space cap, so one pathological PDF fails
+its own request instead of the runtime. A worker that dies or hangs is replaced
+by recycling the pool.
+"""
+import atexit
+import os
+import resource
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Optional
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+_SERVER_WORKERS = max(1, int(os.environ.get("SMARTGOAL_WORKERS", "1")))
+# Pool processes per server worker; 0 parses everything inline
+EXTRACTION_POOL_SIZE = int(os.environ.get(
+    "SMARTGOAL_EXTRACTION_POOL_SIZE", str(max(1, (os.cpu_count() or 1) // _SERVER_WORKERS))
+))
+EXTRACTION_POOL_MIN_BYTES = int(os.environ.get("SMARTGOAL_EXTRACTION_POOL_MIN_BYTES", str(64 * 1024)))
+EXTRACTION_TIMEOUT_S = float(os.environ.get("SMARTGOAL_EXTRACTION_TIMEOUT_S", "30"))
+EXTRACTION_MEMORY_MB = int(os.environ.get("SMARTGOAL_EXTRACTION_MEMORY_MB", "1024"))  # 0 = no cap
+BACKSTOP_GRACE_S = 5.0  # caller-side wait beyond the worker's own timeout
+OWNER_CHECK_S = 1.0  # how often workers check that their owner is still alive
+POOLED_FORMATS = ("pdf", "docx")
+PRELOAD_MODULES = ["lab_helpers.smartgoalgenerator_extractors"]
+
+
+class ExtractionError(RuntimeError):
+    """A pooled parse that timed out, ran out of memory or lost its worker."""
+
+
+class _JobTimeout(BaseException):
+    """Raised inside a worker when its job runs past the timeout (a BaseException,
+    so the parsers' per-page `except Exception` cannot swallow it)."""
+
+
+# ===================================
+# ===== Worker process side =========
+# ===================================
+def _watch_owner(owner_pid: int):
+    """Exit when the process that owns the pool is gone (killed without running atexit)."""
+    while True:
+        time.sleep(OWNER_CHECK_S)
+        try:
+            os.kill(owner_pid, 0)
+        except ProcessLookupError:
+            os._exit(0)
+
+
+def _init_worker(memory_mb: int, owner_pid: int):
+    for module in PRELOAD_MODULES:
+        __import__(module)
+    threading.Thread(target=_watch_owner, args=(owner_pid,), daemon=True).start()
+    if memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _on_alarm(signum, frame):
+    raise _JobTimeout()
+
+
+def _run_job(parse: Callable[[str, bytes], str], uri: str, shm_name: str, size: int, timeout_s: float) -> str:
+    """Attach to the caller's shared-memory block and parse it within timeout_s."""
+    shm = SharedMemory(name=shm_name)
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout_s)
+    try:
+        # The parsers need a bytes-like object that outlives the block
+        return parse(uri, bytes(shm.buf[:size]))
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        shm.close()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# ===================================
+# ===== Pool ========================
+# ===================================
+class ExtractionPool:
+    """Routes parses inline or to worker processes by document type and size."""
+
+    def __init__(self, size: int = EXTRACTION_POOL_SIZE, min_bytes: int = EXTRACTION_POOL_MIN_BYTES,
+                 timeout_s: float = EXTRACTION_TIMEOUT_S, memory_mb: int = EXTRACTION_MEMORY_MB):
+        self.size = size
+        self.min_bytes = min_bytes
+        self.timeout_s = timeout_s
+        self.memory_mb = memory_mb
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._disabled_reason: Optional[str] = None
+        self.stats = {"inline": 0, "pooled": 0, "timeouts": 0, "memory_errors": 0, "crashes": 0,
+                      "recycles": 0, "pooled_ms_total": 0.0}
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._executor is None and self._disabled_reason is None:
+                try:
+                    # forkserver: workers never inherit the runtime's threads or event loop
+                    context = get_context("forkserver")
+                    context.set_forkserver_preload(PRELOAD_MODULES)
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.size, mp_context=context,
+                        initializer=_init_worker, initargs=(self.memory_mb, os.getpid()),
+                    )
+                except (OSError, ValueError) as e:
+                    # e.g. no /dev/shm or semaphores (AWS Lambda): parse inline
+                    self._disabled_reason = str(e)
+                    print(f"⚠️ Extraction pool unavailable, parsing inline: {e}")
+            return self._executor
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Replace a pool whose worker hung or died; jobs still queued on it fail."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.stats["recycles"] += 1
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def should_pool(self, fmt: str, content: bytes) -> bool:
+        return self.size > 0 and len(content) >= self.min_bytes and fmt in POOLED_FORMATS
+
+    def extract(self, parse: Callable[[str, bytes], str], uri: str, content: bytes, fmt: str) -> str:
+        """
+        parse(uri, content), in a worker process for large PDF/DOCX documents
+        (fmt as sniffed by smartgoalgenerator_extractors). parse must be a
+        module-level function. Blocks the calling thread (not the GIL) while a
+        worker parses; raises ExtractionError when the job fails.
+        """
+        executor = self._get_executor() if self.should_pool(fmt, content) else None
+        if executor is None:
+            self.stats["inline"] += 1
+            return parse(uri, content)
+
+        started = time.perf_counter()
+        try:
+            shm = SharedMemory(create=True, size=len(content))
+        except OSError as e:
+            print(f"⚠️ Extraction pool unavailable, parsing inline: {e}")
+            self._disabled_reason = str(e)
+            self.shutdown()
+            self.stats["inline"] += 1
+            return parse(uri, content)
+        try:
+            shm.buf[:len(content)] = content
+            future = executor.submit(_run_job, parse, uri, shm.name, len(content), self.timeout_s)
+            try:
+                text = future.result(timeout=self.timeout_s + BACKSTOP_GRACE_S)
+            except _JobTimeout:
+                self.stats["timeouts"] += 1
+                raise ExtractionError(f"Extraction of {uri} timed out after {self.timeout_s:g}s")
+            except FutureTimeoutError:
+                # The worker ignored its alarm (stuck in C code): take it down
+                self.stats["timeouts"] += 1
+                self._recycle(executor)
+                raise ExtractionError(f"Extraction of {uri} timed out after {self.timeout_s:g}s")
+            except MemoryError:
+                self.stats["memory_errors"] += 1
+                raise ExtractionError(f"Extraction of {uri} exceeded the {self.memory_mb} MB memory cap")
+            except BrokenProcessPool:
+                self.stats["crashes"] += 1
+                self._recycle(executor)
+                raise ExtractionError(f"Extraction worker for {uri} died")
+        finally:
+            shm.close()
+            shm.unlink()
+        self.stats["pooled"] += 1
+        self.stats["pooled_ms_total"] += (time.perf_counter() - started) * 1000
+        return text
+
+    def prestart(self) -> dict:
+        """Start the worker processes now rather than on the first large upload."""
+        if self.size <= 0:
+            return {"size": 0}
+        executor = self._get_executor()
+        if executor is None:
+            return {"size": 0, "disabled": self._disabled_reason}
+        pids = {f.result(timeout=60) for f in [executor.submit(_ping) for _ in range(self.size * 2)]}
+        return {"size": self.size, "workers_started": len(pids)}
+
+    def snapshot(self) -> dict:
+        pooled = self.stats["pooled"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "pooled_ms_total"},
+            "pooled_ms_avg": round(self.stats["pooled_ms_total"] / pooled, 1) if pooled else None,
+            "size": self.size,
+            "min_bytes": self.min_bytes,
+            "timeout_s": self.timeout_s,
+            "memory_mb": self.memory_mb,
+            "disabled": self._disabled_reason,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[ExtractionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool() -> ExtractionPool:
+    """The process-wide extraction pool (its workers start on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool()
+            atexit.register(_pool.shutdown)
+        return _pool
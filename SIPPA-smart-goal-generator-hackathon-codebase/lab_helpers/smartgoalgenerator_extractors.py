@@ -0,0 +1,707 @@
+"""
+Document format detection and the registry of text extractors.
+
+The format of an upload is sniffed from its content (magic bytes, zip entries,
+leading markup), with the file extension only as a hint between text-like
+formats, so a PDF named "summary" or a DOCX saved as ".txt" is still parsed as
+what it is, and binary data we cannot read (images, legacy .doc, archives) is
+rejected instead of being decoded into garbage tokens.
+
+Each format has one or more named extractors; the one in use can be chosen per
+format with SMARTGOAL_EXTRACTORS (e.g. "docx=python-docx") or
+select_extractor(). Throughput is tracked per extractor.
+
+Only the standard library is imported here (parsers are imported on first use),
+so the AgentCore runtime and the Lambda tool (scripts/prereq.sh bundles this
+file next to prerequisite/lambda/python/fetch_data.py) share the same code.
+"""
+import codecs
+import csv
+import functools
+import io
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+FORMATS = ("pdf", "docx", "rtf", "html", "fhir_json", "csv", "text")
+SNIFF_BYTES = 8192  # leading bytes looked at for text-like formats
+DECODE_SAMPLE_BYTES = int(os.environ.get("SMARTGOAL_DECODE_SAMPLE_BYTES", str(64 * 1024)))
+DETECT_SAMPLE_BYTES = 16 * 1024  # statistical detection is slow; it gets a smaller sample
+MIN_DETECT_CONFIDENCE = 0.5
+FALLBACK_ENCODING = "cp1252"  # Latin-1 plus the smart quotes and dashes of Windows exports
+CELL_DELIM = " | "  # between the cells of a table row (DOCX, HTML, CSV)
+
+# Binary signatures we recognise but cannot extract text from
+_UNSUPPORTED_MAGIC = (
+    (b"\x89PNG", "png image"),
+    (b"\xff\xd8\xff", "jpeg image"),
+    (b"GIF8", "gif image"),
+    (b"II*\x00", "tiff image"),
+    (b"MM\x00*", "tiff image"),
+    (b"\xd0\xcf\x11\xe0", "legacy Office document (.doc/.xls)"),
+    (b"\x1f\x8b", "gzip archive"),
+    (b"7z\xbc\xaf", "7z archive"),
+    (b"Rar!", "rar archive"),
+)
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),  # before UTF-16 LE, which it starts with
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# Control bytes other than NUL that do not occur in text (tab, newlines, form feed
+# and escape do): about 10% of compressed or random binary data
+_CONTROL_BYTES = bytes(b for b in range(0x20) if b not in b"\t\n\r") + b"\x7f"
+_C1_UTF8 = re.compile(b"\xc2[\x80-\x9f]")
+_BINARY_BYTES = bytes(b for b in range(1, 0x20) if b not in b"\t\n\r\f\x1b")
+# NUL and other control characters, BOMs and decode replacement characters, which
+# only inflate token counts; tab and newline stay (carriage returns are folded)
+_NOISE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\x9f\ufeff\ufffd]+")
+_HTML_START = re.compile(rb"^\s*(<!doctype\s+html|<html|<head|<body|<!--)", re.IGNORECASE)
+_CSV_DELIMITERS = (",", "\t", ";", "|")
+CSV_MIN_ROWS = 5  # consistent rows that make a table without a header row
+# Extensions that are not delimited tables; CSV is only sniffed for others (or none)
+_NOT_CSV_EXTENSIONS = (".txt", ".text", ".md", ".log", ".note", ".rtf", ".json", ".xml", ".html", ".htm")
+_SENTENCE_END = (".", "!", "?", ":")
+
+
+class UnsupportedFormatError(ValueError):
+    """Content that is binary but not a format with a registered extractor."""
+
+
+# ===================================
+# ===== Text decoding ===============
+# ===================================
+_charset_detect = None
+
+
+def _load_charset_detect():
+    """chardet.detect, or the compatible charset_normalizer.detect (installed with requests), or None."""
+    global _charset_detect
+    if _charset_detect is None:
+        _charset_detect = False
+        for module in ("chardet", "charset_normalizer"):
+            try:
+                _charset_detect = __import__(module).detect
+                break
+            except ImportError:
+                continue
+    return _charset_detect or None
+
+
+def _bom_encoding(head: bytes) -> Optional[str]:
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+
+def _utf16_without_bom(head: bytes) -> Optional[str]:
+    """utf-16-le/-be when every other byte is NUL (mostly-ASCII UTF-16 text), else None."""
+    sample = head[:4096]
+    half = len(sample) // 2
+    if half < 4:
+        return None
+    even_nuls, odd_nuls = sample[0::2].count(0), sample[1::2].count(0)
+    if odd_nuls > 0.7 * half and even_nuls < 0.1 * half:
+        return "utf-16-le"
+    if even_nuls > 0.7 * half and odd_nuls < 0.1 * half:
+        return "utf-16-be"
+    return None
+
+
+def _is_utf8(sample: bytes, complete: bool) -> bool:
+    """Whether sample is valid UTF-8; a character cut off at the end of a partial sample is fine."""
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _detect_statistically(sample: bytes) -> str:
+    detect = _load_charset_detect()
+    if detect is not None:
+        guess = detect(sample[:DETECT_SAMPLE_BYTES]) or {}
+        if guess.get("encoding") and (guess.get("confidence") or 0) >= MIN_DETECT_CONFIDENCE:
+            try:
+                return codecs.lookup(guess["encoding"]).name
+            except LookupError:
+                pass
+    return FALLBACK_ENCODING
+
+
+def detect_encoding(content: bytes) -> str:
+    """
+    Encoding of content, from its first DECODE_SAMPLE_BYTES only: a BOM, then
+    BOM-less UTF-16, then UTF-8 validity of the sample, and statistical
+    detection (chardet or charset_normalizer) only when all of those fail.
+    """
+    sample = content[:DECODE_SAMPLE_BYTES]
+    encoding = _bom_encoding(sample) or _utf16_without_bom(sample)
+    if encoding:
+        return encoding
+    if _is_utf8(sample, complete=len(sample) == len(content)):
+        return "utf-8"
+    return _detect_statistically(sample)
+
+
+@functools.lru_cache(maxsize=None)
+def _noise_bytes(encoding: str) -> bytes:
+    """Bytes that decode to control characters on their own in an ASCII-compatible encoding."""
+    noise = bytearray(_CONTROL_BYTES)
+    if encoding != "utf-8":
+        for b in range(0x80, 0xA0):
+            try:
+                if "\x80" <= bytes([b]).decode(encoding) <= "\x9f":  # C1, e.g. in Latin-1
+                    noise.append(b)
+            except UnicodeDecodeError:
+                continue  # a lead byte or unmapped
+    return bytes(noise)
+
+
+def _strip_noise_bytes(content: bytes, encoding: str) -> bytes:
+    """clean_text on the bytes, before decoding: one translate instead of a regex over the text."""
+    delete = _noise_bytes(encoding)
+    crs = content.count(b"\r")
+    if crs and crs == content.count(b"\r\n"):
+        delete, crs = delete + b"\r", 0  # CRLF only: the CRs just go
+    content = content.translate(None, delete)
+    if crs:
+        content = content.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return content
+
+
+def _decode_clean(content: bytes, encoding: str, errors: str = "strict") -> str:
+    if encoding.startswith(("utf-16", "utf-32")):  # not ASCII-compatible: clean after decoding
+        return clean_text(content.decode(encoding, errors))
+    content = _strip_noise_bytes(content, encoding.replace("-sig", ""))
+    text = content.decode(encoding, errors)
+    # What the byte pass cannot see; rare enough that scanning the whole text is fine
+    if "\ufeff" in text or "\ufffd" in text or (encoding.startswith("utf-8") and _C1_UTF8.search(content)):
+        text = _NOISE.sub("", text)
+    return text
+
+
+def clean_text(text: str) -> str:
+    """Drop NUL/control characters, BOMs and replacement characters; CRLF and CR become LF."""
+    # Via UTF-8 bytes: a translate and two C-speed codec passes beat a regex over the str
+    return _decode_clean(text.encode("utf-8", "surrogatepass"), "utf-8", "surrogatepass")
+
+
+def decode_text(content: bytes) -> str:
+    """
+    Bytes to clean text (see clean_text) with a single decode: the encoding
+    comes from a sample (detect_encoding), and noise is stripped from the
+    bytes before decoding when the encoding is ASCII-compatible. Only when
+    later bytes contradict the sample (e.g. an ASCII header over a cp1252
+    body) is the encoding re-detected from where decoding failed.
+    """
+    encoding = detect_encoding(content)
+    try:
+        return _decode_clean(content, encoding)
+    except UnicodeDecodeError as e:
+        # e.start is into the stripped bytes, so at or a little before the failure in content
+        encoding = _detect_statistically(content[e.start:e.start + DECODE_SAMPLE_BYTES])
+        return _decode_clean(content, encoding, errors="replace")
+
+
+# ===================================
+# ===== Format sniffing =============
+# ===================================
+def _is_docx(content: bytes) -> bool:
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            return "word/document.xml" in zf.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def _is_header_row(row: List[str]) -> bool:
+    """Short, distinct, non-numeric labels, none of them a sentence ("Lab", "Value", "Unit")."""
+    cells = [cell.strip() for cell in row]
+    if len(set(cells)) != len(cells):
+        return False
+    for cell in cells:
+        if not cell or len(cell) > 32 or len(cell.split()) > 4 or cell.endswith(_SENTENCE_END):
+            return False
+        if cell.replace(".", "", 1).replace("-", "", 1).isdigit():
+            return False
+    return True
+
+
+def _looks_like_csv(text: str) -> bool:
+    """
+    At least three lines that all parse to the same number of fields for one
+    delimiter (two or more for tabs, three or more otherwise: prose often has
+    one comma per line), and either a header-like first row or CSV_MIN_ROWS
+    such lines. Prose with a couple of commas per sentence has neither.
+    """
+    lines = [line for line in text.splitlines()[:20] if line.strip()]
+    if len(lines) == 20 or not text.endswith(("\n", "\r")):
+        lines = lines[:-1]  # the sample may have cut the last line short
+    if len(lines) < 3:
+        return False
+    for delim in _CSV_DELIMITERS:
+        try:
+            rows = list(csv.reader(lines, delimiter=delim))
+        except csv.Error:
+            continue
+        widths = {len(row) for row in rows}
+        if len(widths) != 1 or widths.pop() < (2 if delim == "\t" else 3):
+            continue
+        if _is_header_row(rows[0]) or len(rows) >= CSV_MIN_ROWS:
+            return True
+    return False
+
+
+def sniff_format(content: bytes, uri: str = "") -> str:
+    """
+    The format of content: one of FORMATS. Raises UnsupportedFormatError for
+    recognised binary data that has no extractor, and for control-byte-laden
+    data that is not text in any encoding.
+    """
+    head = content[:SNIFF_BYTES]
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        if _is_docx(content):
+            return "docx"
+        raise UnsupportedFormatError("Unsupported document format: zip archive (not a DOCX document)")
+    for magic, name in _UNSUPPORTED_MAGIC:
+        if head.startswith(magic):
+            raise UnsupportedFormatError(f"Unsupported document format: {name}")
+
+    encoding = _bom_encoding(head) or _utf16_without_bom(head)
+    if encoding is None and (
+        sum(head.count(b) for b in _BINARY_BYTES) > 0.05 * len(head) or head.count(0) > 0.5 * len(head)
+    ):
+        # Sparse NULs (padding in fixed-width exports) are noise, stripped on decode
+        raise UnsupportedFormatError("Unsupported document format: binary data")
+    if encoding and encoding != "utf-8-sig":
+        head = head.decode(encoding, errors="ignore").encode("utf-8")  # sniff UTF-16/32 as text
+    stripped = head[len(codecs.BOM_UTF8):] if head.startswith(codecs.BOM_UTF8) else head
+    stripped = stripped.lstrip()
+    if stripped.startswith(b"{\\rtf"):
+        return "rtf"
+    if _HTML_START.match(stripped):
+        return "html"
+
+    ext = os.path.splitext(uri.lower().split("?", 1)[0])[1]
+    if stripped.startswith((b"{", b"[")) and b'"resourceType"' in head:
+        return "fhir_json"
+    if ext in (".html", ".htm") and b"<" in head:
+        return "html"
+    if ext in (".csv", ".tsv"):
+        return "csv"
+    if ext not in _NOT_CSV_EXTENSIONS and _looks_like_csv(head.decode("utf-8", errors="ignore")):
+        return "csv"
+    return "text"
+
+
+# ===================================
+# ===== Registry ====================
+# ===================================
+_registry: Dict[str, Dict[str, Callable[[bytes], str]]] = {fmt: {} for fmt in FORMATS}
+_selected: Dict[str, str] = {}
+_stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+def register_extractor(fmt: str, name: str, default: bool = False):
+    """Decorator: register fn(content) -> text as extractor `name` for `fmt`."""
+    def decorator(fn: Callable[[bytes], str]) -> Callable[[bytes], str]:
+        _registry.setdefault(fmt, {})[name] = fn
+        if default or fmt not in _selected:
+            _selected[fmt] = name
+        return fn
+    return decorator
+
+
+def select_extractor(fmt: str, name: str):
+    """Use the extractor registered as `name` for `fmt` from now on."""
+    if name not in _registry.get(fmt, {}):
+        raise ValueError(f"No extractor {name!r} for {fmt}; registered: {sorted(_registry.get(fmt, {}))}")
+    _selected[fmt] = name
+
+
+def get_extractor(fmt: str) -> Tuple[str, Callable[[bytes], str]]:
+    """(name, fn) of the extractor in use for fmt."""
+    name = _selected.get(fmt)
+    if name is None:
+        raise UnsupportedFormatError(f"No extractor registered for {fmt}")
+    return name, _registry[fmt][name]
+
+
+def parse_document(uri: str, content: bytes, fmt: Optional[str] = None) -> str:
+    """Text of a document (format sniffed unless given). Records no metrics, so it
+    can run in the extraction pool's worker processes."""
+    return get_extractor(fmt or sniff_format(content, uri))[1](content)
+
+
+def record_extraction(fmt: str, size: int, chars: int, seconds: float, error: bool = False):
+    key = (fmt, _selected.get(fmt, "?"))
+    with _stats_lock:
+        stats = _stats.setdefault(key, {"calls": 0, "errors": 0, "bytes": 0, "chars": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["errors"] += int(error)
+        stats["bytes"] += size
+        stats["chars"] += chars
+        stats["seconds"] += seconds
+
+
+def extract_text(content: bytes, uri: str = "", fmt: Optional[str] = None) -> str:
+    """parse_document, recording the extractor's throughput."""
+    fmt = fmt or sniff_format(content, uri)
+    started = time.perf_counter()
+    try:
+        text = parse_document(uri, content, fmt)
+    except Exception:
+        record_extraction(fmt, len(content), 0, time.perf_counter() - started, error=True)
+        raise
+    record_extraction(fmt, len(content), len(text), time.perf_counter() - started)
+    return text
+
+
+def extractor_metrics() -> dict:
+    """Per-extractor calls, errors, and throughput in MB/s of input."""
+    with _stats_lock:
+        snapshot = {f"{fmt}/{name}": dict(stats) for (fmt, name), stats in _stats.items()}
+    for stats in snapshot.values():
+        seconds = stats.pop("seconds")
+        stats["ms_avg"] = round(seconds * 1000 / stats["calls"], 2) if stats["calls"] else None
+        stats["mb_per_s"] = round(stats["bytes"] / 1e6 / seconds, 2) if seconds else None
+    return {"selected": dict(_selected), "extractors": snapshot}
+
+
+# ===================================
+# ===== Extractors ==================
+# ===================================
+@register_extractor("pdf", "pypdf2")
+def _pdf_pypdf2(content: bytes) -> str:
+    from PyPDF2 import PdfReader
+    reader = PdfReader(io.BytesIO(content))
+    parts = []
+    for page in reader.pages:
+        try:
+            parts.append(page.extract_text() or "")
+        except Exception:
+            continue
+    return "\n".join(p.strip() for p in parts if p)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_TAGS = [_W + tag for tag in ("p", "tc", "tr", "t", "tab", "br", "cr")]
+_lxml_etree = None
+
+
+def _load_lxml():
+    """lxml.etree (installed with python-docx) when available, else None."""
+    global _lxml_etree
+    if _lxml_etree is None:
+        try:
+            from lxml import etree
+            _lxml_etree = etree
+        except ImportError:
+            _lxml_etree = False
+    return _lxml_etree or None
+
+
+def iter_docx_blocks(content: bytes) -> Iterator[str]:
+    """
+    Paragraphs and table rows of a DOCX, in document order, streamed from
+    word/document.xml with an incremental parser (no python-docx object model).
+    A table row is its cells' text joined by CELL_DELIM; a table nested in a
+    cell is folded into that cell. Finished blocks are dropped from the tree,
+    so memory stays bounded by the largest single block. lxml filters the tags
+    in C; the ElementTree fallback sees every element and is about 2x slower.
+    """
+    paragraphs: List[List[str]] = []  # text runs of the open (possibly nested) paragraphs
+    cells: List[List[str]] = []       # paragraphs of the open table cells
+    rows: List[List[str]] = []        # cells of the open table rows
+    body = None
+    lxml = _load_lxml()
+    with zipfile.ZipFile(io.BytesIO(content)) as zf, zf.open("word/document.xml") as xml:
+        if lxml is not None:
+            events = lxml.iterparse(xml, events=("start", "end"), tag=_DOCX_TAGS)
+        else:
+            events = ElementTree.iterparse(xml, events=("start", "end"))
+        for event, elem in events:
+            tag = elem.tag
+            if event == "start":
+                if tag == _W + "p":
+                    paragraphs.append([])
+                elif tag == _W + "tc":
+                    cells.append([])
+                elif tag == _W + "tr":
+                    rows.append([])
+                elif tag == _W + "body":
+                    body = elem
+                continue
+
+            if tag == _W + "t" and paragraphs:
+                paragraphs[-1].append(elem.text or "")
+            elif tag == _W + "tab" and paragraphs:
+                paragraphs[-1].append("\t")
+            elif tag in (_W + "br", _W + "cr") and paragraphs:
+                paragraphs[-1].append("\n")
+            elif tag == _W + "p":
+                text = "".join(paragraphs.pop()).strip()
+                if not text:
+                    pass
+                elif paragraphs:  # text box inside a paragraph
+                    paragraphs[-1].append(" " + text)
+                elif cells:
+                    cells[-1].append(text)
+                else:
+                    yield text
+            elif tag == _W + "tc":
+                text = " ".join(cells.pop())
+                if rows:
+                    rows[-1].append(text)
+            elif tag == _W + "tr":
+                row = rows.pop()
+                text = CELL_DELIM.join(row) if any(row) else ""
+                if text and cells:
+                    cells[-1].append(text)
+                elif text:
+                    yield text
+            else:
+                continue
+            elem.clear()
+            if not paragraphs and not cells:
+                # Top-level block done: drop the finished elements from the tree
+                if lxml is not None:
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+                elif body is not None:
+                    body.clear()
+
+
+@register_extractor("docx", "streaming", default=True)
+def _docx_streaming(content: bytes) -> str:
+    return "\n".join(iter_docx_blocks(content))
+
+
+@register_extractor("docx", "python-docx")
+def _docx_python_docx(content: bytes) -> str:
+    """Body paragraphs only (tables are skipped), as python-docx exposes them."""
+    from docx import Document
+    d = Document(io.BytesIO(content))
+    return "\n".join(p.text for p in d.paragraphs if p.text)
+
+
+@register_extractor("text", "decode")
+def _text_decode(content: bytes) -> str:
+    return decode_text(content)
+
+
+class _HTMLText(HTMLParser):
+    """Visible text of an HTML page: one line per block, table cells joined by CELL_DELIM."""
+
+    BLOCKS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section",
+              "article", "header", "footer", "ul", "ol", "table", "pre", "blockquote", "title", "dt", "dd"}
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self._line: List[str] = []
+        self._skip_depth = 0
+
+    def _flush(self):
+        line = re.sub(r"\s+", " ", "".join(self._line)).strip(" |")
+        if line:
+            self.lines.append(line)
+        self._line = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.BLOCKS:
+            self._flush()
+        elif tag in ("td", "th") and self._line:
+            self._line.append(CELL_DELIM)
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCKS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._line.append(data)
+
+
+@register_extractor("html", "html.parser")
+def _html_text(content: bytes) -> str:
+    parser = _HTMLText()
+    parser.feed(decode_text(content))
+    parser.close()
+    parser._flush()
+    return "\n".join(parser.lines)
+
+
+# RTF destinations whose content is not document text
+_RTF_SKIP_DESTINATIONS = {
+    "fonttbl", "colortbl", "stylesheet", "info", "pict", "header", "footer", "headerl", "headerr",
+    "footerl", "footerr", "listtable", "listoverridetable", "rsidtbl", "generator", "xmlnstbl",
+    "themedata", "colorschememapping", "datastore", "latentstyles", "object", "fldinst",
+}
+_RTF_TOKEN = re.compile(r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|([^\\{}\r\n]+)", re.I)
+
+
+@register_extractor("rtf", "rtf-strip")
+def _rtf_text(content: bytes) -> str:
+    """Plain text of an RTF document: control words dropped, \\par/\\tab/\\'xx/\\uN decoded."""
+    rtf = content.decode("latin-1")
+    out: List[str] = []
+    stack: List[Tuple[bool, int]] = []
+    skip, uc_skip, pending_skip = False, 1, 0
+    for word, arg, hex_char, symbol, brace, text in (m.groups() for m in _RTF_TOKEN.finditer(rtf)):
+        if brace == "{":
+            stack.append((skip, uc_skip))
+        elif brace == "}":
+            skip, uc_skip = stack.pop() if stack else (False, 1)
+        elif symbol == "*":
+            skip = True  # {\* ...}: optional destination we do not know
+        elif symbol is not None:
+            if not skip and symbol in "\\{}":
+                out.append(symbol)
+            elif not skip and symbol == "~":
+                out.append(" ")
+        elif word is not None:
+            word = word.lower()
+            if word in _RTF_SKIP_DESTINATIONS:
+                skip = True
+            elif word == "uc":
+                uc_skip = int(arg or 1)
+            elif skip:
+                pass
+            elif word in ("par", "line", "row", "sect", "page"):
+                out.append("\n")
+            elif word == "tab":
+                out.append("\t")
+            elif word == "cell":
+                out.append(CELL_DELIM)
+            elif word == "u" and arg:
+                out.append(chr(int(arg) % 65536))
+                pending_skip = uc_skip  # the ANSI fallback characters that follow
+        elif hex_char is not None:
+            if pending_skip:
+                pending_skip -= 1
+            elif not skip:
+                out.append(bytes([int(hex_char, 16)]).decode("cp1252", errors="replace"))
+        elif text is not None and not skip:
+            if pending_skip:
+                drop = min(pending_skip, len(text))
+                text, pending_skip = text[drop:], pending_skip - drop
+            out.append(text)
+    lines = (re.sub(r"[ \t]+", " ", line).strip(" |") for line in "".join(out).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+@register_extractor("csv", "csv")
+def _csv_text(content: bytes) -> str:
+    text = decode_text(content)
+    try:
+        dialect = csv.Sniffer().sniff(text[:SNIFF_BYTES], delimiters="".join(_CSV_DELIMITERS))
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(io.StringIO(text), dialect)
+    return "\n".join(CELL_DELIM.join(cell.strip() for cell in row) for row in rows if any(row))
+
+
+def _concept(value) -> str:
+    """Display text of a CodeableConcept (or a CodeableReference / Reference)."""
+    if not isinstance(value, dict):
+        return ""
+    if "concept" in value:
+        return _concept(value["concept"])
+    if value.get("text"):
+        return value["text"]
+    for coding in value.get("coding") or []:
+        if coding.get("display") or coding.get("code"):
+            return coding.get("display") or coding["code"]
+    return value.get("display", "")
+
+
+def _fhir_value(resource: dict) -> str:
+    quantity = resource.get("valueQuantity")
+    if isinstance(quantity, dict) and "value" in quantity:
+        return f"{quantity['value']} {quantity.get('unit') or quantity.get('code') or ''}".strip()
+    for key in ("valueString", "valueBoolean", "valueInteger", "valueDateTime"):
+        if key in resource:
+            return str(resource[key])
+    return _concept(resource.get("valueCodeableConcept"))
+
+
+def _fhir_line(resource: dict) -> str:
+    """One line per resource: type, what, value and when."""
+    kind = resource.get("resourceType", "Resource")
+    if kind == "Patient":
+        names = resource.get("name") or [{}]
+        name = names[0].get("text") or " ".join(names[0].get("given", []) + [names[0].get("family", "")])
+        parts = [name.strip(), resource.get("gender", ""), f"born {resource['birthDate']}" if resource.get("birthDate") else ""]
+    else:
+        what = ""
+        for key in ("code", "medicationCodeableConcept", "medicationReference", "medication",
+                    "vaccineCode", "type", "category"):
+            value = resource.get(key)
+            what = _concept(value[0] if isinstance(value, list) and value else value)
+            if what:
+                break
+        parts = [what, _fhir_value(resource)]
+        for component in resource.get("component") or []:
+            parts.append(f"{_concept(component.get('code'))} {_fhir_value(component)}".strip())
+        dosage = (resource.get("dosage") or resource.get("dosageInstruction") or [{}])[0]
+        parts.append(dosage.get("text", "") if isinstance(dosage, dict) else "")
+        when = next((resource[key] for key in ("effectiveDateTime", "onsetDateTime", "authoredOn", "issued",
+                                               "recordedDate", "date", "occurrenceDateTime") if resource.get(key)), "")
+        status = resource.get("status") or _concept(resource.get("clinicalStatus"))
+        parts += [f"({status})" if status else "", when]
+    return f"{kind}: " + CELL_DELIM.join(p for p in parts if p)
+
+
+@register_extractor("fhir_json", "fhir")
+def _fhir_text(content: bytes) -> str:
+    """A FHIR resource or Bundle (JSON or NDJSON) as one line per resource."""
+    text = decode_text(content)
+    try:
+        documents = [json.loads(text)]
+    except json.JSONDecodeError:
+        documents = [json.loads(line) for line in text.splitlines() if line.strip()]
+    resources: List[dict] = []
+    while documents:
+        document = documents.pop(0)
+        if isinstance(document, list):
+            documents = document + documents
+        elif isinstance(document, dict) and document.get("resourceType") == "Bundle":
+            documents = [entry.get("resource") for entry in document.get("entry") or [] if entry.get("resource")] + documents
+        elif isinstance(document, dict):
+            resources.append(document)
+    return "\n".join(_fhir_line(resource) for resource in resources)
+
+
+def _apply_env_selection():
+    """SMARTGOAL_EXTRACTORS="docx=python-docx,pdf=pypdf2" picks extractors per format."""
+    for pair in filter(None, os.environ.get("SMARTGOAL_EXTRACTORS", "").split(",")):
+        fmt, _, name = pair.partition("=")
+        try:
+            select_extractor(fmt.strip(), name.strip())
+        except ValueError as e:
+            print(f"⚠️ Ignoring SMARTGOAL_EXTRACTORS entry {pair!r}: {e}")
+
+
+_apply_env_selection()
@@ -0,0 +1,231 @@
+"""
+Hedged model calls: cut Bedrock tail latency by racing a second request.
+
+If the primary call has not produced its first tokens within the model's
+hedge budget, a secondary request is sent to a hedge target, the same model in
+another region or an equivalent model, and whichever finishes first wins; the
+other is cancelled. Only streamed calls (which mark their first token) are
+hedged: a completion time is not a time to first token.
+
+The budget is a percentile (HEDGE_PERCENTILE, p95 by default) of the model's
+recently observed time to first token, so roughly 1 in 20 calls is hedged and
+the extra Bedrock spend stays bounded. Until MIN_SAMPLES calls have been seen
+the fixed HEDGE_DELAY_MS is used.
+
+The loser is cancelled, so its latency is never observed. To report the p99
+improvement honestly a small control group (CONTROL_RATE of eligible calls) is
+never hedged, and its p99 is compared with the p99 of hedge-eligible calls once
+MIN_CONTROL_SAMPLES control calls have been seen.
+
+Hedge targets, e.g.:
+    SMARTGOAL_HEDGE_REGION=us-west-2            every model, same id, other region
+    SMARTGOAL_HEDGE_TARGETS="us.anthropic.claude-3-7-sonnet-20250219-v1:0=us.amazon.nova-premier-v1:0;
+                             mistral.mistral-7b-instruct-v0:2=mistral.mistral-7b-instruct-v0:2@us-west-2"
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+HEDGE_PERCENTILE = float(os.environ.get("SMARTGOAL_HEDGE_PERCENTILE", "95"))
+HEDGE_DELAY_MS = float(os.environ.get("SMARTGOAL_HEDGE_DELAY_MS", "3000"))
+HEDGE_MIN_DELAY_MS = float(os.environ.get("SMARTGOAL_HEDGE_MIN_DELAY_MS", "1000"))
+MIN_SAMPLES = int(os.environ.get("SMARTGOAL_HEDGE_MIN_SAMPLES", "20"))
+CONTROL_RATE = float(os.environ.get("SMARTGOAL_HEDGE_CONTROL_RATE", "0.02"))
+MIN_CONTROL_SAMPLES = 100      # below this a control p99 is noise
+WINDOW = 500
+HEDGE_PRIORITIES = tuple(
+    p.strip() for p in os.environ.get("SMARTGOAL_HEDGE_PRIORITIES", "interactive").split(",") if p.strip()
+)
+
+
+def _parse_targets(spec: str) -> Dict[str, str]:
+    targets = {}
+    for item in spec.replace("\n", ";").split(";"):
+        primary, _, secondary = item.partition("=")
+        if primary.strip() and secondary.strip():
+            targets[primary.strip()] = secondary.strip()
+    return targets
+
+
+HEDGE_REGION = os.environ.get("SMARTGOAL_HEDGE_REGION", "").strip()
+HEDGE_TARGETS = _parse_targets(os.environ.get("SMARTGOAL_HEDGE_TARGETS", ""))
+
+
+def hedge_target(model_id: str) -> Optional[Tuple[str, Optional[str]]]:
+    """(model_id, region or None) to hedge model_id with, or None if it has no target."""
+    target = HEDGE_TARGETS.get(model_id)
+    if target is None and HEDGE_REGION:
+        target = f"{model_id}@{HEDGE_REGION}"
+    if target is None:
+        return None
+    secondary, _, region = target.partition("@")
+    return secondary, (region or None)
+
+
+def target_key(model_id: str, region: Optional[str]) -> str:
+    """Limiter/metrics key of a hedge target."""
+    return f"{model_id}@{region}" if region else model_id
+
+
+def _percentile(ordered, pct: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# ==================================
+# ===== Per-model latency stats ====
+# ==================================
+class _ModelStats:
+    def __init__(self):
+        self.first_token_s = deque(maxlen=WINDOW)   # primary time to first token (lower bound if cancelled)
+        self.delivered_s = deque(maxlen=WINDOW)     # latency of hedge-eligible calls
+        self.control_s = deque(maxlen=WINDOW)       # latency of control calls (never hedged)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedge_failures = 0
+
+
+_stats: Dict[str, _ModelStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _model_stats(model_id: str) -> _ModelStats:
+    stats = _stats.get(model_id)
+    if stats is None:
+        stats = _stats[model_id] = _ModelStats()
+    return stats
+
+
+def hedge_budget_s(model_id: str) -> float:
+    """Time to wait for the primary's first tokens before hedging."""
+    with _stats_lock:
+        samples = sorted(_model_stats(model_id).first_token_s)
+    if len(samples) < MIN_SAMPLES:
+        return HEDGE_DELAY_MS / 1000
+    return max(HEDGE_MIN_DELAY_MS / 1000, _percentile(samples, HEDGE_PERCENTILE))
+
+
+class FirstToken:
+    """Set by a call when its first tokens arrive; records the time it took."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed_s: Optional[float] = None
+        self.event = asyncio.Event()
+
+    def mark(self):
+        if self.elapsed_s is None:
+            self.elapsed_s = time.perf_counter() - self.started
+            self.event.set()
+
+
+# ==================================
+# ===== Hedged call ================
+# ==================================
+async def call_hedged(
+    model_id: str,
+    primary: Callable[[FirstToken], Awaitable],
+    secondary: Optional[Callable[[FirstToken], Awaitable]],
+    info: Optional[dict] = None,
+):
+    """
+    Await primary(first_token); if its first tokens are late, race secondary(first_token).
+    info (if given) is filled with {"hedged", "winner", "budget_ms", "control"}.
+    """
+    info = info if info is not None else {}
+    budget = hedge_budget_s(model_id)
+    control = secondary is not None and random.random() < CONTROL_RATE
+    if control:
+        secondary = None
+    first = FirstToken()
+    primary_task = asyncio.ensure_future(primary(first))
+    secondary_task = None
+    info.update({"hedged": False, "winner": "primary", "budget_ms": round(budget * 1000), "control": control})
+
+    try:
+        if secondary is not None:
+            waiter = asyncio.ensure_future(first.event.wait())
+            try:
+                await asyncio.wait({primary_task, waiter}, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            if not primary_task.done() and not first.event.is_set():
+                info["hedged"] = True
+                secondary_task = asyncio.ensure_future(secondary(FirstToken()))
+
+        if secondary_task is None:
+            return await primary_task
+
+        # First successful answer wins; a failed call leaves the race to the other one
+        pending = {primary_task, secondary_task}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    info["winner"] = "secondary" if task is secondary_task else "primary"
+                    return task.result()
+                if task is secondary_task:
+                    info["secondary_error"] = str(task.exception())
+        return primary_task.result()
+    finally:
+        primary_cancelled = not primary_task.done()
+        for task in (primary_task, secondary_task):
+            if task is not None and not task.done():
+                task.cancel()
+        _record(model_id, first, info, primary_cancelled)
+
+
+def _record(model_id: str, first: FirstToken, info: dict, primary_cancelled: bool = False):
+    elapsed = time.perf_counter() - first.started
+    with _stats_lock:
+        stats = _model_stats(model_id)
+        stats.calls += 1
+        (stats.control_s if info.get("control") else stats.delivered_s).append(elapsed)
+        if first.elapsed_s is not None:
+            stats.first_token_s.append(first.elapsed_s)
+        elif primary_cancelled:
+            # A cancelled primary had not answered yet: its elapsed time is a lower bound
+            stats.first_token_s.append(elapsed)
+        # A primary that finished or failed without a first token has no sample
+        if info.get("hedged"):
+            stats.hedged += 1
+            if info.get("winner") == "secondary":
+                stats.hedge_wins += 1
+            if info.get("secondary_error"):
+                stats.hedge_failures += 1
+
+
+def hedge_metrics() -> Dict[str, dict]:
+    """Hedge rate and p99 of hedge-eligible vs control (unhedged) calls per model."""
+    out = {}
+    with _stats_lock:
+        for model_id, stats in _stats.items():
+            p99 = _percentile(sorted(stats.delivered_s), 99)
+            p99_control = None
+            if len(stats.control_s) >= MIN_CONTROL_SAMPLES:
+                p99_control = _percentile(sorted(stats.control_s), 99)
+            out[model_id] = {
+                "calls": stats.calls,
+                "hedged": stats.hedged,
+                "hedge_wins": stats.hedge_wins,
+                "hedge_failures": stats.hedge_failures,
+                "hedge_rate": round(stats.hedged / stats.calls, 3) if stats.calls else 0.0,
+                "p99_ms": round(p99 * 1000) if p99 is not None else None,
+                "control_calls": len(stats.control_s),
+                "p99_control_ms": round(p99_control * 1000) if p99_control is not None else None,
+                "p99_improvement_ms": (
+                    round((p99_control - p99) * 1000) if p99 is not None and p99_control is not None else None
+                ),
+            }
+    for model_id in out:
+        out[model_id]["budget_ms"] = round(hedge_budget_s(model_id) * 1000)
+    return out
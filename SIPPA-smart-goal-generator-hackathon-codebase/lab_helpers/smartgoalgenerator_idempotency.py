@@ -0,0 +1,175 @@
+"""
+Idempotency keys, single-flight coalescing and a short-lived result cache.
+
+Streamlit reruns and double-clicks can submit the same upload twice, each
+with a fresh S3 key. An invocation's key is either the caller's
+"idempotency_key" or derived from what determines the result: a fingerprint
+of the document content (S3 ETag and size from a HEAD, or a SHA-256 of a local
+file), the model id, the prompt text, result-affecting options and the
+analyzer prompt version. Keys are always scoped to the actor, so one user can
+never be served another user's record.
+
+Concurrent invocations with the same key share one in-flight computation; it
+runs as its own task, so a caller that disconnects does not cancel it for the
+others. Successful (200) results are kept for RESULT_CACHE_TTL_S, in memory
+or, with several server workers, in the container's shared cache so a
+duplicate that reaches another worker is replayed too.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import boto3
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+IDEMPOTENCY_ENABLED = os.environ.get("SMARTGOAL_IDEMPOTENCY", "1") != "0"
+RESULT_CACHE_TTL_S = float(os.environ.get("SMARTGOAL_RESULT_CACHE_TTL_S", "300"))
+RESULT_CACHE_SIZE = int(os.environ.get("SMARTGOAL_RESULT_CACHE_SIZE", "256"))
+# Payload options that change the result (besides the prompt and the document)
+KEYED_OPTIONS = ("model_id", "evaluate", "latency_budget_ms", "cost_budget_usd")
+
+_s3_client = None
+
+
+def _s3():
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client("s3")
+    return _s3_client
+
+
+def content_fingerprint(file_path: str) -> Optional[str]:
+    """Cheap identity of an uploaded document's content, or None if it cannot be had."""
+    try:
+        if file_path.lower().startswith("s3://"):
+            bucket, _, key = file_path[5:].partition("/")
+            head = _s3().head_object(Bucket=bucket, Key=key)
+            etag = head.get("ETag", "").strip('"')
+            return f"s3:{etag}:{head.get('ContentLength')}"
+        if os.path.isfile(file_path):
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            return f"sha256:{digest.hexdigest()}"
+    except Exception as e:
+        print(f"⚠️ Could not fingerprint {file_path}: {e}")
+    return None
+
+
+def derive_key(payload: dict, user_input: str, file_path: Optional[str], prompt_version: str) -> Optional[str]:
+    """Idempotency key from content, model, prompt and options; None when the content is unknown."""
+    fingerprint = None
+    if file_path:
+        fingerprint = content_fingerprint(file_path)
+        if fingerprint is None:
+            return None
+    material = {
+        "content": fingerprint,
+        "prompt": user_input,
+        "prompt_version": prompt_version,
+        **{k: payload.get(k) for k in KEYED_OPTIONS},
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# ==================================
+# ===== Single flight + cache ======
+# ==================================
+class SingleFlight:
+    """Coalesces concurrent calls per key and caches successful results for a while."""
+
+    def __init__(self, ttl_s: float = RESULT_CACHE_TTL_S, max_entries: int = RESULT_CACHE_SIZE, shared=None):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.shared = shared  # a SharedCache, or None for the in-process cache
+        self._cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.stats = {"computed": 0, "coalesced": 0, "cache_hits": 0}
+
+    def _cached(self, key: str) -> Optional[dict]:
+        if self.shared is not None:
+            return self.shared.get("results", key)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return result
+
+    def _store(self, key: str, result: dict):
+        if self.shared is not None:
+            self.shared.set("results", key, result, self.ttl_s, self.max_entries)
+            return
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl_s, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    async def _off_loop(self, fn, *args):
+        # Shared-cache calls are SQLite I/O that can wait on another worker's write lock
+        if self.shared is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[dict]]) -> Tuple[dict, str]:
+        """(result, how): how is "computed", "coalesced" or "cache_hit"."""
+        cached = await self._off_loop(self._cached, key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached, "cache_hit"
+
+        task = self._in_flight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task), "coalesced"
+
+        async def _compute():
+            result = await compute()
+            if isinstance(result, dict) and result.get("statusCode") == 200:
+                await self._off_loop(self._store, key, result)
+            return result
+
+        def _forget(done_task):
+            if self._in_flight.get(key) is done_task:
+                del self._in_flight[key]
+
+        task = asyncio.ensure_future(_compute())
+        self._in_flight[key] = task
+        task.add_done_callback(_forget)
+        self.stats["computed"] += 1
+        return await asyncio.shield(task), "computed"
+
+    def snapshot(self) -> dict:
+        if self.shared is not None:
+            cached = self.shared.snapshot()["entries"].get("results", 0)
+        else:
+            with self._lock:
+                cached = len(self._cache)
+        return {**self.stats, "cached_results": cached, "in_flight": len(self._in_flight), "ttl_s": self.ttl_s}
+
+
+def scoped_key(actor_id: str, key: str) -> str:
+    """Keys never match across actors."""
+    return hashlib.sha256(f"{actor_id}\0{key}".encode()).hexdigest()
+
+
+def with_replay_headers(result: dict, key: str, how: str) -> dict:
+    """Copy of result with headers telling the caller whether it was replayed."""
+    headers = {**(result.get("headers") or {}), "Idempotency-Key": key}
+    if how != "computed":
+        headers["Idempotent-Replayed"] = how
+    return {**result, "headers": headers}
@@ -4,21 +4,31 @@ MCP Tools for Smart Goal Generator
 from strands import tool
 import os
 import io
+import asyncio
 import boto3
-import requests
-import chardet
-from docx import Document
-from PyPDF2 import PdfReader
 
-import json, time, uuid, re, mimetypes
+import glob, json, time, uuid, re, heapq, mmap, hashlib, zipfile
 from typing import Tuple, List, Optional
 
 from botocore.exceptions import BotoCoreError, ClientError
 
+from lab_helpers.smartgoalgenerator_extraction_pool import get_extraction_pool
+from lab_helpers.smartgoalgenerator_extractors import parse_document, record_extraction, sniff_format
+from lab_helpers.smartgoalgenerator_run_store import get_indexed_runs, get_run_store
+
+# Heavy or optional dependencies (PyPDF2, requests, aioboto3) are imported at
+# their first use, and the S3 client is created on the first read,
+# so importing this module stays cheap for the runtime's cold start.
 
 # Globals
-s3_client = boto3.client("s3")
+_s3_client = None
 DEFAULT_SOURCE = None
+# Extracted PDF/DOCX text is kept in the container's shared cache (see
+# smartgoalgenerator_shared_cache), keyed by a hash of the bytes, so a document
+# is parsed once per container rather than once per request and per worker.
+EXTRACTION_CACHE_ENABLED = os.environ.get("SMARTGOAL_EXTRACTION_CACHE", "1") != "0"
+EXTRACTION_CACHE_TTL_S = float(os.environ.get("SMARTGOAL_EXTRACTION_CACHE_TTL_S", "3600"))
+EXTRACTION_CACHE_SIZE = int(os.environ.get("SMARTGOAL_EXTRACTION_CACHE_SIZE", "512"))
 DATA_LOG_FILE = "/tmp/fetch_data_log.txt"  # Lambda safe tmp storage
 
 ROW_DELIM = "@"                        # row delimiter for raw data
@@ -26,6 +36,14 @@ ROW_DELIM = "@"                        # row delimiter for raw data
 # ======================
 # ===== S3 helpers =====
 # ======================
+def _get_s3_client():
+    """One S3 client per process, created on first use."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client("s3")
+    return _s3_client
+
+
 def _parse_s3_uri(uri: str) -> Tuple[str, str]:
     # s3://bucket/key -> (bucket, key)
     assert uri.lower().startswith("s3://"), "Not an s3:// URI"
@@ -42,7 +60,7 @@ def _read_s3_object(s3_path: str) -> bytes:
     Returns raw bytes.
     """
     bucket, key = _parse_s3_uri(s3_path)
-    s3 = boto3.client("s3")
+    s3 = _get_s3_client()
     try:
         obj = s3.get_object(Bucket=bucket, Key=key)
         return obj["Body"].read()
@@ -56,7 +74,7 @@ def _list_s3_uris(s3_prefix: str, extensions: Optional[List[str]] = None) -> Lis
     Optionally filter by extensions ['.docx', '.pdf', '.txt'] (case-insensitive).
     """
     bucket, prefix = _parse_s3_uri(s3_prefix)
-    s3 = boto3.client("s3")
+    s3 = _get_s3_client()
     uris = []
     paginator = s3.get_paginator("list_objects_v2")
     for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
@@ -72,34 +90,90 @@ def _list_s3_uris(s3_prefix: str, extensions: Optional[List[str]] = None) -> Lis
     return uris
 
 
-def _ext_or_mime(uri: str, content_bytes: bytes) -> str:
-    mime, _ = mimetypes.guess_type(uri)
-    return mime or "application/octet-stream"
+def _extract_text_from_bytes(uri: str, content: bytes) -> str:
+    """
+    Extract text in whatever format the content turns out to be (PDF, DOCX, RTF,
+    HTML, CSV, FHIR JSON, text), see smartgoalgenerator_extractors.
+    """
+    return parse_document(uri, content)
+
+
+def _parse(uri: str, content: bytes, fmt: str) -> str:
+    """parse_document, in the extraction process pool for large PDF/DOCX documents."""
+    started = time.perf_counter()
+    try:
+        text = get_extraction_pool().extract(parse_document, uri, content, fmt)
+    except Exception:
+        record_extraction(fmt, len(content), 0, time.perf_counter() - started, error=True)
+        raise
+    record_extraction(fmt, len(content), len(text), time.perf_counter() - started)
+    return text
+
+
+def _extract_text(uri: str, content: bytes) -> str:
+    """_parse through the shared extraction cache (PDF and DOCX only)."""
+    fmt = sniff_format(content, uri)
+    if not EXTRACTION_CACHE_ENABLED or fmt not in ("pdf", "docx"):
+        return _parse(uri, content, fmt)
+    from lab_helpers.smartgoalgenerator_shared_cache import get_shared_cache
+    cache = get_shared_cache()
+    key = f"{hashlib.sha256(content).hexdigest()}.{fmt}"
+    text = cache.get("extraction", key)
+    if text is None:
+        text = _parse(uri, content, fmt)
+        cache.set("extraction", key, text, EXTRACTION_CACHE_TTL_S, EXTRACTION_CACHE_SIZE)
+    return text
 
 
-def _extract_text_from_bytes(uri: str, content: bytes) -> str:    
+def _synthetic_document(ext: str) -> bytes:
+    """A tiny document of the given type, built in memory."""
+    if ext == ".docx":
+        # Only the part the streaming DOCX extractor reads
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr(
+                "word/document.xml",
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+                "<w:p><w:r><w:t>Warm-up: A1c 8.9, sedentary.</w:t></w:r></w:p>"
+                "<w:tbl><w:tr><w:tc><w:p><w:r><w:t>A1c</w:t></w:r></w:p></w:tc>"
+                "<w:tc><w:p><w:r><w:t>8.9</w:t></w:r></w:p></w:tc></w:tr></w:tbl>"
+                "</w:body></w:document>",
+            )
+        return buf.getvalue()
+    if ext == ".pdf":
+        from PyPDF2 import PdfWriter
+        writer = PdfWriter()
+        writer.add_blank_page(width=72, height=72)
+        buf = io.BytesIO()
+        writer.write(buf)
+        return buf.getvalue()
+    # Not UTF-8, so the statistical encoding detector is loaded too
+    return "Warm-up@A1c 8.9@Sedentary, “walks”@".encode("cp1252")
+
+
+def warm_extractors() -> dict:
     """
-    Extract text depending on file type (PDF, DOCX, TXT).
+    Run the extraction path once per supported type on a synthetic document, and
+    start the extraction pool's workers, so the first real upload does not pay
+    for lazy parser setup. Returns ms per type.
     """
-    mime = _ext_or_mime(uri, content)
-    luri = uri.lower()
-    if luri.endswith(".pdf") or mime == "application/pdf":
-        reader = PdfReader(io.BytesIO(content))
-        parts = []
-        for page in reader.pages:
-            try:
-                parts.append(page.extract_text() or "")
-            except Exception:
-                continue
-        return "\n".join(p.strip() for p in parts if p)
-    if luri.endswith(".docx") or mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        d = Document(io.BytesIO(content))
-        return "\n".join(p.text for p in d.paragraphs if p.text)
-    # Fallback: treat as UTF-8 text
+    timings = {}
+    started = time.perf_counter()
     try:
-        return content.decode("utf-8")
-    except UnicodeDecodeError:
-        return content.decode("latin-1", errors="ignore")
+        get_extraction_pool().prestart()
+        timings["pool"] = round((time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        print(f"⚠️ Warm-up of the extraction pool failed: {e}")
+        timings["pool"] = None
+    for ext in (".txt", ".docx", ".pdf"):
+        started = time.perf_counter()
+        try:
+            _format_rows_as_lines(_extract_text_from_bytes(f"warmup{ext}", _synthetic_document(ext)))
+            timings[ext] = round((time.perf_counter() - started) * 1000, 1)
+        except Exception as e:
+            print(f"⚠️ Warm-up extraction of {ext} failed: {e}")
+            timings[ext] = None
+    return timings
 
 
 # ======================
@@ -128,7 +202,13 @@ def _save_formatted_to_file(formatted_text: str, log_path: str):
         f.write(formatted_text + "\n")
 
 
-def _read_jsonl(path: str):
+def _read_jsonl(path: str, limit: int | None = None):
+    """
+    Read JSONL records in file order. With 'limit', only the newest 'limit'
+    records are read, from the end of the file (see _tail_jsonl).
+    """
+    if limit:
+        return _tail_jsonl(path, limit)
     items = []
     if not os.path.exists(path):
         return items
@@ -144,27 +224,140 @@ def _read_jsonl(path: str):
     return items
 
 
+def _iter_jsonl_reverse(path: str):
+    """
+    Yield JSONL records from the last line backwards.
+    The file is memory-mapped and each step only scans back to the previous
+    newline, so reading k records touches just the last k lines' pages.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = size
+            while end > 0:
+                start = mm.rfind(b"\n", 0, end) + 1
+                line = mm[start:end].strip()
+                end = start - 1
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # e.g. a partially written last line
+
+
+def _log_segments(path: str) -> list:
+    """
+    path and its rotated segments ({base}-*{ext}, as the results writer names
+    them), newest first.
+    """
+    base, ext = os.path.splitext(path)
+    rotated = []
+    for segment in glob.glob(f"{base}-*{ext}"):
+        try:
+            rotated.append((os.path.getmtime(segment), segment))
+        except FileNotFoundError:
+            continue
+    current = [path] if os.path.exists(path) else []
+    return current + [segment for _, segment in sorted(rotated, reverse=True)]
+
+
+def _tail_jsonl(path: str, limit: int) -> list:
+    """
+    Newest 'limit' records, oldest first, in O(limit) regardless of file size.
+    Reads backwards through the live file and then its rotated segments, newest
+    first, until 'limit' records are found. Relies on results.jsonl being
+    appended in timestamp order; if the records seen while reading backwards
+    are out of order, falls back to a full scan with a bounded heap.
+    """
+    segments = _log_segments(path)
+    ts = lambda r: str(r.get("timestamp", ""))
+
+    tail, in_order = [], True
+    for rec in (rec for segment in segments for rec in _iter_jsonl_reverse(segment)):
+        if tail and ts(rec) > ts(tail[-1]):
+            in_order = False
+            break
+        if len(tail) == limit:
+            break  # one record past the tail was checked for ordering
+        tail.append(rec)
+
+    if in_order:
+        return tail[::-1]
+
+    print(f"⚠️ {path} is not in timestamp order; scanning the whole log")
+    records = (rec for segment in segments for rec in _read_jsonl(segment))
+    return sorted(heapq.nlargest(limit, records, key=ts), key=ts)
+
+
 # --- Internal helper function ----
 # ---------- Build SMART-goal cases (rubric-driven) ----------
 # ---------- Low-level loaders as tools ----------
 @tool
-def load_analyzer_runs_v2(analyzer_json_src: str, limit: int | None = None) -> dict:
-    # Need to define input source
+def load_analyzer_runs_v2(
+    analyzer_json_src: str,
+    limit: int | None = None,
+    data_source: str | None = None,
+    model_id: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+) -> dict:
     """
-    Load analyzer outputs (JSONL), sorted by timestamp ASC. Optionally keep only latest 'limit'.
+    Load analyzer runs sorted by timestamp ASC. Optionally keep only the latest 'limit',
+    and filter by data_source, model_id and a start/end timestamp window.
+    analyzer_json_src is either a results .jsonl path (answered from its index) or the runs themselves.
     """
-    #runs = _read_jsonl(analyzer_json_src)
-    runs = analyzer_json_src
-    runs.sort(key=lambda r: r.get("timestamp", ""))
+    return {"runs": _load_runs(analyzer_json_src, limit, data_source, model_id, start, end)}
+
+
+def _load_runs(analyzer_json_src, limit=None, data_source=None, model_id=None, start=None, end=None) -> list:
+    """
+    Resolve analyzer_json_src to runs, oldest first.
+    - path to a results .jsonl log: latest-N without filters is read from the end of the
+      file; filtered queries go through the indexed run store (also for a .sqlite index path)
+    - list / dict / JSON string of runs passed inline: filtered, then the latest 'limit' are
+      selected with a bounded heap instead of a full sort
+    """
+    src = analyzer_json_src
+    if isinstance(src, str):
+        if os.path.exists(src):
+            if limit and not (data_source or model_id or start or end) and not src.endswith(".sqlite"):
+                return _read_jsonl(src, limit)
+            store = get_run_store(src) if src.endswith(".sqlite") else get_indexed_runs(src)
+            return store.find(limit=limit, data_source=data_source, model_id=model_id, start=start, end=end)
+        try:
+            src = json.loads(src)
+        except json.JSONDecodeError:
+            return []
+    if isinstance(src, dict):
+        src = src.get("runs") or [src]
+
+    ts = lambda r: str(r.get("timestamp", ""))
+    runs = [
+        r for r in (src or [])
+        if isinstance(r, dict)
+        and (not data_source or r.get("data_source") == data_source)
+        and (not model_id or r.get("model_id") == model_id)
+        and (not start or ts(r) >= start)
+        and (not end or ts(r) <= end)
+    ]
     if limit:
-        runs = runs[-limit:]
-    return {"runs": runs}
+        return sorted(heapq.nlargest(limit, runs, key=ts), key=ts)
+    return sorted(runs, key=ts)
 
 # ---------- Planning tool that abstracts use cases ----------
 @tool
-def build_eval_plan_v2(analyzer_json_src: str, limit=50) -> dict:
+def build_eval_plan_v2(
+    analyzer_json_src: str,
+    limit=50,
+    data_source: str | None = None,
+    model_id: str | None = None,
+) -> dict:
     """
     Decide which evaluation to run based on analyzer_outputs.jsonl contents.
+    Only the latest 'limit' runs (optionally for one data_source / model_id) are read.
     Returns a plan with:
       {
         "evaluation_type": "engagement_vs_clinician" | "smart_goals_rubric",
@@ -173,7 +366,7 @@ def build_eval_plan_v2(analyzer_json_src: str, limit=50) -> dict:
         "cases": [ ... normalized cases ... ]
       }
     """
-    runs = load_analyzer_runs_v2(analyzer_json_src=analyzer_json_src, limit=limit)["runs"]
+    runs = _load_runs(analyzer_json_src, limit=limit, data_source=data_source, model_id=model_id)
     cases = runs
 #    cases = _build_smart_goal_cases_v2(runs)
     return {
@@ -297,7 +490,7 @@ def fetch_data(data_source: str | None = None) -> dict:
     if ds.lower().startswith("s3://"):
         try:
             blob = _read_s3_object(ds)
-            raw_text = _extract_text_from_bytes(ds, blob)
+            raw_text = _extract_text(ds, blob)
         except Exception as e:
             return {
                 "error": f"S3 error: {e}",
@@ -312,9 +505,10 @@ def fetch_data(data_source: str | None = None) -> dict:
     # URL
     if ds.lower().startswith(("http://", "https://")):
         try:
+            import requests
             resp = requests.get(ds, timeout=60)
             resp.raise_for_status()
-            raw = resp.text
+            raw = _extract_text(ds, resp.content)
         except Exception as e:
             return {
                 "error": f"HTTP error: {e}",
@@ -329,13 +523,9 @@ def fetch_data(data_source: str | None = None) -> dict:
     # Local file (only useful for local testing, not Lambda)
     if os.path.exists(ds):
         try:
-            if ds.lower().endswith((".pdf", ".docx")):
-                with open(ds, "rb") as f:
-                    content = f.read()
-                raw_text = _extract_text_from_bytes(ds, content)
-            else:
-                with open(ds, "r", encoding="utf-8") as f:
-                    raw_text = f.read()
+            with open(ds, "rb") as f:
+                content = f.read()
+            raw_text = _extract_text(ds, content)
         except Exception as e:
             return {
                 "error": f"File read error: {e}",
@@ -352,4 +542,74 @@ def fetch_data(data_source: str | None = None) -> dict:
         "raw_text": "",
         "formatted_text": "",
         "meta": {"source_type": "unknown", "data_source": str(ds)},
-    }
\ No newline at end of file
+    }
+
+
+_aioboto3_session = None
+_aioboto3_module = None
+_aioboto3_client = None  # (event loop, task opening its S3 client)
+
+
+def _load_aioboto3():
+    """The optional aioboto3 module (async S3 client), or None when it is not installed."""
+    global _aioboto3_module
+    if _aioboto3_module is None:
+        try:
+            import aioboto3
+            _aioboto3_module = aioboto3
+        except ImportError:
+            _aioboto3_module = False
+    return _aioboto3_module or None
+
+
+async def _get_async_s3_client(aioboto3):
+    """
+    One open aioboto3 S3 client per process, so requests reuse its connection
+    pool instead of paying connection setup each time. The client belongs to
+    the event loop it was opened on; a different loop (e.g. a later
+    asyncio.run) gets a new one.
+    """
+    global _aioboto3_session, _aioboto3_client
+    loop = asyncio.get_running_loop()
+    if _aioboto3_client is None or _aioboto3_client[0] is not loop:
+        if _aioboto3_session is None:
+            _aioboto3_session = aioboto3.Session()
+        # Concurrent first requests all wait for the same client
+        _aioboto3_client = (loop, loop.create_task(_aioboto3_session.client("s3").__aenter__()))
+    opening = _aioboto3_client[1]
+    try:
+        return await asyncio.shield(opening)
+    except Exception:
+        if _aioboto3_client is not None and _aioboto3_client[1] is opening:
+            _aioboto3_client = None  # let the next request retry
+        raise
+
+
+async def fetch_data_async(data_source: str | None = None) -> dict:
+    """
+    Async variant of fetch_data for the runtime's event loop; same return shape.
+    S3 objects are read with aioboto3 when it is installed and the (CPU-bound)
+    extraction runs in a worker thread; other sources use fetch_data in a thread.
+    """
+    ds = data_source or DEFAULT_SOURCE
+    aioboto3 = _load_aioboto3()
+    if aioboto3 is None or not ds or not ds.lower().startswith("s3://"):
+        return await asyncio.to_thread(fetch_data, ds)
+
+    bucket, key = _parse_s3_uri(ds)
+    try:
+        s3 = await _get_async_s3_client(aioboto3)
+        obj = await s3.get_object(Bucket=bucket, Key=key)
+        async with obj["Body"] as stream:
+            blob = await stream.read()
+        raw_text = await asyncio.to_thread(_extract_text, ds, blob)
+    except Exception as e:
+        return {
+            "error": f"S3 error: {e}",
+            "raw_text": "",
+            "formatted_text": "",
+            "meta": {"source_type": "s3", "data_source": ds},
+        }
+    formatted = _format_rows_as_lines(raw_text)
+    await asyncio.to_thread(_save_formatted_to_file, formatted, DATA_LOG_FILE)
+    return {"raw_text": raw_text, "formatted_text": formatted, "meta": {"source_type": "s3", "data_source": ds}}
@@ -1,21 +1,9 @@
-#from utils.strands_sagemaker import SageMakerAIModel
-from strands.models.bedrock import BedrockModel
-
 # Import Required Libraries
-import os, io
-from strands import Agent, tool
-from strands_tools import http_request 
-import json, time, uuid, re, requests, mimetypes
-from typing import Tuple, List, Optional
-
-import boto3
-from botocore.exceptions import BotoCoreError, ClientError
-from PyPDF2 import PdfReader
-from docx import Document
+import os
 
+# boto3 and Strands read the region from here when their clients are created
 os.environ["AWS_REGION"] = "us-east-1"
 os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
-boto3.setup_default_session(region_name="us-east-1")
 
 #### Check support for tools and system prompt
 def model_supports_system_prompt(model_id: str) -> bool:
@@ -62,6 +50,38 @@ def get_analyzer_prompt(data_source: str, raw_text: str = "", formatted_text: st
         "If the document only supports 1 or 2 goals, output only those."
     )
 
+    output_contract = """OUTPUT CONTRACT:
+{
+  "smart_goals": [
+    {
+      "goal_number": "integer (starts at 1 and increments for each goal)",
+      "description": "string (time-bound, measurable details)"
+    }
+  ]
+}"""
+
+    # Pre-fetched content: the runtime already extracted the document, so the
+    # model answers in a single turn without a fetch_data tool call.
+    if formatted_text or raw_text:
+        content = formatted_text or raw_text
+        return f"""You are an Analyzer Agent. The data source has already been fetched for you and its content is included below.
+
+INSTRUCTIONS:
+1) Use the CONTENT section below as your working input. It is newline-separated if the source used '@' row delimiters; otherwise it may be free text/paragraphs.
+2) Perform the analysis according to the TASK below.
+3) Produce output that matches the OUTPUT CONTRACT below EXACTLY (keys and structure). Output ONLY that JSON object and nothing else.
+4) Do not call any tools. Do not print anything except the final JSON.
+
+TASK:
+{multi_shot_prompt}
+
+{output_contract}
+
+Data source to analyze: {data_source}
+
+CONTENT:
+{content}"""
+
     return f"""You are an Analyzer Agent. I will provide you with a data source and you need to analyze it.
 
 Tool available:
@@ -77,14 +97,6 @@ INSTRUCTIONS:
 TASK:
 {multi_shot_prompt}
 
-OUTPUT CONTRACT:
-{{
-  "smart_goals": [
-    {{
-      "goal_number": "integer (starts at 1 and increments for each goal)",
-      "description": "string (time-bound, measurable details)"
-    }}
-  ]
-}}
+{output_contract}
 
 Data source to analyze: {data_source}"""
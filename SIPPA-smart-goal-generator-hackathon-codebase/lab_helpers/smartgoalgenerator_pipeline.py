@@ -0,0 +1,65 @@
+"""
+Async stage pipeline helpers for the Smart Goal Generator runtime.
+
+Each request is split into named stages. Independent stages run concurrently
+(blocking work is pushed to threads) and every stage records its wall time so
+`invoke` can report per-stage timings. Work that the caller does not need to
+wait for (output persistence, temp-file cleanup) is handed to a background
+executor and kept off the response path.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# Background work (persistence, cleanup) outlives the request's event loop
+_background_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="background")
+
+
+class StageTimings:
+    """Collects wall-clock duration (ms) of each pipeline stage."""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def record(self, name: str, started: float):
+        self.stages[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def as_dict(self) -> Dict[str, float]:
+        out = dict(self.stages)
+        out["total"] = round((time.perf_counter() - self._started) * 1000, 1)
+        return out
+
+
+async def run_stage(timings: StageTimings, name: str, fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run one pipeline stage and record its duration.
+    Coroutine functions are awaited; blocking functions run in a worker thread.
+    """
+    started = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(fn):
+            return await fn(*args, **kwargs)
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    finally:
+        timings.record(name, started)
+
+
+def start_stage(timings: StageTimings, name: str, fn: Callable, *args, **kwargs) -> asyncio.Task:
+    """Schedule a stage to run concurrently; await the returned task for its result."""
+    return asyncio.create_task(run_stage(timings, name, fn, *args, **kwargs), name=name)
+
+
+def run_in_background(name: str, fn: Callable, *args, **kwargs):
+    """Fire-and-forget a blocking stage off the response path; failures are logged."""
+    def _run():
+        started = time.perf_counter()
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"Background stage '{name}' failed: {e}")
+        finally:
+            print(f"⏱️ Background stage '{name}' took {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    return _background_executor.submit(_run)
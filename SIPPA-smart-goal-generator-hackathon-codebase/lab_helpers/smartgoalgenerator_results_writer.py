@@ -0,0 +1,301 @@
+"""
+Background, buffered writer for analyzer results (outputs/results.jsonl).
+
+Requests only enqueue records; a single writer thread batches them, appends each
+batch with one write() on an O_APPEND descriptor under an exclusive file lock
+(so lines never interleave, even across worker processes), fsyncs on an
+interval, and rotates the file by size or calendar day.
+Optionally the records are also written as Parquet or Arrow IPC part files for
+analytics (requires pyarrow): rows are buffered and a part is rolled once it
+holds RESULTS_COLUMNAR_ROWS rows or its oldest row is RESULTS_COLUMNAR_SECONDS
+old (and on shutdown), so steady interactive traffic yields a few large parts
+rather than one tiny file per batch. results.jsonl stays the durable copy.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: the single writer thread still serializes appends
+    fcntl = None
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+RESULTS_FORMAT = os.environ.get("SMARTGOAL_RESULTS_FORMAT", "").lower()      # "", "parquet" or "arrow"
+RESULTS_MAX_BYTES = int(os.environ.get("SMARTGOAL_RESULTS_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULTS_FSYNC_SECONDS = float(os.environ.get("SMARTGOAL_RESULTS_FSYNC_SECONDS", "2.0"))
+RESULTS_FLUSH_SECONDS = float(os.environ.get("SMARTGOAL_RESULTS_FLUSH_SECONDS", "0.25"))
+RESULTS_MAX_BATCH = 256
+RESULTS_COLUMNAR_ROWS = int(os.environ.get("SMARTGOAL_RESULTS_COLUMNAR_ROWS", "50000"))
+RESULTS_COLUMNAR_SECONDS = float(os.environ.get("SMARTGOAL_RESULTS_COLUMNAR_SECONDS", "900"))
+
+_STOP = object()
+
+
+def _write_json_atomic(path: str, obj: dict):
+    """Pretty-printed JSON written to a temp file and renamed into place."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ResultsWriter:
+    """Single-threaded appender for one JSONL file."""
+
+    def __init__(
+        self,
+        path: str,
+        columnar_format: str = RESULTS_FORMAT,
+        max_bytes: int = RESULTS_MAX_BYTES,
+        rotate_daily: bool = True,
+        fsync_seconds: float = RESULTS_FSYNC_SECONDS,
+        flush_seconds: float = RESULTS_FLUSH_SECONDS,
+        columnar_rows: int = RESULTS_COLUMNAR_ROWS,
+        columnar_seconds: float = RESULTS_COLUMNAR_SECONDS,
+    ):
+        self.path = path
+        self.columnar_format = columnar_format if columnar_format in ("parquet", "arrow") else ""
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.fsync_seconds = fsync_seconds
+        self.flush_seconds = flush_seconds
+        self.columnar_rows = columnar_rows
+        self.columnar_seconds = columnar_seconds
+        if self.columnar_format:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                print("pyarrow not installed; disabling columnar results output.")
+                self.columnar_format = ""
+
+        self._columnar_buffer: list = []
+        self._columnar_since = 0.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        self.stats = {"records": 0, "batches": 0, "rotations": 0, "columnar_parts": 0, "errors": 0}
+
+        self._thread = threading.Thread(target=self._run, name="results-writer", daemon=True)
+        self._thread.start()
+
+    # ----- producer side -----
+    def submit(self, record: dict):
+        """Queue one record for results.jsonl."""
+        self._queue.put(("jsonl", record))
+
+    def submit_file(self, path: str, obj: dict):
+        """Queue a pretty-printed per-run JSON file (written atomically)."""
+        self._queue.put(("file", (path, obj)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far has been written and fsynced."""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put(("stop", _STOP))
+        self._thread.join(timeout)
+
+    # ----- writer thread -----
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                self._maybe_fsync(force=False)
+                self._maybe_roll_columnar(force=False)
+                continue
+
+            batch = [first]
+            while len(batch) < RESULTS_MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records, waiters, stop = [], [], False
+            for kind, item in batch:
+                if kind == "jsonl":
+                    records.append(item)
+                elif kind == "file":
+                    try:
+                        _write_json_atomic(*item)
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        print(f"Results writer could not write {item[0]}: {e}")
+                elif kind == "flush":
+                    waiters.append(item)
+                elif kind == "stop":
+                    stop = True
+
+            if records:
+                try:
+                    self._append_batch(records)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"Results writer failed to append {len(records)} records: {e}")
+
+            self._maybe_fsync(force=bool(waiters) or stop)
+            self._maybe_roll_columnar(force=stop)
+            for w in waiters:
+                w.set()
+            if stop:
+                return
+
+    def _append_batch(self, records: list):
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        fd = self._open_locked()
+        try:
+            # Rotation is decided and done under the lock, so two workers cannot both rotate
+            if self._maybe_rotate(fd):
+                os.close(fd)
+                fd = self._open_locked()
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            os.close(fd)  # releases the lock
+
+        self._dirty = True
+        self.stats["records"] += len(records)
+        self.stats["batches"] += 1
+
+        if self.columnar_format:
+            if not self._columnar_buffer:
+                self._columnar_since = time.monotonic()
+            self._columnar_buffer.extend(
+                {
+                    "timestamp": r.get("timestamp"),
+                    "model_id": r.get("model_id"),
+                    "data_source": r.get("data_source"),
+                    "goal_count": len(r.get("smart_goals") or []),
+                    "record": json.dumps(r, ensure_ascii=False),
+                }
+                for r in records
+            )
+
+    def _maybe_fsync(self, force: bool):
+        if not self._dirty:
+            return
+        if not force and time.monotonic() - self._last_fsync < self.fsync_seconds:
+            return
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Results writer fsync failed: {e}")
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def _open_locked(self) -> int:
+        """
+        O_APPEND descriptor for self.path holding the exclusive lock. Another
+        worker may rotate the file while we wait for the lock, so after locking
+        the path is re-stat'd and reopened until it still names our file.
+        """
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if not fcntl:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.stat(self.path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _maybe_rotate(self, fd: int) -> bool:
+        """
+        Move the current file (open and locked as fd) aside when it is too
+        large or from a previous day. Returns whether it was rotated.
+        """
+        st = os.fstat(fd)
+        too_big = self.max_bytes and st.st_size >= self.max_bytes
+        file_day = time.strftime("%Y%m%d", time.localtime(st.st_mtime))
+        new_day = self.rotate_daily and file_day != time.strftime("%Y%m%d")
+        if not (too_big or new_day):
+            return False
+
+        self._maybe_fsync(force=True)
+        base, ext = os.path.splitext(self.path)
+        stamp = f"{file_day}-{time.strftime('%H%M%S')}-{os.getpid()}"
+        rotated, n = f"{base}-{stamp}{ext}", 1
+        while os.path.exists(rotated):
+            rotated, n = f"{base}-{stamp}-{n}{ext}", n + 1
+        os.replace(self.path, rotated)
+        self.stats["rotations"] += 1
+        print(f"Rotated {self.path} -> {rotated}")
+        return True
+
+    def _maybe_roll_columnar(self, force: bool):
+        """Write the buffered rows as a part file once it is large or old enough (or when forced)."""
+        if not self._columnar_buffer:
+            return
+        if not force and (
+            len(self._columnar_buffer) < self.columnar_rows
+            and time.monotonic() - self._columnar_since < self.columnar_seconds
+        ):
+            return
+        rows, self._columnar_buffer = self._columnar_buffer, []
+        try:
+            self._write_columnar(rows)
+            self.stats["columnar_parts"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Results writer failed to write {len(rows)} columnar rows: {e}")
+
+    def _write_columnar(self, rows: list):
+        """One Parquet / Arrow IPC part file for rows, under <dir>/columnar/."""
+        import pyarrow as pa
+
+        table = pa.Table.from_pylist(rows)
+        out_dir = os.path.join(os.path.dirname(self.path) or ".", "columnar")
+        os.makedirs(out_dir, exist_ok=True)
+        stem = f"results-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.stats['columnar_parts']}"
+        if self.columnar_format == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, os.path.join(out_dir, stem + ".parquet"))
+        else:
+            with pa.OSFile(os.path.join(out_dir, stem + ".arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+
+# =========================================
+# ===== One writer per results file =======
+# =========================================
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_results_writer(path: str) -> ResultsWriter:
+    """Return the process-wide writer for path, starting it on first use."""
+    key = os.path.abspath(path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = ResultsWriter(path)
+            _writers[key] = writer
+        return writer
+
+
+@atexit.register
+def _close_writers():
+    for writer in list(_writers.values()):
+        writer.close()
@@ -0,0 +1,253 @@
+"""
+Cost/latency-aware model routing for model_id "auto".
+
+The router picks a model for one request from:
+  * the document length, known after the fetch_extract stage,
+  * each model's context window (the prompt plus the expected answer must fit),
+  * each model's observed generation latency and evaluator score, kept as
+    exponentially weighted averages over our own runs (seeded with priors
+    until a model has MIN_OBSERVATIONS runs),
+  * an optional per-request "latency_budget_ms" and "cost_budget_usd".
+
+Among the models that fit the context and the budgets the one with the best
+expected evaluator score wins; near-ties (within SCORE_TIE) go to the cheaper,
+then faster, model. If no model meets the budgets, the one that misses them by
+the least is used. The decision and every candidate's numbers are returned so
+they can be reported in the response metadata.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+AUTO_MODEL_ID = "auto"
+ROUTER_STATS_PATH = os.environ.get("SMARTGOAL_ROUTER_STATS", "./outputs/router_stats.json")
+EWMA_ALPHA = float(os.environ.get("SMARTGOAL_ROUTER_EWMA_ALPHA", "0.1"))
+MIN_OBSERVATIONS = 5
+SCORE_TIE = 0.02
+EXPECTED_OUTPUT_TOKENS = 600      # a SMART-goals object plus some slack
+PROMPT_OVERHEAD_TOKENS = 1500     # analyzer instructions and output contract
+CONTEXT_HEADROOM = 0.9            # do not plan to fill a context window to the brim
+SAVE_EVERY = 20
+
+# Context window (tokens), on-demand price per 1K input/output tokens (USD),
+# and priors for generation latency and evaluator score (replaced by telemetry).
+MODEL_PROFILES: Dict[str, dict] = {
+    "us.anthropic.claude-3-7-sonnet-20250219-v1:0": {
+        "context_tokens": 200_000, "input_per_1k": 0.003, "output_per_1k": 0.015,
+        "latency_ms": 9000, "score": 0.85,
+    },
+    "openai.gpt-oss-120b-1:0": {
+        "context_tokens": 128_000, "input_per_1k": 0.00015, "output_per_1k": 0.0006,
+        "latency_ms": 5000, "score": 0.78,
+    },
+    "us.amazon.nova-premier-v1:0": {
+        "context_tokens": 1_000_000, "input_per_1k": 0.0025, "output_per_1k": 0.0125,
+        "latency_ms": 8000, "score": 0.80,
+    },
+    "cohere.command-r-v1:0": {
+        "context_tokens": 128_000, "input_per_1k": 0.0005, "output_per_1k": 0.0015,
+        "latency_ms": 5000, "score": 0.70,
+    },
+    "mistral.mistral-7b-instruct-v0:2": {
+        "context_tokens": 32_000, "input_per_1k": 0.00015, "output_per_1k": 0.0002,
+        "latency_ms": 3000, "score": 0.65,
+    },
+}
+
+
+def _auto_candidates() -> Tuple[str, ...]:
+    """SMARTGOAL_AUTO_MODELS that have a profile; every profiled model when it names none."""
+    configured = [m.strip() for m in os.environ.get("SMARTGOAL_AUTO_MODELS", "").split(",") if m.strip()]
+    known = tuple(m for m in configured if m in MODEL_PROFILES)
+    unknown = [m for m in configured if m not in MODEL_PROFILES]
+    if unknown:
+        print(f"⚠️ SMARTGOAL_AUTO_MODELS: no routing profile for {', '.join(unknown)}; ignored")
+    if configured and not known:
+        print("⚠️ SMARTGOAL_AUTO_MODELS names no profiled model; routing between all of them")
+    return known or tuple(MODEL_PROFILES)
+
+
+AUTO_CANDIDATES = _auto_candidates()
+
+
+def estimate_tokens(chars: int) -> int:
+    return (chars + 3) // 4
+
+
+# ==================================
+# ===== Telemetry ==================
+# ==================================
+_telemetry: Dict[str, dict] = {}
+_telemetry_lock = threading.Lock()
+_loaded = False
+_updates = 0
+
+
+def _load():
+    """Read persisted telemetry once per process."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with open(ROUTER_STATS_PATH, "r", encoding="utf-8") as f:
+            _telemetry.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Could not read router telemetry {ROUTER_STATS_PATH}: {e}")
+
+
+def save_telemetry():
+    with _telemetry_lock:
+        snapshot = json.dumps(_telemetry, indent=2)
+    os.makedirs(os.path.dirname(ROUTER_STATS_PATH) or ".", exist_ok=True)
+    tmp = f"{ROUTER_STATS_PATH}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(snapshot)
+    os.replace(tmp, ROUTER_STATS_PATH)
+
+
+def _observe(model_id: str, field: str, value: float) -> bool:
+    """Fold one observation into the model's EWMA; True when telemetry should be saved."""
+    global _updates
+    with _telemetry_lock:
+        _load()
+        stats = _telemetry.setdefault(model_id, {})
+        n = stats.get(f"{field}_n", 0)
+        prev = stats.get(field)
+        # Plain mean for the first runs, then EWMA so the estimate tracks drift
+        alpha = max(EWMA_ALPHA, 1 / (n + 1))
+        stats[field] = value if prev is None else round(prev + alpha * (value - prev), 4)
+        stats[f"{field}_n"] = n + 1
+        _updates += 1
+        return _updates % SAVE_EVERY == 0
+
+
+def record_latency(model_id: str, latency_ms: float) -> bool:
+    return _observe(model_id, "latency_ms", latency_ms)
+
+
+def record_score(model_id: str, score: float) -> bool:
+    return _observe(model_id, "score", score)
+
+
+def evaluator_mean_score(evaluator_result) -> Optional[float]:
+    """Mean of all metric scores in an evaluator result (JSON string or dict), or None."""
+    try:
+        result = json.loads(evaluator_result) if isinstance(evaluator_result, str) else evaluator_result
+        values = [
+            float(v)
+            for case in (result or {}).get("scores") or []
+            for v in (case.get("metric_scores") or {}).values()
+            if isinstance(v, (int, float))
+        ]
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return sum(values) / len(values) if values else None
+
+
+def _expected(model_id: str, field: str) -> float:
+    """Observed EWMA once there are enough runs, else the profile prior."""
+    stats = _telemetry.get(model_id) or {}
+    if stats.get(f"{field}_n", 0) >= MIN_OBSERVATIONS:
+        return stats[field]
+    return MODEL_PROFILES[model_id][field]
+
+
+def router_metrics() -> Dict[str, dict]:
+    with _telemetry_lock:
+        _load()
+        return {
+            model_id: {
+                "expected_latency_ms": round(_expected(model_id, "latency_ms")),
+                "expected_score": round(_expected(model_id, "score"), 3),
+                "latency_runs": (_telemetry.get(model_id) or {}).get("latency_ms_n", 0),
+                "scored_runs": (_telemetry.get(model_id) or {}).get("score_n", 0),
+            }
+            for model_id in AUTO_CANDIDATES
+        }
+
+
+# ==================================
+# ===== Routing ====================
+# ==================================
+def route(
+    doc_chars: Optional[int],
+    latency_budget_ms: Optional[float] = None,
+    cost_budget_usd: Optional[float] = None,
+    candidates: Optional[List[str]] = None,
+) -> dict:
+    """
+    Choose a model for a document of doc_chars characters (None if unknown).
+    Returns {"model_id", "reason", "doc_tokens", "budgets", "candidates": [...]}.
+    """
+    # Unprofiled ids cannot be scored; with none left, route between the default candidates
+    candidates = [m for m in (candidates or ()) if m in MODEL_PROFILES] or list(AUTO_CANDIDATES)
+    doc_tokens = estimate_tokens(doc_chars) if doc_chars is not None else None
+    input_tokens = (doc_tokens or 0) + PROMPT_OVERHEAD_TOKENS
+
+    with _telemetry_lock:
+        _load()
+        rows = []
+        for model_id in candidates:
+            profile = MODEL_PROFILES[model_id]
+            row = {
+                "model_id": model_id,
+                "expected_score": round(_expected(model_id, "score"), 3),
+                "expected_latency_ms": round(_expected(model_id, "latency_ms")),
+                "estimated_cost_usd": round(
+                    input_tokens / 1000 * profile["input_per_1k"]
+                    + EXPECTED_OUTPUT_TOKENS / 1000 * profile["output_per_1k"], 6
+                ),
+                "fits_context": input_tokens + EXPECTED_OUTPUT_TOKENS <= profile["context_tokens"] * CONTEXT_HEADROOM,
+                "rejected": None,
+            }
+            if not row["fits_context"]:
+                row["rejected"] = f"needs ~{input_tokens + EXPECTED_OUTPUT_TOKENS} tokens, context is {profile['context_tokens']}"
+            elif latency_budget_ms is not None and row["expected_latency_ms"] > latency_budget_ms:
+                row["rejected"] = "over latency budget"
+            elif cost_budget_usd is not None and row["estimated_cost_usd"] > cost_budget_usd:
+                row["rejected"] = "over cost budget"
+            rows.append(row)
+
+    budgets = {"latency_ms": latency_budget_ms, "cost_usd": cost_budget_usd}
+    eligible = [r for r in rows if r["rejected"] is None]
+    if eligible:
+        best_score = max(r["expected_score"] for r in eligible)
+        near_best = [r for r in eligible if r["expected_score"] >= best_score - SCORE_TIE]
+        chosen = min(near_best, key=lambda r: (r["estimated_cost_usd"], r["expected_latency_ms"]))
+        reason = f"highest expected evaluator score ({chosen['expected_score']}) among {len(eligible)} model(s)"
+        reason += " within budget" if latency_budget_ms is not None or cost_budget_usd is not None else ""
+        if len(near_best) > 1:
+            reason += "; cheapest of the near-ties"
+    else:
+        fitting = [r for r in rows if r["fits_context"]]
+        if fitting:
+            # Miss the budgets by as little as possible (relative overshoot)
+            def overshoot(r):
+                over = 0.0
+                if latency_budget_ms:
+                    over += max(0.0, r["expected_latency_ms"] / latency_budget_ms - 1)
+                if cost_budget_usd:
+                    over += max(0.0, r["estimated_cost_usd"] / cost_budget_usd - 1)
+                return over
+            chosen = min(fitting, key=overshoot)
+            reason = "no model meets the budget; closest to it"
+        else:
+            chosen = max(rows, key=lambda r: MODEL_PROFILES[r["model_id"]]["context_tokens"])
+            reason = "document exceeds every context window; largest context (content will be truncated)"
+    if doc_tokens is None:
+        reason += "; document length unknown"
+
+    return {
+        "model_id": chosen["model_id"],
+        "reason": reason,
+        "doc_tokens": doc_tokens,
+        "budgets": budgets,
+        "candidates": rows,
+    }
@@ -3,9 +3,13 @@ import re
 import json
 import time
 import uuid
+import asyncio
+import hashlib
+import threading
+from contextlib import asynccontextmanager
 
 import boto3
-import json
+from botocore.config import Config
 
 # ===========================================
 # ===== Runtime / Model Imports ============
@@ -21,6 +25,79 @@ from lab_helpers.smartgoalgenerator_model_util import (
     model_supports_tools,
     get_analyzer_prompt,
 )
+from lab_helpers.smartgoalgenerator_pipeline import (
+    StageTimings,
+    run_stage,
+    start_stage,
+    run_in_background,
+)
+from lab_helpers.smartgoalgenerator_results_writer import get_results_writer
+from lab_helpers.smartgoalgenerator_concurrency import (
+    CircuitOpenError,
+    call_with_limit,
+    get_limiter,
+    is_throttle,
+    limiter_metrics,
+)
+from lab_helpers.smartgoalgenerator_scheduler import (
+    DEFAULT_ACTOR,
+    DEFAULT_PRIORITY,
+    PRIORITY_CLASSES,
+    PriorityScheduler,
+)
+from lab_helpers.smartgoalgenerator_streaming import (
+    EARLY_STOP_ENABLED,
+    early_stop_metrics,
+    stream_until_json_complete,
+)
+from lab_helpers.smartgoalgenerator_structured_output import (
+    SmartGoalsOutput,
+    StructuredResult,
+    fix_json_prompt,
+    parse_metrics,
+    record as record_parse_event,
+    repair_json,
+)
+from lab_helpers.smartgoalgenerator_hedging import (
+    HEDGE_PRIORITIES,
+    call_hedged,
+    hedge_metrics,
+    hedge_target,
+    target_key,
+)
+from lab_helpers.smartgoalgenerator_router import (
+    AUTO_MODEL_ID,
+    evaluator_mean_score,
+    record_latency,
+    record_score,
+    route,
+    router_metrics,
+    save_telemetry,
+)
+from lab_helpers.smartgoalgenerator_idempotency import (
+    IDEMPOTENCY_ENABLED,
+    SingleFlight,
+    derive_key,
+    scoped_key,
+    with_replay_headers,
+)
+from lab_helpers.smartgoalgenerator_cancellation import (
+    CancelToken,
+    cancel_session,
+    cancellation_metrics,
+    current_token,
+    note_input,
+    note_stage,
+    post_shared_cancel,
+    record_cancelled,
+    record_output_tokens,
+    register as register_cancel_token,
+    unregister as unregister_cancel_token,
+    watch_shared_cancels,
+)
+from lab_helpers.smartgoalgenerator_extraction_pool import get_extraction_pool
+from lab_helpers.smartgoalgenerator_extractors import extractor_metrics
+from lab_helpers.smartgoalgenerator_shared_cache import get_shared_cache
 
 # Optional tools
 try:
@@ -28,11 +105,23 @@ try:
         load_analyzer_runs_v2,
         build_eval_plan_v2,
         fetch_data,
+        fetch_data_async,
+        warm_extractors,
     )
 except Exception:
     load_analyzer_runs_v2 = None
     build_eval_plan_v2 = None
     fetch_data = None
+    fetch_data_async = None
+    warm_extractors = None
+
+# Durable batch jobs (needs the tools above)
+try:
+    from lab_helpers.smartgoalgenerator_batch_jobs import expand_sources, get_job_store, run_job
+except Exception:
+    expand_sources = None
+    get_job_store = None
+    run_job = None
 
 # ===================================
 # ============ CONSTANTS ============
@@ -61,23 +150,49 @@ output_jsonl = "./outputs/results.jsonl"
 # Evaluator runtime ARN
 # =========================================
 EVALUATOR_RUNTIME_ARN = "arn:aws:bedrock-agentcore:us-east-1:711246752798:runtime/llm_evaluator_agent-M3IWgT3T7l"
+# Evaluations of one user session share an evaluator runtime session, so they
+# land on the same (warm) microVM instead of a cold one per call.
+EVALUATOR_STICKY_SESSIONS = os.environ.get("SMARTGOAL_EVALUATOR_STICKY", "1") != "0"
+
+_agent_core_client = None
+
+
+def _get_agent_core_client():
+    """One pooled bedrock-agentcore client per container (connections are reused)."""
+    global _agent_core_client
+    if _agent_core_client is None:
+        _agent_core_client = boto3.client(
+            'bedrock-agentcore',
+            config=Config(max_pool_connections=int(os.environ.get("SMARTGOAL_MAX_CONCURRENCY", "16"))),
+        )
+    return _agent_core_client
+
+
+def evaluator_session_id(base: str | None) -> str | None:
+    """Stable evaluator runtime session id for a user session (AgentCore needs 33+ chars)."""
+    if not base or not EVALUATOR_STICKY_SESSIONS:
+        return None
+    return f"smartgoal-eval-{hashlib.sha256(str(base).encode()).hexdigest()[:40]}"
+
+
 # =========================================
 # Helper function to call evaluator runtime
 # =========================================
-def call_evaluator_runtime(payload: dict) -> dict:
-    # Initialize the Bedrock AgentCore client
-    agent_core_client = boto3.client('bedrock-agentcore')
+def call_evaluator_runtime(payload: dict, runtime_arn: str | None = None, session_id: str | None = None) -> dict:
+    # Pooled Bedrock AgentCore client
+    agent_core_client = _get_agent_core_client()
   
     # Prepare the payload prompt
     #payload={'analyzer_payload':output_obj}
     prompt = json.dumps(payload).encode()
   
-    # Invoke the agent
+    # Invoke the agent (in the caller's evaluator session, when there is one)
+    session_kwargs = {"runtimeSessionId": session_id} if session_id else {}
     response = agent_core_client.invoke_agent_runtime(
-                    agentRuntimeArn=EVALUATOR_RUNTIME_ARN,
+                    agentRuntimeArn=runtime_arn or EVALUATOR_RUNTIME_ARN,
                     #agentRuntimeArn="arn:aws:bedrock-agentcore:us-east-1:711246752798:runtime/llm_evaluator_agent-jf0YsKAH8C", 
-                    #runtimeSessionId=session_id,
-                    payload=prompt
+                    payload=prompt,
+                    **session_kwargs,
                     )
 
     # Process and print the response
@@ -108,6 +223,11 @@ def call_evaluator_runtime(payload: dict) -> dict:
     return response
 
 
+async def _call_evaluator(payload: dict, runtime_arn: str | None = None, session_id: str | None = None) -> dict:
+    """call_evaluator_runtime off the event loop; every evaluator call goes through here."""
+    return await asyncio.to_thread(call_evaluator_runtime, payload, runtime_arn, session_id)
+
+
 # ===============================================
 # ===== Json/Jsonl Utility Helper Functions =====
 # ===============================================
@@ -124,6 +244,10 @@ def clean_json_str(s: str) -> str:
 def _coerce_json(s):
     import json, re
 
+    if isinstance(s, dict):
+        return s
+    if isinstance(s, StructuredResult):
+        return s.parsed
     if not isinstance(s, str):
         if hasattr(s, "output"): s = s.output
         elif hasattr(s, "content"): s = s.content
@@ -152,9 +276,8 @@ def _coerce_json(s):
 
 
 def _append_jsonl(path: str, obj: dict):
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    # Queued to the background writer; it batches, locks and fsyncs the appends
+    get_results_writer(path).submit(obj)
 
 
 # ===========================================
@@ -182,7 +305,59 @@ def _safe_fragment(s: str) -> str:
     """
     s = s.replace(":", "_").replace("/", "_").replace(".", "_")
     return "".join(c if c.isalnum() or c in ("-", "_") else "_" for c in s)
-    
+
+
+# =============================================
+# ===== Pre-fetch of known uploaded files =====
+# =============================================
+# When the payload carries [UPLOADED_FILE: ...] the data source is already known,
+# so the runtime fetches/extracts it while the model is being built and injects
+# the content into the prompt. Generation is then a single model turn instead of
+# a fetch_data tool call followed by the answer.
+PREFETCH_UPLOADS = os.environ.get("SMARTGOAL_PREFETCH", "1") != "0"
+PREFETCH_MAX_CHARS = int(os.environ.get("SMARTGOAL_PREFETCH_MAX_CHARS", "200000"))
+# Structured output for tool-capable models, JSON repair + fix retry for the rest
+STRUCTURED_OUTPUT_ENABLED = os.environ.get("SMARTGOAL_STRUCTURED_OUTPUT", "1") != "0"
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)."""
+    return (len(text or "") + 3) // 4
+
+
+def _estimate_prefetch_savings(file_path: str, user_input: str, file_result: dict) -> int:
+    """
+    Tokens avoided by skipping the fetch_data turn: the tool-path prompt and user
+    message sent for the tool call, the tool call itself (emitted, then replayed),
+    and the raw_text copy that the tool result carries next to formatted_text.
+    """
+    tool_prompt = get_analyzer_prompt(file_path)
+    tool_call = json.dumps({"name": "fetch_data", "input": {"data_source": file_path}})
+    return (
+        _estimate_tokens(tool_prompt)
+        + _estimate_tokens(user_input)
+        + 2 * _estimate_tokens(tool_call)
+        + _estimate_tokens(file_result.get("raw_text", ""))
+    )
+
+
+def _generation_metrics(response, prefetched: bool, baseline_turns: int, tokens_saved: int) -> dict:
+    """Turn count and token usage of one agent invocation."""
+    metrics = getattr(response, "metrics", None)
+    usage = dict(getattr(metrics, "accumulated_usage", None) or {})
+    return {
+        "prefetch": prefetched,
+        "turns": getattr(metrics, "cycle_count", None),
+        "baseline_turns": baseline_turns,
+        "input_tokens": usage.get("inputTokens"),
+        "output_tokens": usage.get("outputTokens"),
+        "total_tokens": usage.get("totalTokens"),
+        "estimated_tokens_saved": tokens_saved,
+        "early_stop": getattr(response, "early_stopped", False),
+        "early_stop_tokens_saved": getattr(response, "tokens_saved", 0),
+        "structured_output": isinstance(response, StructuredResult),
+    }
+
 
 # =============================================
 # ===== Model Selection and configuration =====
@@ -190,14 +365,8 @@ def _safe_fragment(s: str) -> str:
 
 # Lab1 import: Create the Bedrock model
 #model = BedrockModel(model_id=MODEL_ID)
-
-model = BedrockModel(
-                model_id=MODEL_ID,
-                max_tokens=1024,
-                temperature=0.8,
-                top_k=50,
-                top_p=0.95,
-)
+# Models are built on first use by _acquire_model (one per container), or
+# ahead of traffic by run_warmup; nothing is constructed at import time.
 
 # Check model capabilities
 supports_system_prompt = model_supports_system_prompt(MODEL_ID)
@@ -236,222 +405,1193 @@ if build_eval_plan_v2:
 
 # agent = Agent(**agent_kwargs)
 
-# Initialize the AgentCore Runtime App
-app = BedrockAgentCoreApp()  #### AGENTCORE RUNTIME - LINE 2 ####
+# =============================================
+# ===== Pipeline stages used by invoke ========
+# =============================================
+EVALUATOR_ARN_PARAMETER = "/app/smartgoalgenerator/agentcore/evaluator_runtime_arn"
+CONFIG_CACHE_TTL_S = 3600
 
+_config_cache = {}
+_model_cache = {}
 
-@app.entrypoint  #### AGENTCORE RUNTIME - LINE 3 ####
-def invoke(payload):
-    """AgentCore Runtime entrypoint function"""
-    try:
-        user_input = payload.get("prompt", "").strip()
-        if not user_input:
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "No prompt provided."})
-            }
 
-        file_path = None
-        original_data_source = user_input  # Preserve original for data_source field
-        
-        if "[UPLOADED_FILE:" in user_input:
-            import re
-            file_match = re.search(r'\[UPLOADED_FILE:\s*([^\]]+)\]', user_input)
-            if file_match:
-                file_path = file_match.group(1).strip()
-                # Set data_source to the file path for better tracking
-                original_data_source = file_path
-                # Remove the file marker from user input
-                user_input = re.sub(r'\[UPLOADED_FILE:[^\]]+\]', '', user_input).strip()
-                print(f"📁 Processing uploaded file: {file_path}")
-        
-        # Get model ID from payload, fallback to default
-        requested_model_id = payload.get("model_id", MODEL_ID)
-        print(f"Using model: {requested_model_id}")
+def _parse_request(payload: dict):
+    """
+    Split the prompt into (user_input, file_path, data_source).
+    The [UPLOADED_FILE: ...] marker is removed from user_input.
+    """
+    user_input = payload.get("prompt", "").strip()
+    file_path = None
+    original_data_source = user_input  # Preserve original for data_source field
+
+    if "[UPLOADED_FILE:" in user_input:
+        file_match = re.search(r'\[UPLOADED_FILE:\s*([^\]]+)\]', user_input)
+        if file_match:
+            file_path = file_match.group(1).strip()
+            # Set data_source to the file path for better tracking
+            original_data_source = file_path
+            # Remove the file marker from user input
+            user_input = re.sub(r'\[UPLOADED_FILE:[^\]]+\]', '', user_input).strip()
+            print(f"📁 Processing uploaded file: {file_path}")
+    return user_input, file_path, original_data_source
+
+
+def _request_priority(payload: dict):
+    """(priority class, actor_id) for scheduling; the session id stands in for a missing actor."""
+    priority = payload.get("priority") or DEFAULT_PRIORITY
+    actor_id = str(payload.get("actor_id") or payload.get("session_id") or DEFAULT_ACTOR)
+    return priority, actor_id
+
+
+def _lookup_config() -> dict:
+    """
+    Resolve runtime configuration once per container.
+    The evaluator ARN comes from the environment, then SSM, then the built-in default.
+    """
+    if not _config_cache:
+        arn = os.environ.get("SMARTGOAL_EVALUATOR_RUNTIME_ARN")
+        if not arn:
+            # Shared by the container's workers: one SSM call per container
+            arn = get_shared_cache().get("config", EVALUATOR_ARN_PARAMETER)
+        if not arn:
+            try:
+                arn = get_ssm_parameter(EVALUATOR_ARN_PARAMETER)
+                get_shared_cache().set("config", EVALUATOR_ARN_PARAMETER, arn, CONFIG_CACHE_TTL_S)
+            except Exception as e:
+                print(f"SSM lookup for {EVALUATOR_ARN_PARAMETER} failed, using default: {e}")
+                arn = EVALUATOR_RUNTIME_ARN
+        _config_cache["evaluator_runtime_arn"] = arn
+    return _config_cache
 
-        
-        # Create model instance with requested model ID
-        dynamic_model = BedrockModel(
-            model_id=requested_model_id,
+
+def _acquire_model(model_id: str, region: str | None = None) -> BedrockModel:
+    """
+    Return a BedrockModel for model_id (in region, default: the runtime's), reusing one per container.
+    The model holds no conversation state, so agents built on it stay independent.
+    """
+    cached = _model_cache.get((model_id, region))
+    if cached is None:
+        region_kwargs = {"region_name": region} if region else {}
+        cached = BedrockModel(
+            model_id=model_id,
             max_tokens=4096,
             temperature=0.8,
             top_k=50,
             top_p=0.95,
+            **region_kwargs,
         )
-        
-        # Check model capabilities for the requested model
-        dynamic_supports_system_prompt = model_supports_system_prompt(requested_model_id)
-        dynamic_supports_tools = model_supports_tools(requested_model_id)
-        
-        # Create agent with dynamic model
-        dynamic_agent_kwargs = {"model": dynamic_model}
-        
-        if dynamic_supports_tools and optional_tools:
-            dynamic_agent_kwargs["tools"] = optional_tools
-        
-        # Set system prompt based on whether we have a file or not
-        if dynamic_supports_system_prompt:
-            if file_path:
-                # Use dynamic system prompt with file path as data_source
-                try:
-                    dynamic_system_prompt = get_analyzer_prompt(file_path)
-                    print(f"📋 System prompt length: {len(dynamic_system_prompt)} characters")
-                    dynamic_agent_kwargs["system_prompt"] = dynamic_system_prompt
-                except Exception as e:
-                    print(f"❌ Error generating system prompt: {e}")
-                    # Fallback to static prompt
-                    dynamic_agent_kwargs["system_prompt"] = SYSTEM_PROMPT
-            else:
-                # Use static system prompt for non-file inputs
-                dynamic_agent_kwargs["system_prompt"] = SYSTEM_PROMPT
-        
-        # Initialize dynamic agent
-        dynamic_agent = Agent(**dynamic_agent_kwargs)
+        _model_cache[(model_id, region)] = cached
+    return cached
+
+
+def _prefetched_prompt_for(file_path: str, file_result) -> str | None:
+    """Analyzer prompt with the pre-fetched content injected, or None when the pre-fetch failed."""
+    if file_result is None:
+        return None
+    if file_result.get("error") or not file_result.get("formatted_text"):
+        print(f"⚠️ Pre-fetch failed, falling back to fetch_data tool: {file_result.get('error')}")
+        return None
+    print(f"📥 Pre-fetched {len(file_result['formatted_text'])} characters from {file_path}")
+    return get_analyzer_prompt(
+        file_path,
+        raw_text=file_result.get("raw_text", ""),
+        formatted_text=file_result["formatted_text"][:PREFETCH_MAX_CHARS],
+    )
 
-        # Step 1: Run the dynamic agent with requested model
-        if file_path:
-            # The system prompt already instructs the agent to use fetch_data with the file_path
-            print(f"📁 File path for agent: {file_path}")
-            
-            if dynamic_supports_tools and dynamic_supports_system_prompt:
-                # Agent has tools and system prompt - pass the user's original input
-                response = dynamic_agent(user_input)
-            elif dynamic_supports_tools:
-                # Agent has tools but no system prompt - provide the system prompt manually
-                system_prompt_with_file = get_analyzer_prompt(file_path)
-                response = dynamic_agent(system_prompt_with_file)
-            else:
-                # No tools available, try direct fetch as fallback
+
+def _routing_budgets(payload: dict):
+    """(latency_budget_ms, cost_budget_usd) from the payload; ValueError if malformed."""
+    budgets = []
+    for key in ("latency_budget_ms", "cost_budget_usd"):
+        value = payload.get(key)
+        budgets.append(None if value in (None, "") else float(value))
+    return tuple(budgets)
+
+
+def _route_request(payload: dict, user_input: str, file_path, file_result) -> dict:
+    """Routing decision for model_id "auto", sized by the extracted document."""
+    if file_path:
+        text = (file_result or {}).get("formatted_text")
+        doc_chars = len(text[:PREFETCH_MAX_CHARS]) if text else None
+    else:
+        doc_chars = len(user_input)
+    latency_budget_ms, cost_budget_usd = _routing_budgets(payload)
+    routing = route(doc_chars, latency_budget_ms, cost_budget_usd)
+    print(f"🧭 Auto-routed to {routing['model_id']}: {routing['reason']}")
+    return routing
+
+
+def _record_telemetry(model_id: str, generate_ms, evaluator_result=None):
+    """Feed the router's per-model latency and evaluator-score averages."""
+    save = record_latency(model_id, generate_ms) if generate_ms is not None else False
+    score = evaluator_mean_score(evaluator_result) if evaluator_result else None
+    if score is not None:
+        save = record_score(model_id, score) or save
+    if save:
+        run_in_background("router_telemetry", save_telemetry)
+
+
+async def _fetch_upload(file_path: str) -> dict:
+    """S3 GET plus text extraction for an uploaded file."""
+    try:
+        return await fetch_data_async(file_path)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _build_agent(model_id: str, model, file_path, prefetched_prompt) -> Agent:
+    """Create a fresh agent on the pooled model with the right tools and system prompt."""
+    supports_system_prompt = model_supports_system_prompt(model_id)
+    supports_tools = model_supports_tools(model_id)
+
+    agent_kwargs = {"model": model}
+
+    if supports_tools and optional_tools and not prefetched_prompt:
+        agent_kwargs["tools"] = optional_tools
+
+    # Set system prompt based on whether we have a file or not
+    if supports_system_prompt:
+        if prefetched_prompt:
+            # Content is already in the system prompt, no tool call needed
+            agent_kwargs["system_prompt"] = prefetched_prompt
+        elif file_path:
+            # Use dynamic system prompt with file path as data_source
+            try:
+                dynamic_system_prompt = get_analyzer_prompt(file_path)
+                print(f"📋 System prompt length: {len(dynamic_system_prompt)} characters")
+                agent_kwargs["system_prompt"] = dynamic_system_prompt
+            except Exception as e:
+                print(f"❌ Error generating system prompt: {e}")
+                # Fallback to static prompt
+                agent_kwargs["system_prompt"] = SYSTEM_PROMPT
+        else:
+            # Use static system prompt for non-file inputs
+            agent_kwargs["system_prompt"] = SYSTEM_PROMPT
+
+    return _create_agent(model_id, **agent_kwargs)
+
+
+def _create_agent(model_id: str, model, **agent_kwargs) -> Agent:
+    """Every agent the runtime uses is constructed here, the one place to substitute a local stand-in."""
+    return Agent(model=model, **agent_kwargs)
+
+
+async def _run_agent(
+    agent, model_id: str, user_input: str, file_path, prefetched_prompt,
+    priority: str = DEFAULT_PRIORITY, actor_id: str = DEFAULT_ACTOR,
+    early_stop: bool = EARLY_STOP_ENABLED, hedge: bool = True, hedge_info: dict | None = None,
+):
+    """
+    Run the agent with the prompt shape each model capability combination needs,
+    under the model's adaptive concurrency limit (throttles are retried) and
+    queued by the request's priority class. Tool-capable models answer through
+    a forced structured-output tool call when the content is pre-fetched; other
+    answers are streamed (cut once the smart_goals object closes with early_stop).
+    When the model has a hedge target and a streamed answer's first tokens are
+    late, the same request is raced against the target (hedge_info records what
+    happened). Structured-output and unstreamed calls report no first token, so
+    they are never hedged.
+    """
+
+    def _structured(model_id: str) -> bool:
+        return bool(STRUCTURED_OUTPUT_ENABLED and prefetched_prompt and model_supports_tools(model_id))
+
+    async def _generate(agent, model_id: str, first_token=None):
+        prompt = await asyncio.to_thread(_agent_prompt, model_id, user_input, file_path, prefetched_prompt)
+        history = list(agent.messages)
+        structured = _structured(model_id)
+
+        async def _attempt():
+            # A throttled attempt may have appended the user turn already
+            agent.messages[:] = history
+            if structured:
                 try:
-                    file_result = fetch_data(file_path)
-                    if file_result.get("formatted_text"):
-                        file_context = f"\n\nFile content:\n{file_result['formatted_text'][:2000]}..."
-                        if dynamic_supports_system_prompt:
-                            # System prompt already set, just add file content
-                            response = dynamic_agent(f"{user_input}\n\nFile content: {file_context}")
-                        else:
-                            # No system prompt, provide everything
-                            system_prompt_with_content = get_analyzer_prompt(file_path)
-                            response = dynamic_agent(f"{system_prompt_with_content}\n\nUser request: {user_input}\n\nFile content: {file_context}")
-                    else:
-                        raise Exception("No file content extracted")
+                    goals = await agent.structured_output_async(SmartGoalsOutput, prompt)
+                    record_parse_event(model_id, "structured")
+                    return StructuredResult(goals.model_dump(), getattr(agent, "event_loop_metrics", None))
                 except Exception as e:
-                    print(f"Error processing file: {e}")
-                    error_message = f"Error reading file {file_path}: {str(e)}"
-                    if dynamic_supports_system_prompt:
-                        response = dynamic_agent(f"{user_input}\n\n{error_message}")
-                    else:
-                        system_prompt_with_error = get_analyzer_prompt(file_path)
-                        response = dynamic_agent(f"{system_prompt_with_error}\n\nUser request: {user_input}\n\n{error_message}")
+                    if is_throttle(e):
+                        raise
+                    print(f"⚠️ Structured output failed for {model_id}, falling back to text: {e}")
+                    record_parse_event(model_id, "structured_fallback")
+                    agent.messages[:] = history
+            if early_stop:
+                return await stream_until_json_complete(agent, prompt, model_id, first_token)
+            return await agent.invoke_async(prompt)
+
+        return _attempt
+
+    streamed = early_stop and not _structured(model_id)
+    target = hedge_target(model_id) if hedge and streamed and priority in HEDGE_PRIORITIES else None
+    if target is None:
+        attempt = await _generate(agent, model_id)
+        return await call_with_limit(model_id, attempt, priority=priority, actor_id=actor_id)
+
+    secondary_model_id, region = target
+    secondary_key = target_key(secondary_model_id, region)
+
+    async def _primary(first_token):
+        attempt = await _generate(agent, model_id, first_token)
+        return await call_with_limit(model_id, attempt, priority=priority, actor_id=actor_id)
+
+    async def _secondary(first_token):
+        print(f"⏱️ {model_id} is slow, hedging with {secondary_key}")
+        model = await asyncio.to_thread(_acquire_model, secondary_model_id, region)
+        secondary_agent = _build_agent(secondary_model_id, model, file_path, prefetched_prompt)
+        attempt = await _generate(secondary_agent, secondary_model_id, first_token)
+        # No throttle retries: the primary is still running
+        return await call_with_limit(secondary_key, attempt, retries=0, priority=priority, actor_id=actor_id)
+
+    info = hedge_info if hedge_info is not None else {}
+    response = await call_hedged(model_id, _primary, _secondary, info)
+    info["served_by"] = secondary_key if info.get("winner") == "secondary" else model_id
+    return response
+
+
+def _agent_prompt(model_id: str, user_input: str, file_path, prefetched_prompt) -> str:
+    """The user message for the agent (may fetch the file directly for models without tools)."""
+    supports_system_prompt = model_supports_system_prompt(model_id)
+    supports_tools = model_supports_tools(model_id)
+
+    if prefetched_prompt:
+        if supports_system_prompt:
+            return user_input
+        return f"{prefetched_prompt}\n\nUser request: {user_input}"
+
+    if file_path:
+        # The system prompt already instructs the agent to use fetch_data with the file_path
+        print(f"📁 File path for agent: {file_path}")
+
+        if supports_tools and supports_system_prompt:
+            # Agent has tools and system prompt - pass the user's original input
+            return user_input
+        if supports_tools:
+            # Agent has tools but no system prompt - provide the system prompt manually
+            return get_analyzer_prompt(file_path)
+
+        # No tools available, try direct fetch as fallback
+        try:
+            file_result = fetch_data(file_path)
+            if not file_result.get("formatted_text"):
+                raise Exception("No file content extracted")
+            file_context = f"\n\nFile content:\n{file_result['formatted_text'][:2000]}..."
+            if supports_system_prompt:
+                # System prompt already set, just add file content
+                return f"{user_input}\n\nFile content: {file_context}"
+            # No system prompt, provide everything
+            system_prompt_with_content = get_analyzer_prompt(file_path)
+            return f"{system_prompt_with_content}\n\nUser request: {user_input}\n\nFile content: {file_context}"
+        except Exception as e:
+            print(f"Error processing file: {e}")
+            error_message = f"Error reading file {file_path}: {str(e)}"
+            if supports_system_prompt:
+                return f"{user_input}\n\n{error_message}"
+            system_prompt_with_error = get_analyzer_prompt(file_path)
+            return f"{system_prompt_with_error}\n\nUser request: {user_input}\n\n{error_message}"
+
+    # No file uploaded, proceed normally
+    if supports_system_prompt:
+        return f"DATA_SOURCE: {user_input}"
+    return f"{SYSTEM_PROMPT}\n\nDATA_SOURCE: {user_input}"
+
+
+def _build_fix_agent(model_id: str, model):
+    """Bare agent (no tools, no system prompt) for the "fix this JSON" retry."""
+    return _create_agent(model_id, model, tools=[], callback_handler=None)
+
+
+async def _parse_model_output(
+    response, model_id: str, model,
+    priority: str = DEFAULT_PRIORITY, actor_id: str = DEFAULT_ACTOR,
+) -> dict:
+    """
+    The model's answer as a dict: structured results as-is, text through
+    _coerce_json, then local repair, then one targeted fix retry.
+    """
+    record_parse_event(model_id, "generation")
+    if isinstance(response, StructuredResult):
+        return response.parsed
+
+    text = str(response)
+    try:
+        return _coerce_json(text)
+    except ValueError:
+        record_parse_event(model_id, "parse_failure")
+        if not STRUCTURED_OUTPUT_ENABLED:
+            raise
+
+    repaired = repair_json(text)
+    if repaired is not None:
+        record_parse_event(model_id, "repaired_locally")
+        return repaired
+
+    record_parse_event(model_id, "fix_retry")
+    fixer = _build_fix_agent(model_id, model)
+    fixed = await call_with_limit(
+        model_id, fixer.invoke_async, fix_json_prompt(text), priority=priority, actor_id=actor_id
+    )
+    parsed = repair_json(str(fixed))
+    if parsed is None:
+        record_parse_event(model_id, "fix_retry_failed")
+        raise ValueError("Model output is not valid JSON after local repair and one fix retry.")
+    return parsed
+
+
+def _normalize_output(response, model_id: str, data_source: str) -> dict:
+    """Parse the agent output and build the structured analyzer record."""
+    parsed = _coerce_json(response)
+
+    smart_goals = []
+    goals_data = parsed.get("smart_goals") or parsed.get("goals") or []
+
+    for idx, goal in enumerate(goals_data, start=1):
+        if isinstance(goal, dict):
+            desc = goal.get("description") or goal.get("goal") or str(goal)
         else:
-            # No file uploaded, proceed normally
-            if dynamic_supports_tools and dynamic_supports_system_prompt:
-                response = dynamic_agent(f"DATA_SOURCE: {user_input}")
-            elif dynamic_supports_tools:
-                response = dynamic_agent(f"{SYSTEM_PROMPT}\n\nDATA_SOURCE: {user_input}")
-            elif dynamic_supports_system_prompt:
-                response = dynamic_agent(f"DATA_SOURCE: {user_input}")
-            else:
-                response = dynamic_agent(f"{SYSTEM_PROMPT}\n\nDATA_SOURCE: {user_input}")
-
-
-
-        # Step 2: Parse agent output
-        parsed = _coerce_json(response)
-
-        # Step 3: Normalize smart goals
-        smart_goals = []
-        goals_data = parsed.get("smart_goals") or parsed.get("goals") or []
-
-        for idx, goal in enumerate(goals_data, start=1):
-            if isinstance(goal, dict):
-                desc = goal.get("description") or goal.get("goal") or str(goal)
-            else:
-                desc = str(goal)
-            smart_goals.append({
-                "goal_number": idx,
-                "description": desc.strip()
-            })
-
-        # Step 4: Final structured output
-        output_obj = {
-            "model_id": requested_model_id,
-            "data_source": original_data_source,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-            "smart_goals": smart_goals,
-        }
+            desc = str(goal)
+        smart_goals.append({
+            "goal_number": idx,
+            "description": desc.strip()
+        })
+
+    return {
+        "model_id": model_id,
+        "data_source": data_source,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "smart_goals": smart_goals,
+    }
+
+
+def _persist_outputs(output_obj: dict, user_input: str):
+    """Queue the per-run JSON file and the results.jsonl record on the results writer."""
+    base = _basename_no_ext(user_input)
+    safe_model = _safe_fragment(output_obj.get("model_id") or MODEL_ID)
+    out_path = os.path.join(
+        OUTPUT_DIR_INDIVIDUAL, f"{base}_{safe_model}_output.json"
+    )
+
+    writer = get_results_writer(output_jsonl)
+    writer.submit_file(out_path, output_obj)
+    writer.submit(output_obj)
+
+
+def _cleanup_file(file_path):
+    """Remove a local temporary upload, if any."""
+    if file_path and os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+            print(f"Cleaned up temporary file: {file_path}")
+        except Exception as cleanup_error:
+            print(f"Could not cleanup file {file_path}: {cleanup_error}")
 
-        # Step 5: Save outputs
-        os.makedirs(OUTPUT_DIR_INDIVIDUAL, exist_ok=True)
-        base = _basename_no_ext(user_input)
-        safe_model = _safe_fragment(MODEL_ID)
-        out_path = os.path.join(
-            OUTPUT_DIR_INDIVIDUAL, f"{base}_{safe_model}_output.json"
+
+async def _evaluate(
+    output_obj: dict, runtime_arn: str,
+    priority: str = DEFAULT_PRIORITY, actor_id: str = DEFAULT_ACTOR,
+    session_id: str | None = None,
+):
+    """Send the analyzer record to the evaluator runtime and return its formatted output."""
+    try:
+        payload = {'analyzer_payload': output_obj}
+        started = time.perf_counter()
+        raw_output = await call_with_limit(
+            "evaluator-runtime", _call_evaluator, payload, runtime_arn, session_id,
+            priority=priority, actor_id=actor_id,
+        )
+        body = json.loads(raw_output['body'])
+        _record_evaluator_call(body, started, session_id)
+        eval_dict = body['evaluator_output']
+        return json.dumps(eval_dict, indent=2)
+    except Exception as ex:
+        print(f"Evaluator runtime failed: {ex}")
+        return {"error": str(ex)}
+
+
+async def generate_goals(
+    model_id: str, data_source: str, file_result: dict,
+    priority: str = DEFAULT_PRIORITY, actor_id: str = DEFAULT_ACTOR,
+) -> dict:
+    """
+    Generate, parse and persist the SMART goals for an already extracted
+    document (file_result with its "formatted_text"). Used by batch jobs;
+    raises RuntimeError when there is nothing to send or no goals come back.
+    """
+    model = await asyncio.to_thread(_acquire_model, model_id)
+    prompt = _prefetched_prompt_for(data_source, file_result)
+    if prompt is None:
+        raise RuntimeError("Extraction is empty")
+    agent = _build_agent(model_id, model, data_source, prompt)
+    user_input = "Generate SMART goals for the patient summary above."
+    response = await _run_agent(agent, model_id, user_input, data_source, prompt, priority, actor_id)
+    parsed = await _parse_model_output(response, model_id, model, priority, actor_id)
+    output_obj = _normalize_output(parsed, model_id, data_source)
+    if not output_obj["smart_goals"]:
+        raise RuntimeError("Model output contained no SMART goals")
+    _persist_outputs(output_obj, data_source)
+    return output_obj
+
+
+async def evaluate_goals(
+    output_obj: dict, session_base: str | None = None,
+    priority: str = DEFAULT_PRIORITY, actor_id: str = DEFAULT_ACTOR,
+):
+    """Evaluate an output record; calls sharing session_base share an evaluator session."""
+    config = await asyncio.to_thread(_lookup_config)
+    return await _evaluate(
+        output_obj, config["evaluator_runtime_arn"], priority, actor_id, evaluator_session_id(session_base),
+    )
+
+
+async def _invoke_pipeline(
+    payload: dict, fetch_task=None, cleanup: bool = True, progressive: dict | None = None,
+) -> dict:
+    """
+    Stage pipeline behind invoke:
+
+        parse ─┬─ config lookup ─────────────────────────────┐
+               ├─ fetch_extract (S3 GET + extraction) ─┐      │
+               └─ agent_acquire (pooled model) ────────┴─ generate ─ parse_output ─ evaluate
+                                                                    └─ persist, cleanup (background)
+
+    Progressive mode runs two pipelines on one upload: they share fetch_task,
+    leave the cleanup to the caller and record their role in the output record.
+    """
+    started = time.perf_counter()
+    timings = StageTimings()
+    file_path = None
+    try:
+        if not payload.get("prompt", "").strip():
+            return {
+                "statusCode": 400,
+                "body": json.dumps({"error": "No prompt provided."})
+            }
+        user_input, file_path, original_data_source = _parse_request(payload)
+        priority, actor_id = _request_priority(payload)
+
+        # Get model ID from payload, fallback to default; "auto" is routed after extraction
+        requested_model_id = payload.get("model_id", MODEL_ID)
+        auto_route = requested_model_id == AUTO_MODEL_ID
+        if auto_route:
+            try:
+                _routing_budgets(payload)
+            except (TypeError, ValueError):
+                return {
+                    "statusCode": 400,
+                    "body": json.dumps({"error": "latency_budget_ms and cost_budget_usd must be numbers."})
+                }
+        print(f"Using model: {requested_model_id}")
+
+        # Independent stages run concurrently
+        config_task = start_stage(timings, "config_lookup", _lookup_config)
+        if fetch_task is None and file_path and fetch_data_async and (
+            payload.get("prefetch", PREFETCH_UPLOADS) or auto_route
+        ):
+            fetch_task = start_stage(timings, "fetch_extract", _fetch_upload, file_path)
+        model_task = None
+        if not auto_route:
+            model_task = start_stage(timings, "agent_acquire", _acquire_model, requested_model_id)
+
+        note_stage("fetch_extract")
+        file_result = await fetch_task if fetch_task else None
+        if file_result:
+            note_input(len(file_result.get("formatted_text") or ""))
+        routing = None
+        if auto_route:
+            routing = await run_stage(
+                timings, "route", _route_request, payload, user_input, file_path, file_result
+            )
+            requested_model_id = routing["model_id"]
+            token = current_token.get()
+            if token is not None:
+                token.model_id = requested_model_id
+            model_task = start_stage(timings, "agent_acquire", _acquire_model, requested_model_id)
+        dynamic_model = await model_task
+        prefetched_prompt = _prefetched_prompt_for(file_path, file_result)
+        dynamic_agent = _build_agent(requested_model_id, dynamic_model, file_path, prefetched_prompt)
+
+        # Step 1: Run the dynamic agent with requested model
+        note_stage("generate")
+        hedge_info = {}
+        response = await run_stage(
+            timings, "generate",
+            _run_agent, dynamic_agent, requested_model_id, user_input, file_path, prefetched_prompt,
+            priority, actor_id, bool(payload.get("early_stop", EARLY_STOP_ENABLED)),
+            bool(payload.get("hedge", True)), hedge_info,
         )
 
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(output_obj, f, ensure_ascii=False, indent=2)
+        # The upload is no longer needed once the model has answered
+        if cleanup:
+            run_in_background("cleanup", _cleanup_file, file_path)
 
-        _append_jsonl(output_jsonl, output_obj)
+        # Turn count and token savings of the pre-fetch mode
+        dynamic_supports_tools = model_supports_tools(requested_model_id)
+        tokens_saved = 0
+        baseline_turns = 2 if (file_path and dynamic_supports_tools) else 1
+        if prefetched_prompt and dynamic_supports_tools:
+            tokens_saved = _estimate_prefetch_savings(file_path, user_input, file_result)
+        generation_metrics = _generation_metrics(
+            response, bool(prefetched_prompt), baseline_turns, tokens_saved
+        )
+        if hedge_info:
+            generation_metrics["hedge"] = hedge_info
+        record_output_tokens(requested_model_id, generation_metrics.get("output_tokens"))
+        print(f"📊 Generation metrics: {generation_metrics}")
+        note_stage("parse_output")
+
+        # Step 2-4: Parse agent output (repairing it if needed), normalize smart goals, build the record
+        parsed_output = await run_stage(
+            timings, "parse_output",
+            _parse_model_output, response, requested_model_id, dynamic_model, priority, actor_id,
+        )
+        output_obj = _normalize_output(parsed_output, requested_model_id, original_data_source)
+        if hedge_info.get("winner") == "secondary":
+            # The goals came from the hedge target, not the requested model
+            output_obj["served_by"] = hedge_info["served_by"]
+        if progressive:
+            output_obj["progressive"] = {
+                **progressive,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+
+        # Step 5: Save outputs off the response path (background results writer)
+        _persist_outputs(output_obj, user_input)
 
         # Step 6: Call evaluator runtime (optional)
         evaluator_result = None
-        if build_eval_plan_v2:
-            try:
-                output_obj1 = output_obj
-                payload={'analyzer_payload':output_obj1}
-                raw_output = call_evaluator_runtime(payload) 
-                eval_dict = json.loads(raw_output['body'])['evaluator_output']
-                evaluator_result = json.dumps(eval_dict, indent=2)
-                
-            except Exception as ex:
-                print(f"Evaluator runtime failed: {ex}")
-                evaluator_result = {"error": str(ex)}
-
-
-        # Cleanup temporary file if it exists
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"Cleaned up temporary file: {file_path}")
-            except Exception as cleanup_error:
-                print(f"Could not cleanup file {file_path}: {cleanup_error}")
+        if build_eval_plan_v2 and payload.get("evaluate", True):
+            config = await config_task
+            note_stage("evaluate")
+            evaluator_result = await run_stage(
+                timings, "evaluate", _evaluate, output_obj, config["evaluator_runtime_arn"],
+                priority, actor_id, _evaluator_session_for(payload, actor_id),
+            )
+        elif not config_task.done():
+            config_task.cancel()
+
+        _record_telemetry(requested_model_id, timings.stages.get("generate"), evaluator_result)
 
-        
         # Step 7: Return HTTP-style response
         combined = {"model_output": output_obj}
         if evaluator_result:
             combined["evaluator_result"] = evaluator_result
+        combined["metadata"] = {
+            "generation": generation_metrics,
+            "stage_timings_ms": timings.as_dict(),
+            "concurrency": get_limiter(requested_model_id).snapshot(),
+            "priority": priority,
+        }
+        if routing:
+            combined["metadata"]["routing"] = routing
 
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps(combined, ensure_ascii=False),
         }
-        
+
+    except CircuitOpenError as e:
+        print(f"Rejected: {str(e)}")
+        if cleanup:
+            run_in_background("cleanup", _cleanup_file, file_path)
+        return _overloaded_response(503, str(e), e.retry_after_s)
+
+    except asyncio.CancelledError:
+        if cleanup:
+            run_in_background("cleanup", _cleanup_file, file_path)
+        raise
+
     except Exception as e:
         print(f"Error: {str(e)}")
         # Cleanup temporary file even on error
-        if 'file_path' in locals() and file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"Cleaned up temporary file after error: {file_path}")
-            except:
-                pass
+        if cleanup:
+            run_in_background("cleanup", _cleanup_file, file_path)
+        if is_throttle(e):
+            # Retries exhausted: tell the caller to back off rather than fail hard
+            return _overloaded_response(429, str(e), 5.0)
         return {
             "statusCode": 500,
             "body": json.dumps({"error": str(e)})
         }
 
 
-    #user_input = payload.get("prompt", "")      #user_input is the file path
-    # Invoke the agent
-    #response = agent(user_input)
-    #return response.message["content"][0]["text"]
+def _overloaded_response(status: int, message: str, retry_after_s: float) -> dict:
+    retry_after = max(1, int(round(retry_after_s)))
+    return {
+        "statusCode": status,
+        "headers": {"Retry-After": str(retry_after)},
+        "body": json.dumps({"error": message, "retry_after_s": retry_after}),
+    }
 
 
-if __name__ == "__main__":
-    app.run()  #### AGENTCORE RUNTIME - LINE 4 ####
+# =============================================
+# ===== Evaluator sessions (warm instances) ===
+# =============================================
+# Evaluator calls carry a session id derived from the user's session, and the
+# Streamlit page sends "prewarm" at login so that session's evaluator microVM
+# has imported and built its agent before the first evaluation. Latency is
+# tracked separately for calls the evaluator reports as its cold start.
+_evaluator_latency_ms = {"cold": [], "warm": [], "prewarm": []}
+_evaluator_stats = {"calls": 0, "sticky_calls": 0, "prewarms": 0, "prewarm_failures": 0}
+_prewarm_tasks = set()
+
+
+def _evaluator_session_for(payload: dict, actor_id: str) -> str | None:
+    base = payload.get("session_id") or (actor_id if actor_id != DEFAULT_ACTOR else None)
+    return evaluator_session_id(base)
+
 
+def _record_evaluator_call(body: dict, started: float, session_id: str | None):
+    latency_ms = round((time.perf_counter() - started) * 1000, 1)
+    cold = bool((body.get("instance") or {}).get("cold_start"))
+    samples = _evaluator_latency_ms["cold" if cold else "warm"]
+    samples.append(latency_ms)
+    del samples[:-500]
+    _evaluator_stats["calls"] += 1
+    _evaluator_stats["sticky_calls"] += int(session_id is not None)
+
+
+async def _ping_evaluator(session_id: str):
+    """Start (or keep warm) the evaluator instance of session_id."""
+    started = time.perf_counter()
+    try:
+        config = await asyncio.to_thread(_lookup_config)
+        response = await _call_evaluator({"action": "ping"}, config["evaluator_runtime_arn"], session_id)
+        status = response.get("statusCode") if isinstance(response, dict) else None
+        if status != 200:
+            raise RuntimeError(f"ping answered with status {status}")
+        _evaluator_latency_ms["prewarm"].append(round((time.perf_counter() - started) * 1000, 1))
+        del _evaluator_latency_ms["prewarm"][:-500]
+        _evaluator_stats["prewarms"] += 1
+    except Exception as e:
+        _evaluator_stats["prewarm_failures"] += 1
+        print(f"⚠️ Evaluator pre-warm failed: {e}")
+
+
+def _prewarm_action(payload: dict) -> dict:
+    """Ping the evaluator for this session in the background; answers right away."""
+    _, actor_id = _request_priority(payload)
+    session_id = _evaluator_session_for(payload, actor_id)
+    if session_id is None:
+        return {"statusCode": 400, "body": json.dumps({"error": "No session_id or actor_id to pre-warm for."})}
+    task = asyncio.get_running_loop().create_task(_ping_evaluator(session_id))
+    _prewarm_tasks.add(task)
+    task.add_done_callback(_prewarm_tasks.discard)
+    return {"statusCode": 202, "body": json.dumps({"prewarming": True})}
+
+
+def _evaluator_metrics() -> dict:
+    out = {**_evaluator_stats, "sticky_sessions": EVALUATOR_STICKY_SESSIONS}
+    for kind, samples in _evaluator_latency_ms.items():
+        ordered = sorted(samples)
+        out[kind] = {
+            "count": len(ordered),
+            "p50_ms": ordered[len(ordered) // 2] if ordered else None,
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None,
+        }
+    return out
+
+
+# =============================================
+# ===== Cancellation ==========================
+# =============================================
+# Each pipeline run holds a CancelToken registered under its session id. The
+# "cancel" action and, on the SSE path, a client disconnect cancel the run's
+# task; the run then answers 499 with what the cancellation saved instead of
+# generating, persisting and evaluating a result nobody will read.
+async def _cancellable(token: CancelToken, fn, *args, **kwargs) -> dict:
+    """Await fn(*args, **kwargs) under token; a cancel through the token becomes a 499 response."""
+    token.task = asyncio.current_task()
+    register_cancel_token(token)
+    context_token = current_token.set(token)
+    try:
+        if token.cancelled:
+            raise asyncio.CancelledError  # cancelled before it started
+        return await fn(*args, **kwargs)
+    except asyncio.CancelledError:
+        if not token.cancelled:
+            raise
+        if hasattr(token.task, "uncancel"):
+            token.task.uncancel()
+        savings = record_cancelled(token)
+        print(f"🛑 Cancelled {token.model_id} run ({token.reason}) during {savings['stage']}: {savings}")
+        return {"statusCode": 499, "body": json.dumps({"cancelled": True, **savings})}
+    finally:
+        current_token.reset(context_token)
+        unregister_cancel_token(token)
+
+
+def _cancel_action(payload: dict) -> dict:
+    """Cancel every in-flight invocation of "session_id" (in every worker)."""
+    session_id = payload.get("session_id")
+    if not session_id:
+        return {"statusCode": 400, "body": json.dumps({"error": "No session_id to cancel."})}
+    reason = payload.get("reason") or "cancel_action"
+    cancelled = cancel_session(str(session_id), reason)
+    if SERVER_WORKERS > 1:
+        # The session's runs may be in another worker
+        post_shared_cancel(get_shared_cache(), str(session_id), reason)
+    return {"statusCode": 200, "body": json.dumps({
+        "session_id": session_id, "cancelled": cancelled, "broadcast": SERVER_WORKERS > 1,
+    })}
+
+
+_cancel_watcher = None
+
+
+def _ensure_cancel_watcher():
+    """With several workers, start this worker's watcher for cancels posted by the others."""
+    global _cancel_watcher
+    if SERVER_WORKERS > 1 and _cancel_watcher is None:
+        _cancel_watcher = asyncio.get_running_loop().create_task(watch_shared_cancels(get_shared_cache()))
+
+
+# =============================================
+# ===== Progressive results (draft, refine) ===
+# =============================================
+# The selected (slow, high-quality) model and a fast draft model run side by
+# side on the same upload. The draft goals are streamed first, as an SSE event,
+# and replaced by the refined set when the selected model finishes. The draft is
+# not evaluated; both records land in results.jsonl with their role and latency.
+DRAFT_MODEL_ID = os.environ.get("SMARTGOAL_DRAFT_MODEL_ID", "mistral.mistral-7b-instruct-v0:2")
+
+_progressive_stats = {"runs": 0, "drafts_shown": 0, "drafts_failed": 0, "drafts_late": 0}
+_progressive_latency_ms = {"draft": [], "final": []}
+
+
+def _progressive_event(role: str, model_id: str, started: float, response: dict) -> dict:
+    latency_ms = round((time.perf_counter() - started) * 1000, 1)
+    samples = _progressive_latency_ms[role]
+    samples.append(latency_ms)
+    del samples[:-200]
+    return {"event": role, "model_id": model_id, "latency_ms": latency_ms, "response": response}
+
+
+async def _progressive_invoke(payload: dict, priority: str, actor_id: str):
+    """Async generator for the SSE response: an optional "draft" event, then "final"."""
+    async with _get_invocation_scheduler().slot(priority, actor_id):
+        _, file_path, _ = _parse_request(payload)
+        final_model_id = payload.get("model_id", MODEL_ID)
+        draft_model_id = payload.get("draft_model_id") or DRAFT_MODEL_ID
+        request_id = uuid.uuid4().hex
+        started = time.perf_counter()
+        _progressive_stats["runs"] += 1
+
+        # One S3 GET + extraction feeds both models
+        fetch_task = None
+        if file_path and fetch_data_async and payload.get("prefetch", PREFETCH_UPLOADS):
+            fetch_task = asyncio.ensure_future(_fetch_upload(file_path))
+
+        tokens = {}
+
+        def _start(role: str, model_id: str, **overrides):
+            token = tokens[role] = CancelToken(payload.get("session_id"), model_id)
+            return asyncio.ensure_future(_cancellable(
+                token, _invoke_pipeline,
+                {**payload, "model_id": model_id, **overrides},
+                fetch_task=fetch_task, cleanup=False,
+                progressive={"role": role, "request_id": request_id},
+            ))
+
+        final_task = _start("final", final_model_id)
+        draft_task = _start("draft", draft_model_id, evaluate=False) if draft_model_id != final_model_id else None
+        try:
+            if draft_task is not None:
+                await asyncio.wait({draft_task, final_task}, return_when=asyncio.FIRST_COMPLETED)
+                if final_task.done():
+                    # Nothing to show early: the refined set is already here
+                    _progressive_stats["drafts_late"] += 1
+                    tokens["draft"].cancel("draft_superseded")
+                else:
+                    draft = draft_task.result()
+                    if draft["statusCode"] == 200:
+                        _progressive_stats["drafts_shown"] += 1
+                        yield _progressive_event("draft", draft_model_id, started, draft)
+                    elif draft["statusCode"] != 499:
+                        _progressive_stats["drafts_failed"] += 1
+                        print(f"⚠️ Draft from {draft_model_id} failed: {draft['body']}")
+            yield _progressive_event("final", final_model_id, started, await final_task)
+        finally:
+            # Still running here means the client went away mid-stream
+            for token in tokens.values():
+                token.cancel("client_disconnected")
+            run_in_background("cleanup", _cleanup_file, file_path)
+
+
+def _progressive_metrics() -> dict:
+    out = dict(_progressive_stats)
+    for role, samples in _progressive_latency_ms.items():
+        ordered = sorted(samples)
+        out[f"{role}_p50_ms"] = ordered[len(ordered) // 2] if ordered else None
+    return out
 
 
+# =============================================
+# ===== Warm-up / readiness ===================
+# =============================================
+# Primes every per-container cache so the first real request does not pay for
+# it: pooled models (and their hedge targets), configuration and AWS clients,
+# prompt templates and one synthetic extraction per document type. Runs in the
+# app's startup, before the server (or each server worker) accepts requests, so
+# /ping only answers once warm, and on {"action": "warmup"}, which returns after
+# it has finished, with the duration of each step.
+WARMUP_ON_START = os.environ.get("SMARTGOAL_WARMUP_ON_START", "1") != "0"
+# Bucket for a HEAD request that opens the S3 connection pool (optional)
+WARMUP_BUCKET = os.environ.get("SMARTGOAL_WARMUP_BUCKET", "")
+
+_warmup_state = {"ready": False, "steps_ms": {}, "details": {}, "errors": {}, "total_ms": None, "finished_at": None}
+_warmup_lock = threading.Lock()
+
+
+def _warmup_models() -> list:
+    """(model_id, region) pairs to pool: SMARTGOAL_WARMUP_MODELS or the default and draft models, plus hedge targets."""
+    configured = os.environ.get("SMARTGOAL_WARMUP_MODELS", "")
+    model_ids = [m.strip() for m in configured.split(",") if m.strip()] or [MODEL_ID, DRAFT_MODEL_ID]
+    targets = []
+    for model_id in dict.fromkeys(model_ids):
+        targets.append((model_id, None))
+        hedge = hedge_target(model_id)
+        if hedge is not None:
+            targets.append(hedge)
+    return targets
+
+
+def _warm_models() -> dict:
+    for model_id, region in _warmup_models():
+        model = _acquire_model(model_id, region)
+        _build_agent(model_id, model, None, None)
+    return {"models": [target_key(m, r) if r else m for m, r in _warmup_models()]}
+
+
+def _warm_clients() -> dict:
+    _lookup_config()
+    _get_agent_core_client()
+    if WARMUP_BUCKET:
+        boto3.client("s3").head_bucket(Bucket=WARMUP_BUCKET)
+    return {}
+
+
+def _warm_prompts() -> dict:
+    prompt = get_analyzer_prompt("warmup.txt", "A1c 8.9@Sedentary", "A1c 8.9\nSedentary")
+    fix_json_prompt("{}")
+    return {"analyzer_prompt_chars": len(prompt)}
+
+
+def _warm_extraction() -> dict:
+    if warm_extractors is None:
+        raise RuntimeError("Extraction tools are not available in this deployment.")
+    return {"by_type_ms": warm_extractors()}
+
+
+_WARMUP_STEPS = (
+    ("agent_pool", _warm_models),
+    ("clients", _warm_clients),
+    ("prompts", _warm_prompts),
+    ("extraction", _warm_extraction),
+)
+
+
+def run_warmup(force: bool = False) -> dict:
+    """Run the warm-up steps once per container; concurrent callers wait for the first run."""
+    with _warmup_lock:
+        if _warmup_state["ready"] and not force:
+            return dict(_warmup_state)
+        started = time.perf_counter()
+        steps_ms, errors, details = {}, {}, {}
+        for name, step in _WARMUP_STEPS:
+            step_started = time.perf_counter()
+            try:
+                details[name] = step()
+            except Exception as e:
+                # A failed step only means the first request pays for it
+                errors[name] = str(e)
+                print(f"⚠️ Warm-up step {name} failed: {e}")
+            steps_ms[name] = round((time.perf_counter() - step_started) * 1000, 1)
+        _warmup_state.update(
+            ready=True,
+            steps_ms=steps_ms,
+            details=details,
+            errors=errors,
+            total_ms=round((time.perf_counter() - started) * 1000, 1),
+            finished_at=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        )
+        print(f"🔥 Warm-up finished in {_warmup_state['total_ms']} ms: {steps_ms}")
+        return dict(_warmup_state)
+
+
+async def _warmup_action(payload: dict) -> dict:
+    """Warm the container up (again with "force") and report readiness with per-step timings."""
+    state = await asyncio.to_thread(run_warmup, bool(payload.get("force")))
+    return {"statusCode": 200, "body": json.dumps(state)}
+
+
+# =============================================
+# ===== Control actions =======================
+# =============================================
+# Payloads with an "action" key are served directly, outside the invocation slots.
+def _metrics_action(payload: dict) -> dict:
+    return {
+        "statusCode": 200,
+        "body": json.dumps({
+            "concurrency": limiter_metrics(),
+            "invocations": _get_invocation_scheduler().snapshot(),
+            "early_stop": early_stop_metrics(),
+            "output_parsing": parse_metrics(),
+            "progressive": _progressive_metrics(),
+            "hedging": hedge_metrics(),
+            "routing": router_metrics(),
+            "idempotency": _get_single_flight().snapshot(),
+            "cancellation": cancellation_metrics(),
+            "evaluator": _evaluator_metrics(),
+            "warmup": dict(_warmup_state),
+            "worker": {"pid": os.getpid(), "workers": SERVER_WORKERS},
+            "shared_cache": get_shared_cache().snapshot(),
+            "extraction_pool": get_extraction_pool().snapshot(),
+            "extractors": extractor_metrics(),
+        }),
+    }
+
+
+_job_tasks = {}
+
+
+def _jobs_unavailable() -> dict:
+    return {"statusCode": 501, "body": json.dumps({"error": "Batch jobs are not available in this deployment."})}
+
+
+async def _status_action(payload: dict) -> dict:
+    """Progress of one job ("job_id"), or of the most recent jobs."""
+    if get_job_store is None:
+        return _jobs_unavailable()
+    store = get_job_store()
+    job_id = payload.get("job_id")
+    if not job_id:
+        try:
+            limit = int(payload.get("limit", 20))
+        except (TypeError, ValueError):
+            return {"statusCode": 400, "body": json.dumps({"error": "limit must be an integer."})}
+        jobs = await asyncio.to_thread(store.list_jobs, limit)
+        return {"statusCode": 200, "body": json.dumps({"jobs": jobs})}
+    progress = await asyncio.to_thread(store.progress, job_id)
+    if progress is None:
+        return {"statusCode": 404, "body": json.dumps({"error": f"Unknown job: {job_id}"})}
+    progress["running_here"] = job_id in _job_tasks
+    return {"statusCode": 200, "body": json.dumps(progress)}
+
+
+def _start_job_task(job_id: str):
+    """Run a job in the background of this container (reported busy to AgentCore while it runs)."""
+    if job_id in _job_tasks:
+        return
+    busy_id = app.add_async_task("batch_job", {"job_id": job_id}) if hasattr(app, "add_async_task") else None
+
+    async def _run():
+        try:
+            await run_job(job_id)
+        except Exception as e:
+            print(f"Batch job {job_id} stopped: {e}")
+        finally:
+            _job_tasks.pop(job_id, None)
+            if busy_id is not None:
+                app.complete_async_task(busy_id)
+
+    _job_tasks[job_id] = asyncio.get_running_loop().create_task(_run())
+
+
+async def _submit_job_action(payload: dict) -> dict:
+    """Create a job from "data_sources" (S3 prefixes are expanded) and start it."""
+    if get_job_store is None:
+        return _jobs_unavailable()
+    sources = payload.get("data_sources") or []
+    if isinstance(sources, str):
+        sources = [sources]
+    sources = await asyncio.to_thread(expand_sources, sources)
+    if not sources:
+        return {"statusCode": 400, "body": json.dumps({"error": "No data_sources to process."})}
+    job_id = await asyncio.to_thread(
+        get_job_store().create_job,
+        sources,
+        payload.get("model_id", MODEL_ID),
+        evaluate=bool(payload.get("evaluate", True)),
+        actor_id=payload.get("actor_id"),
+    )
+    _start_job_task(job_id)
+    return {"statusCode": 202, "body": json.dumps({"job_id": job_id, "documents": len(sources)})}
+
+
+async def _resume_job_action(payload: dict) -> dict:
+    """Resume a job from its checkpoints (e.g. after a container restart)."""
+    if get_job_store is None:
+        return _jobs_unavailable()
+    job_id = payload.get("job_id")
+    store = get_job_store()
+    if not job_id or await asyncio.to_thread(store.get_job, job_id) is None:
+        return {"statusCode": 404, "body": json.dumps({"error": f"Unknown job: {job_id}"})}
+    if job_id not in _job_tasks and await asyncio.to_thread(store.runner_active, job_id):
+        # Running in another server worker or the CLI; a second runner would repeat its documents
+        return {"statusCode": 409, "body": json.dumps({"error": f"Job {job_id} is already running"})}
+    if payload.get("retry_failed"):
+        await asyncio.to_thread(store.retry_failed, job_id)
+    _start_job_task(job_id)
+    return {"statusCode": 202, "body": json.dumps(await asyncio.to_thread(store.progress, job_id))}
+
+
+_ACTIONS = {
+    "metrics": _metrics_action,
+    "cancel": _cancel_action,
+    "prewarm": _prewarm_action,
+    "warmup": _warmup_action,
+    "status": _status_action,
+    "submit_job": _submit_job_action,
+    "resume_job": _resume_job_action,
+}
+
+
+# =============================================
+# ===== Server workers ========================
+# =============================================
+# SMARTGOAL_WORKERS > 1 serves the app from that many pre-forked processes
+# (uvicorn workers on one socket), so CPU-bound extraction in one request no
+# longer holds the GIL for every other request in the container. Per-process
+# caches that matter across workers (extracted text, configuration, replayable
+# results, cancel requests) live in the shared cache.
+SERVER_WORKERS = max(1, int(os.environ.get("SMARTGOAL_WORKERS", "1")))
+SERVER_PORT = int(os.environ.get("SMARTGOAL_PORT", "8080"))
+
+
+def _serve(app_path: str = "lab_helpers.smartgoalgenerator_runtime:app"):
+    """
+    Run the server: in-process for one worker, otherwise under uvicorn's worker
+    supervisor, whose workers import app_path ("module:attribute").
+    """
+    if SERVER_WORKERS == 1:
+        app.run(port=SERVER_PORT)
+        return
+
+    import uvicorn
+
+    # Each worker imports app_path and warms up in the app's startup. Spawned
+    # workers also re-import this entry module as __mp_main__, which is why
+    # nothing costly (models, clients, caches, warm-up) is built at import.
+    host = "0.0.0.0" if os.path.exists("/.dockerenv") or os.environ.get("DOCKER_CONTAINER") else "127.0.0.1"
+    print(f"🚀 Serving with {SERVER_WORKERS} workers on {host}:{SERVER_PORT}")
+    uvicorn.run(
+        app_path,
+        host=host, port=SERVER_PORT, workers=SERVER_WORKERS,
+        access_log=False, log_level="warning",
+    )
+
+
+# =============================================
+# ===== Per-container concurrency limit =======
+# =============================================
+# The entrypoint is async, so one container interleaves many sessions while they
+# wait on Bedrock/S3/the evaluator. This caps how many run at once; the rest wait
+# by priority class (payload "priority"), so UI requests skip queued batch work.
+# The limit is per container, split evenly between the server workers.
+MAX_CONCURRENT_INVOCATIONS = -(-int(os.environ.get("SMARTGOAL_MAX_CONCURRENCY", "16")) // SERVER_WORKERS)
+_invocation_scheduler = None
+
+
+def _get_invocation_scheduler() -> PriorityScheduler:
+    global _invocation_scheduler
+    if _invocation_scheduler is None:
+        _invocation_scheduler = PriorityScheduler("invocations", MAX_CONCURRENT_INVOCATIONS)
+    return _invocation_scheduler
+
+
+# =============================================
+# ===== Idempotency / single flight ===========
+# =============================================
+# Duplicate submissions (Streamlit reruns, double-clicks) share one pipeline
+# run and, for RESULT_CACHE_TTL_S, its result. The analyzer prompt version is
+# part of derived keys so a prompt change never replays stale goals.
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:12]
+_single_flight = None
+
+
+def _get_single_flight() -> SingleFlight:
+    """The single-flight table, backed by the shared cache when results must be seen by every worker."""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight(shared=get_shared_cache() if SERVER_WORKERS > 1 else None)
+    return _single_flight
+
+
+async def _invoke_idempotent(payload: dict, priority: str, actor_id: str) -> dict:
+    """Run the pipeline once per idempotency key; duplicates wait for it or get the cached result."""
+
+    async def _run():
+        async with _get_invocation_scheduler().slot(priority, actor_id):
+            return await _invoke_pipeline(payload)
+
+    async def _compute():
+        # Runs in the single-flight task when coalescing, so a cancel stops the shared run
+        token = CancelToken(payload.get("session_id"), payload.get("model_id", MODEL_ID))
+        return await _cancellable(token, _run)
+
+    if not IDEMPOTENCY_ENABLED or payload.get("use_cache") is False or not payload.get("prompt", "").strip():
+        return await _compute()
+
+    user_input, file_path, _ = _parse_request(payload)
+    key = payload.get("idempotency_key")
+    if not key:
+        key = await asyncio.to_thread(derive_key, payload, user_input, file_path, PROMPT_VERSION)
+    if not key:
+        return await _compute()
+
+    key = str(key)
+    result, how = await _get_single_flight().run(scoped_key(actor_id, key), _compute)
+    if how != "computed":
+        print(f"♻️ Replayed result ({how}) for idempotency key {key[:12]}")
+        # This request's own upload was never processed
+        run_in_background("cleanup", _cleanup_file, file_path)
+    return with_replay_headers(result, key, how)
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    """Warm up in the served process only (not in every process that imports this module)."""
+    if WARMUP_ON_START:
+        await asyncio.to_thread(run_warmup)
+    yield
+
+
+# Initialize the AgentCore Runtime App
+app = BedrockAgentCoreApp(lifespan=_lifespan)  #### AGENTCORE RUNTIME - LINE 2 ####
+
+
+@app.entrypoint  #### AGENTCORE RUNTIME - LINE 3 ####
+async def invoke(payload, context=None):
+    """AgentCore Runtime entrypoint function"""
+    # The runtime session id keys cancellation (and stands in for a missing actor)
+    session_id = payload.get("session_id") or getattr(context, "session_id", None)
+    if session_id and not payload.get("session_id"):
+        payload = {**payload, "session_id": session_id}
+
+    _ensure_cancel_watcher()
+    action = payload.get("action")
+    if action:
+        handler = _ACTIONS.get(action)
+        if handler is None:
+            return {"statusCode": 400, "body": json.dumps({"error": f"Unknown action: {action}"})}
+        result = handler(payload)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    priority, actor_id = _request_priority(payload)
+    if priority not in PRIORITY_CLASSES:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": f"Unknown priority: {priority}. Use one of {list(PRIORITY_CLASSES)}."})
+        }
+
+    if payload.get("progressive"):
+        # Streamed as server-sent events by the AgentCore app
+        return _progressive_invoke(payload, priority, actor_id)
+
+    return await _invoke_idempotent(payload, priority, actor_id)
+
+
+if __name__ == "__main__":
+    _serve()  #### AGENTCORE RUNTIME - LINE 4 ####
@@ -0,0 +1,204 @@
+"""
+Priority scheduling for shared capacity (runtime invocation slots and the
+per-model Bedrock concurrency limits).
+
+Waiters are admitted by priority class, strictly in this order:
+
+    interactive  - a clinician waiting in the Streamlit UI
+    evaluation   - background evaluation / re-scoring
+    batch        - bulk regeneration jobs
+
+Within a class, actors (payload "actor_id") share capacity by weight using
+virtual-time fair queuing, so one actor's 500-document job cannot crowd out
+another actor in the same class. Non-interactive classes may not take the last
+RESERVED_INTERACTIVE_SLOTS free slots, so an interactive request finds room
+immediately instead of waiting for an in-flight batch call to finish.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Optional, Union
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+PRIORITY_CLASSES = ("interactive", "evaluation", "batch")
+DEFAULT_PRIORITY = "interactive"
+DEFAULT_ACTOR = "anonymous"
+RESERVED_INTERACTIVE_SLOTS = int(os.environ.get("SMARTGOAL_INTERACTIVE_RESERVE", "1"))
+WAIT_SAMPLES = 500
+
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    """"alice=2,nightly-job=0.5" -> {"alice": 2.0, "nightly-job": 0.5}"""
+    weights = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            weights[name.strip()] = float(value)
+    return weights
+
+
+ACTOR_WEIGHTS = _parse_weights(os.environ.get("SMARTGOAL_ACTOR_WEIGHTS", ""))
+
+
+def actor_weight(actor_id: str) -> float:
+    return max(ACTOR_WEIGHTS.get(actor_id, 1.0), 0.01)
+
+
+class _Waiter:
+    __slots__ = ("future", "actor_id", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, actor_id: str):
+        self.future = future
+        self.actor_id = actor_id
+        self.enqueued_at = time.monotonic()
+
+
+class _ClassQueue:
+    """Per-actor FIFOs for one priority class, served in virtual-time order."""
+
+    def __init__(self):
+        self.actors: Dict[str, Deque[_Waiter]] = {}
+        self.vtime: Dict[str, float] = {}
+        self.clock = 0.0
+        self.depth = 0
+        self.dispatched = 0
+        self.waits_ms: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def push(self, waiter: _Waiter):
+        queue = self.actors.get(waiter.actor_id)
+        if queue is None:
+            queue = self.actors[waiter.actor_id] = deque()
+            # An actor returning from idle does not get credit for the idle time
+            self.vtime[waiter.actor_id] = max(self.vtime.get(waiter.actor_id, 0.0), self.clock)
+        queue.append(waiter)
+        self.depth += 1
+
+    def pop(self) -> _Waiter:
+        actor_id = min(self.actors, key=lambda a: self.vtime[a])
+        queue = self.actors[actor_id]
+        waiter = queue.popleft()
+        if not queue:
+            del self.actors[actor_id]
+        self.clock = self.vtime[actor_id]
+        self.vtime[actor_id] += 1.0 / actor_weight(actor_id)
+        self.depth -= 1
+        return waiter
+
+    def remove(self, waiter: _Waiter):
+        queue = self.actors.get(waiter.actor_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self.depth -= 1
+            if not queue:
+                del self.actors[waiter.actor_id]
+
+    def record_wait(self, started: float):
+        self.dispatched += 1
+        self.waits_ms.append((time.monotonic() - started) * 1000)
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.waits_ms)
+        return {
+            "queue_depth": self.depth,
+            "waiting_actors": len(self.actors),
+            "dispatched": self.dispatched,
+            "wait_ms_avg": round(sum(waits) / len(waits), 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+        }
+
+
+class PriorityScheduler:
+    """
+    Admission control for `capacity` concurrent holders.
+    capacity may be an int or a callable (e.g. an adaptive limit read on every dispatch).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: Union[int, Callable[[], int]],
+        reserved_interactive: int = RESERVED_INTERACTIVE_SLOTS,
+    ):
+        self.name = name
+        self._capacity = capacity if callable(capacity) else (lambda: capacity)
+        self.reserved_interactive = reserved_interactive
+        self.in_flight = 0
+        self._classes = {p: _ClassQueue() for p in PRIORITY_CLASSES}
+
+    # ----- admission -----
+    def _free_slots_for(self, priority: str) -> int:
+        capacity = max(1, int(self._capacity()))
+        free = capacity - self.in_flight
+        if priority != "interactive":
+            # Keep headroom for interactive work, but never block a class completely
+            free -= min(self.reserved_interactive, capacity - 1)
+        return free
+
+    def _queued_ahead(self, priority: str) -> bool:
+        for p in PRIORITY_CLASSES:
+            if self._classes[p].depth:
+                return True
+            if p == priority:
+                return False
+        return False
+
+    async def acquire(self, priority: str = DEFAULT_PRIORITY, actor_id: Optional[str] = None):
+        if priority not in self._classes:
+            raise ValueError(f"Unknown priority {priority!r}; expected one of {PRIORITY_CLASSES}")
+        queue = self._classes[priority]
+        started = time.monotonic()
+
+        if not self._queued_ahead(priority) and self._free_slots_for(priority) > 0:
+            self.in_flight += 1
+            queue.record_wait(started)
+            return
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), actor_id or DEFAULT_ACTOR)
+        queue.push(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()  # granted just as we were cancelled: hand the slot on
+            else:
+                queue.remove(waiter)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self.dispatch()
+
+    def dispatch(self):
+        """Grant free slots to waiters, highest class first, fair share within a class."""
+        for priority in PRIORITY_CLASSES:
+            queue = self._classes[priority]
+            while queue.depth and self._free_slots_for(priority) > 0:
+                waiter = queue.pop()
+                if waiter.future.done():
+                    continue
+                self.in_flight += 1
+                queue.record_wait(waiter.enqueued_at)
+                waiter.future.set_result(None)
+            if queue.depth:
+                return  # lower classes wait behind this one
+
+    @asynccontextmanager
+    async def slot(self, priority: str = DEFAULT_PRIORITY, actor_id: Optional[str] = None):
+        await self.acquire(priority, actor_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    # ----- metrics -----
+    def snapshot(self) -> dict:
+        return {
+            "capacity": int(self._capacity()),
+            "in_flight": self.in_flight,
+            "classes": {p: q.snapshot() for p, q in self._classes.items()},
+        }
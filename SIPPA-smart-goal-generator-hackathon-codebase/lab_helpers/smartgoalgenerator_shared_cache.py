@@ -0,0 +1,128 @@
+"""
+Container-local cache shared by all server workers.
+
+With SMARTGOAL_WORKERS > 1 the runtime runs several processes, and in-memory
+caches would be duplicated (and miss) per worker. This is a small key/value
+store in one SQLite file (WAL, so readers never block) that every worker opens:
+extracted document text, resolved configuration, replayable results and
+cross-worker cancel requests live here. Values are JSON; every entry has a TTL,
+and each namespace can be capped to its newest entries.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+SHARED_CACHE_PATH = os.environ.get("SMARTGOAL_SHARED_CACHE", "/tmp/smartgoal_shared_cache.sqlite")
+PRUNE_EVERY = 64  # writes between namespace size checks
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace  TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_created ON entries (namespace, created_at);
+"""
+
+
+class SharedCache:
+    """SQLite key/value store with TTLs; safe to share between threads and processes."""
+
+    def __init__(self, path: str = SHARED_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._writes = 0
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0}
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction; IMMEDIATE so concurrent workers serialize."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        self.stats["hits" if row else "misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl_s: float, max_entries: Optional[int] = None):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now, now + ttl_s),
+            )
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0:
+                self._prune(conn, namespace, max_entries, now)
+        self.stats["writes"] += 1
+
+    @staticmethod
+    def _prune(conn, namespace: str, max_entries: Optional[int], now: float):
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        if max_entries:
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key NOT IN "
+                "(SELECT key FROM entries WHERE namespace = ? ORDER BY created_at DESC LIMIT ?)",
+                (namespace, namespace, max_entries),
+            )
+
+    def delete(self, namespace: str, key: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def since(self, namespace: str, created_after: float) -> List[Tuple[str, Any]]:
+        """Live (key, value) pairs of a namespace written after created_after."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM entries WHERE namespace = ? AND created_at > ? AND expires_at > ?",
+                (namespace, created_after, time.time()),
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, COUNT(*) FROM entries WHERE expires_at > ? GROUP BY namespace", (time.time(),)
+            ).fetchall()
+        return {**self.stats, "entries": dict(rows), "path": self.path}
+
+
+_cache: Optional[SharedCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """This process's connection to the shared cache (re-opened after a fork)."""
+    global _cache, _cache_pid
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = SharedCache()
+            _cache_pid = os.getpid()
+        return _cache
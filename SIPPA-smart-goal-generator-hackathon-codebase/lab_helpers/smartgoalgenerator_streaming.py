@@ -0,0 +1,216 @@
+"""
+Streaming generation that stops as soon as the SMART-goals JSON object is complete.
+
+Some models (Mistral, Cohere) keep writing after the closing brace: an
+explanation, or the same object again. That text was paid for in latency and
+output tokens and then thrown away by clean_json_str. Here the agent is
+streamed through a brace-balanced watcher and the stream is closed (which
+cancels the Bedrock response stream) the moment the top-level object that
+contains "smart_goals" closes.
+
+Tokens saved are unknowable for a stream we cut, so they are estimated per
+model from calibration runs: the first CALIBRATION_RUNS streams of each model,
+and a CALIBRATION_RATE sample afterwards, run to completion and record how much
+text followed the object.
+"""
+import json
+import os
+import random
+import re
+import threading
+from typing import Dict, Optional
+
+from lab_helpers.smartgoalgenerator_cancellation import note_streamed
+
+# ===================================
+# ============ CONSTANTS ============
+# ===================================
+EARLY_STOP_ENABLED = os.environ.get("SMARTGOAL_EARLY_STOP", "1") != "0"
+CALIBRATION_RUNS = int(os.environ.get("SMARTGOAL_EARLY_STOP_CALIBRATION_RUNS", "3"))
+CALIBRATION_RATE = float(os.environ.get("SMARTGOAL_EARLY_STOP_CALIBRATION_RATE", "0.05"))
+REQUIRED_KEY = '"smart_goals"'
+
+
+def _estimate_tokens(text_or_len) -> int:
+    n = text_or_len if isinstance(text_or_len, int) else len(text_or_len or "")
+    return (n + 3) // 4
+
+
+class JsonObjectWatcher:
+    """
+    Feed streamed text in chunks; reports the offset just past the first
+    top-level {...} that contains REQUIRED_KEY and parses as JSON. Braces
+    inside JSON strings are ignored; a stray brace in prose before the object
+    is detected when its "object" fails to parse, and scanning resumes after it.
+    """
+
+    def __init__(self, required_key: str = REQUIRED_KEY):
+        self.required_key = required_key
+        self.end: Optional[int] = None
+        self._parts = []
+        self._pos = 0             # next character to scan
+        self._start = None        # offset of the current top-level '{'
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[int]:
+        self._parts.append(chunk)
+        if self.end is not None:
+            return self.end
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            self._pos += 1
+            if self._depth == 0:
+                if ch == "{":
+                    self._start, self._depth = self._pos - 1, 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._is_goals_object(text[self._start:self._pos]):
+                        self.end = self._pos
+                        return self.end
+                    # Not the goals object (or a stray brace in prose): rescan after its '{'
+                    self._pos = self._start + 1
+                    self._in_string = self._escape = False
+        return None
+
+    def _is_goals_object(self, candidate: str) -> bool:
+        if self.required_key not in candidate:
+            return False
+        try:
+            json.loads(re.sub(r",\s*([}\]])", r"\1", candidate))
+            return True
+        except ValueError:
+            return False
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+
+class _EstimatedMetrics:
+    """Stand-in for AgentResult.metrics when the stream was cut before the result event."""
+
+    def __init__(self, output_text: str):
+        self.cycle_count = None
+        self.accumulated_usage = {"outputTokens": _estimate_tokens(output_text)}
+
+
+class StreamedResult:
+    """Outcome of a streamed generation; str() is the text the parser should see."""
+
+    def __init__(self, text: str, result=None, early_stopped: bool = False, tokens_saved: int = 0):
+        self.text = text
+        self.result = result
+        self.early_stopped = early_stopped
+        self.tokens_saved = tokens_saved
+        self.metrics = result.metrics if result is not None else _EstimatedMetrics(text)
+
+    def __str__(self):
+        return self.text
+
+
+# =====================================
+# ===== Per-model early-stop stats ====
+# =====================================
+_stats: Dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def _model_stats(model_id: str) -> dict:
+    stats = _stats.get(model_id)
+    if stats is None:
+        stats = _stats[model_id] = {
+            "streams": 0,
+            "early_stops": 0,
+            "calibration_runs": 0,
+            "avg_trailing_tokens": None,
+            "estimated_tokens_saved": 0,
+        }
+    return stats
+
+
+def _should_calibrate(model_id: str) -> bool:
+    with _stats_lock:
+        stats = _model_stats(model_id)
+        return stats["calibration_runs"] < CALIBRATION_RUNS or random.random() < CALIBRATION_RATE
+
+
+def _record(model_id: str, early_stopped: bool, trailing_chars: Optional[int]) -> int:
+    """Update the model's stats; returns the tokens this stream is estimated to have saved."""
+    with _stats_lock:
+        stats = _model_stats(model_id)
+        stats["streams"] += 1
+        if early_stopped:
+            stats["early_stops"] += 1
+            saved = max(_estimate_tokens(trailing_chars or 0), stats["avg_trailing_tokens"] or 0)
+            stats["estimated_tokens_saved"] += saved
+            return saved
+        if trailing_chars is not None:
+            stats["calibration_runs"] += 1
+            n = stats["calibration_runs"]
+            prev = stats["avg_trailing_tokens"] or 0
+            stats["avg_trailing_tokens"] = round(prev + (_estimate_tokens(trailing_chars) - prev) / n, 1)
+        return 0
+
+
+def early_stop_metrics() -> Dict[str, dict]:
+    with _stats_lock:
+        return {model_id: dict(stats) for model_id, stats in _stats.items()}
+
+
+async def stream_until_json_complete(agent, prompt: str, model_id: str, first_token=None) -> StreamedResult:
+    """
+    Stream the agent's answer and stop once the smart_goals object closes.
+    Calibration runs read the stream to the end to learn how much a model trails.
+    first_token (a hedging FirstToken) is marked when the first text arrives.
+    Received text is counted on the run's cancel token, if any.
+    """
+    calibrate = _should_calibrate(model_id)
+    watcher = JsonObjectWatcher()
+    close_at = None
+    result = None
+
+    stream = agent.stream_async(prompt)
+    try:
+        async for event in stream:
+            if "data" in event:
+                if first_token is not None:
+                    first_token.mark()
+                note_streamed(len(event["data"]))
+                close_at = watcher.feed(event["data"])
+                if close_at is not None and not calibrate:
+                    break
+            elif "result" in event:
+                result = event["result"]
+    finally:
+        await stream.aclose()  # cancels the model stream when we broke out early
+
+    text = watcher.text
+    if close_at is None:
+        _record(model_id, False, None)
+        return StreamedResult(str(result) if result is not None else text, result)
+
+    trailing = len(text) - close_at
+    if result is None:
+        saved = _record(model_id, True, trailing)
+        return StreamedResult(text[:close_at], early_stopped=True, tokens_saved=saved)
+
+    _record(model_id, False, trailing)
+    return StreamedResult(text[:close_at], result)
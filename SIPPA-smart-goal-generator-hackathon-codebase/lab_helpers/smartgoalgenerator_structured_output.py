@@ -0,0 +1,196 @@
+"""
+Getting a valid SMART-goals object out of every model.
+
+  * Tool-capable models (model_supports_tools) answer through a forced tool
+    call whose input schema is the output contract (Strands structured_output),
+    so there is nothing to parse.
+  * Other models answer in free text. If _coerce_json cannot parse it, a cheap
+    local repair pass fixes the usual damage (code fences, smart quotes,
+    trailing commas, Python literals, unquoted keys, truncated brackets). Only
+    if that fails is the model asked once to fix the JSON, with a prompt that
+    carries just the broken output, not the document or the original prompt.
+
+Per-model counters (parse failures, local repairs, fix retries, structured
+fallbacks) are kept so the rates can be watched from the "metrics" action.
+"""
+import json
+import re
+import threading
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+MAX_FIX_INPUT_CHARS = 12000
+
+
+# ==================================
+# ===== Output contract schema =====
+# ==================================
+class SmartGoal(BaseModel):
+    goal_number: int = Field(description="Starts at 1 and increments for each goal")
+    description: str = Field(description="Specific, measurable, time-bound goal text")
+
+
+class SmartGoalsOutput(BaseModel):
+    """SMART goals derived from the patient content."""
+    smart_goals: List[SmartGoal]
+
+
+class StructuredResult:
+    """Response wrapper for a structured_output call (already-parsed goals)."""
+
+    def __init__(self, parsed: dict, metrics=None):
+        self.parsed = parsed
+        self.metrics = metrics
+
+    def __str__(self):
+        return json.dumps(self.parsed, ensure_ascii=False)
+
+
+# ==================================
+# ===== Local repair ===============
+# ==================================
+_SMART_QUOTES = {"“": '"', "”": '"', "‘": "'", "’": "'"}
+
+
+def _close_truncated(s: str) -> str:
+    """Close strings and brackets left open by a truncated answer."""
+    stack, in_string, escape = [], False, False
+    for ch in s:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        s += '"'
+    s = re.sub(r",\s*$", "", s)
+    return s + "".join(reversed(stack))
+
+
+_JSON_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+
+
+def _outside_strings(s: str, fn) -> str:
+    """Apply fn to the parts of s that are not inside JSON string literals."""
+    out, last = [], 0
+    for m in _JSON_STRING.finditer(s):
+        out += [fn(s[last:m.start()]), m.group(0)]
+        last = m.end()
+    out.append(fn(s[last:]))
+    return "".join(out)
+
+
+def _repair_syntax(part: str) -> str:
+    part = re.sub(r"//[^\n]*", "", part)                                   # JS comments
+    part = re.sub(r"\bTrue\b", "true", part)
+    part = re.sub(r"\bFalse\b", "false", part)
+    part = re.sub(r"\bNone\b", "null", part)
+    part = re.sub(r"([{,]\s*)([A-Za-z_][A-Za-z0-9_]*)(\s*:)", r'\1"\2"\3', part)  # unquoted keys
+    return re.sub(r",\s*([}\]])", r"\1", part)                             # trailing commas
+
+
+def repair_json(text: str) -> Optional[dict]:
+    """Best-effort local fix of a model's JSON answer; None if it still does not parse."""
+    s = str(text).strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", s, flags=re.DOTALL)
+    if fenced:
+        s = fenced.group(1).strip()
+    for bad, good in _SMART_QUOTES.items():
+        s = s.replace(bad, good)
+    start = s.find("{")
+    if start == -1:
+        return None
+    s = s[start:]
+
+    # Trim anything after the first balanced top-level object
+    depth, in_string, escape = 0, False, False
+    for i, ch in enumerate(s):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                s = s[: i + 1]
+                break
+
+    candidates = [s]
+    if '"' not in s:
+        s = s.replace("'", '"')                                        # Python-style dict
+    s = _outside_strings(s, _repair_syntax)
+    candidates += [s, _close_truncated(s)]
+    # Truncated mid-goal: drop the partial goal and close what came before it
+    end = len(s)
+    for _ in range(20):
+        end = s.rfind("}", 0, end)
+        if end <= 0:
+            break
+        candidates.append(_close_truncated(s[: end + 1]))
+
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate, strict=False)  # tolerate raw newlines in strings
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+def fix_json_prompt(broken: str) -> str:
+    """Targeted retry prompt: only the broken output and the contract, no document."""
+    return (
+        "The text below was supposed to be a single JSON object but it is not valid JSON.\n"
+        "Return ONLY the corrected JSON object, with no prose and no code fences, in this shape:\n"
+        '{"smart_goals": [{"goal_number": 1, "description": "..."}]}\n'
+        "Keep the goals' wording unchanged.\n\n"
+        f"BROKEN OUTPUT:\n{broken[:MAX_FIX_INPUT_CHARS]}"
+    )
+
+
+# ==================================
+# ===== Per-model stats ============
+# ==================================
+_stats: Dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def record(model_id: str, event: str):
+    """
+    Events: "generation", "structured", "structured_fallback", "parse_failure",
+    "repaired_locally", "fix_retry", "fix_retry_failed".
+    """
+    with _stats_lock:
+        stats = _stats.setdefault(model_id, {})
+        stats[event] = stats.get(event, 0) + 1
+
+
+def parse_metrics() -> Dict[str, dict]:
+    with _stats_lock:
+        out = {}
+        for model_id, stats in _stats.items():
+            generations = stats.get("generation", 0) or 1
+            out[model_id] = {
+                **stats,
+                "parse_failure_rate": round(stats.get("parse_failure", 0) / generations, 3),
+                "fix_retry_rate": round(stats.get("fix_retry", 0) / generations, 3),
+                "unrecovered_rate": round(stats.get("fix_retry_failed", 0) / generations, 3),
+            }
+        return out
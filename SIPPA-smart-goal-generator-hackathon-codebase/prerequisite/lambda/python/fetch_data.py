@@ -1,10 +1,16 @@
 import os
-import io
+import time
+from typing import List, Optional, Tuple
+
 import boto3
 import requests
-import chardet
-from docx import Document
-from PyPDF2 import PdfReader
+from botocore.exceptions import BotoCoreError, ClientError
+
+try:
+    # Copied next to this file when scripts/prereq.sh packages the Lambda
+    from smartgoalgenerator_extractors import extract_text
+except ImportError:
+    from lab_helpers.smartgoalgenerator_extractors import extract_text
 
 # Globals
 s3_client = boto3.client("s3")
@@ -31,13 +37,12 @@ def _read_s3_object(s3_path: str) -> bytes:
     Read an object from S3 given s3://bucket/key
     Returns raw bytes.
     """
-    bucket, key = _parse_s3_uri(uri)
-    s3 = boto3.client("s3")
+    bucket, key = _parse_s3_uri(s3_path)
     try:
-        obj = s3.get_object(Bucket=bucket, Key=key)
+        obj = s3_client.get_object(Bucket=bucket, Key=key)
         return obj["Body"].read()
     except (BotoCoreError, ClientError) as e:
-        raise RuntimeError(f"S3 read failed for {uri}: {e}")
+        raise RuntimeError(f"S3 read failed for {s3_path}: {e}")
 
 
 def _list_s3_uris(s3_prefix: str, extensions: Optional[List[str]] = None) -> List[str]:
@@ -46,9 +51,8 @@ def _list_s3_uris(s3_prefix: str, extensions: Optional[List[str]] = None) -> Lis
     Optionally filter by extensions ['.docx', '.pdf', '.txt'] (case-insensitive).
     """
     bucket, prefix = _parse_s3_uri(s3_prefix)
-    s3 = boto3.client("s3")
     uris = []
-    paginator = s3.get_paginator("list_objects_v2")
+    paginator = s3_client.get_paginator("list_objects_v2")
     for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
         for obj in page.get("Contents", []):
             key = obj["Key"]
@@ -62,34 +66,12 @@ def _list_s3_uris(s3_prefix: str, extensions: Optional[List[str]] = None) -> Lis
     return uris
 
 
-def _ext_or_mime(uri: str, content_bytes: bytes) -> str:
-    mime, _ = mimetypes.guess_type(uri)
-    return mime or "application/octet-stream"
-
-
-def _extract_text_from_bytes(uri: str, content: bytes) -> str:    
+def _extract_text_from_bytes(uri: str, content: bytes) -> str:
     """
-    Extract text depending on file type (PDF, DOCX, TXT).
+    Extract text in whatever format the content turns out to be (PDF, DOCX, RTF,
+    HTML, CSV, FHIR JSON, text), with the runtime's extractor registry.
     """
-    mime = _ext_or_mime(uri, content)
-    luri = uri.lower()
-    if luri.endswith(".pdf") or mime == "application/pdf":
-        reader = PdfReader(io.BytesIO(content))
-        parts = []
-        for page in reader.pages:
-            try:
-                parts.append(page.extract_text() or "")
-            except Exception:
-                continue
-        return "\n".join(p.strip() for p in parts if p)
-    if luri.endswith(".docx") or mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        d = Document(io.BytesIO(content))
-        return "\n".join(p.text for p in d.paragraphs if p.text)
-    # Fallback: treat as UTF-8 text
-    try:
-        return content.decode("utf-8")
-    except UnicodeDecodeError:
-        return content.decode("latin-1", errors="ignore")
+    return extract_text(content, uri)
 
 
 # ======================
@@ -100,7 +82,7 @@ def _format_rows_as_lines(text: str) -> str:
     If the data uses '@' as a row delimiter, split onto newlines.
     Otherwise, return the text as-is (e.g., clinician notes).
     """
-    text = (raw_text or "").strip()
+    text = (text or "").strip()
     if ROW_DELIM in text:
         chunks = [c.strip() for c in text.split(ROW_DELIM) if c.strip()]
         return "\n".join(chunks)
@@ -156,7 +138,7 @@ def fetch_data(data_source: str | None = None) -> dict:
         try:
             resp = requests.get(ds, timeout=60)
             resp.raise_for_status()
-            raw = resp.text
+            raw = _extract_text_from_bytes(ds, resp.content)
         except Exception as e:
             return {
                 "error": f"HTTP error: {e}",
@@ -171,13 +153,9 @@ def fetch_data(data_source: str | None = None) -> dict:
     # Local file (only useful for local testing, not Lambda)
     if os.path.exists(ds):
         try:
-            if ds.lower().endswith((".pdf", ".docx")):
-                with open(ds, "rb") as f:
-                    content = f.read()
-                raw_text = _extract_text_from_bytes(ds, content)
-            else:
-                with open(ds, "r", encoding="utf-8") as f:
-                    raw_text = f.read()
+            with open(ds, "rb") as f:
+                content = f.read()
+            raw_text = _extract_text_from_bytes(ds, content)
         except Exception as e:
             return {
                 "error": f"File read error: {e}",
@@ -32,17 +32,22 @@ def lambda_handler(event, context):
             }
 
         try:
-            raw_text, formatted_text, meta_data = fetch_data(data_source)
+            result = fetch_data(data_source)
         except Exception as e:
             print(e)
             return {
                 "statusCode": 400,
                 "body": f"❌ {e}",
             }
+        if result.get("error"):
+            return {
+                "statusCode": 400,
+                "body": f"❌ {result['error']}",
+            }
 
         return {
             "statusCode": 200,
-            "body": {"raw_text": raw_text, "formatted_text": formatted_text, "meta_data": meta_data},
+            "body": {"raw_text": result["raw_text"], "formatted_text": result["formatted_text"], "meta_data": result["meta"]},
         }
 
 
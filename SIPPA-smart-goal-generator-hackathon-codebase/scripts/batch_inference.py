@@ -0,0 +1,107 @@
+#!/usr/bin/python
+"""
+Nightly cohort runs through Bedrock batch inference.
+
+    python -m scripts.batch_inference export --source s3://bucket/uploads/cohort-7/ --records outputs/cohort-7.jsonl
+    python -m scripts.batch_inference submit --records outputs/cohort-7.jsonl \\
+        --input-s3 s3://bucket/batch/cohort-7.jsonl --output-s3 s3://bucket/batch/out/ --role-arn arn:aws:iam::...
+    python -m scripts.batch_inference status <job_arn>
+    python -m scripts.batch_inference ingest --output s3://bucket/batch/out/<job-id>/ --manifest outputs/cohort-7.jsonl.manifest.json
+
+Offline (fake provider, no AWS calls):
+
+    python -m scripts.batch_inference local-run --records outputs/cohort-7.jsonl --ingest
+"""
+import json
+import os
+import sys
+
+import click
+
+from lab_helpers.smartgoalgenerator_batch_inference import (
+    export_batch_input,
+    get_batch_job_status,
+    ingest_batch_output,
+    load_manifest,
+    manifest_path_for,
+    run_local_batch,
+    submit_batch_job,
+)
+from scripts.fake_provider import get_fake_provider
+
+
+@click.group()
+def cli():
+    """Bedrock batch inference export/import CLI."""
+
+
+@cli.command()
+@click.option("--source", "sources", multiple=True, required=True,
+              help="S3 prefix ending with '/', S3 URI, URL or local file. Repeatable.")
+@click.option("--model-id", default="mistral.mistral-7b-instruct-v0:2", show_default=True)
+@click.option("--records", required=True, help="Local JSONL file to write.")
+def export(sources, model_id, records):
+    """Render analyzer prompts for every document into a model-invocation JSONL."""
+    try:
+        manifest = export_batch_input(list(sources), model_id, records)
+    except ValueError as e:
+        click.echo(f"❌ {e}", err=True)
+        sys.exit(1)
+    click.echo(f"✅ {len(manifest['records'])} records, manifest at {manifest_path_for(records)}")
+
+
+@cli.command()
+@click.option("--records", required=True, help="JSONL written by `export`.")
+@click.option("--input-s3", required=True, help="S3 URI to upload the records to.")
+@click.option("--output-s3", required=True, help="S3 prefix for the job output.")
+@click.option("--role-arn", default=lambda: os.environ.get("SMARTGOAL_BATCH_ROLE_ARN"),
+              help="Service role Bedrock assumes (default: $SMARTGOAL_BATCH_ROLE_ARN).")
+@click.option("--job-name", default=None)
+def submit(records, input_s3, output_s3, role_arn, job_name):
+    """Upload the records and start a batch inference job."""
+    if not role_arn:
+        click.echo("❌ --role-arn or SMARTGOAL_BATCH_ROLE_ARN is required", err=True)
+        sys.exit(1)
+    try:
+        job_arn = submit_batch_job(records, input_s3, output_s3, role_arn, job_name=job_name)
+    except Exception as e:
+        click.echo(f"❌ Failed to submit batch job: {e}", err=True)
+        sys.exit(1)
+    click.echo(job_arn)
+
+
+@cli.command()
+@click.argument("job_arn")
+def status(job_arn):
+    """Show the state of a batch inference job."""
+    click.echo(json.dumps(get_batch_job_status(job_arn), indent=2))
+
+
+@cli.command()
+@click.option("--output", required=True, help="Local .jsonl.out file or S3 output prefix of the job.")
+@click.option("--manifest", required=True, help="Manifest written by `export` (local or S3).")
+def ingest(output, manifest):
+    """Append the job's outputs to results.jsonl."""
+    stats = ingest_batch_output(output, load_manifest(manifest))
+    click.echo(json.dumps(stats))
+
+
+@cli.command("local-run")
+@click.option("--records", required=True, help="JSONL written by `export`.")
+@click.option("--output", default=None, help="Output file (default: <records>.out).")
+@click.option("--latency-ms", default=0, show_default=True, help="Fake model latency per record.")
+@click.option("--ingest", "then_ingest", is_flag=True, help="Ingest the output afterwards.")
+def local_run(records, output, latency_ms, then_ingest):
+    """Process the records with the fake provider instead of Bedrock."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_JITTER_MS"] = "0"
+    output = output or f"{records}.out"
+    count = run_local_batch(records, output, get_fake_provider().generate)
+    click.echo(f"🧪 Wrote {count} fake outputs to {output}")
+    if then_ingest:
+        stats = ingest_batch_output(output, load_manifest(manifest_path_for(records)))
+        click.echo(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,124 @@
+#!/usr/bin/python
+"""
+Durable batch SMART-goal generation and evaluation.
+
+    python -m scripts.batch_jobs create --source s3://bucket/uploads/cohort-7/ --model-id mistral.mistral-7b-instruct-v0:2
+    python -m scripts.batch_jobs run <job_id>          # also resumes after a crash
+    python -m scripts.batch_jobs status [<job_id>]
+    python -m scripts.batch_jobs retry-failed <job_id>
+    python -m scripts.batch_jobs results <job_id> --output cohort-7.json
+"""
+import asyncio
+import json
+import sys
+
+import click
+
+from lab_helpers.smartgoalgenerator_batch_jobs import (
+    JOBS_DB_PATH,
+    JobRunningError,
+    expand_sources,
+    get_job_store,
+    run_job,
+)
+
+
+def _echo_progress(progress: dict):
+    states = ", ".join(f"{k}={v}" for k, v in progress["states"].items())
+    click.echo(
+        f"{progress['job_id']}  {progress['status']:<24} {progress['percent_complete']:5.1f}%  "
+        f"{progress['documents']} docs  [{states}]  model={progress['model_id']}"
+    )
+    for err in progress["recent_errors"]:
+        click.echo(f"    ⚠️ {err['data_source']} (attempt {err['attempts']}): {err['error']}")
+
+
+@click.group()
+@click.option("--db", default=JOBS_DB_PATH, show_default=True, help="Job store (SQLite) path.")
+@click.pass_context
+def cli(ctx, db):
+    """Batch job management CLI."""
+    ctx.ensure_object(dict)
+    ctx.obj["store"] = get_job_store(db)
+
+
+@cli.command()
+@click.option("--source", "sources", multiple=True, required=True,
+              help="S3 URI, S3 prefix ending with '/', URL or local file. Repeatable.")
+@click.option("--model-id", default="mistral.mistral-7b-instruct-v0:2", show_default=True)
+@click.option("--no-evaluate", is_flag=True, help="Stop after generation.")
+@click.option("--run", "run_now", is_flag=True, help="Start running the job immediately.")
+@click.pass_context
+def create(ctx, sources, model_id, no_evaluate, run_now):
+    """Create a job from data sources."""
+    store = ctx.obj["store"]
+    data_sources = expand_sources(list(sources))
+    if not data_sources:
+        click.echo("❌ No documents found for the given sources", err=True)
+        sys.exit(1)
+    job_id = store.create_job(data_sources, model_id, evaluate=not no_evaluate)
+    click.echo(f"🆕 Created job {job_id} with {len(data_sources)} documents")
+    if run_now:
+        _echo_progress(asyncio.run(run_job(job_id, store)))
+
+
+@cli.command()
+@click.argument("job_id")
+@click.option("--concurrency", default=4, show_default=True, help="Documents processed at once.")
+@click.pass_context
+def run(ctx, job_id, concurrency):
+    """Run or resume a job from its last checkpoints."""
+    store = ctx.obj["store"]
+    if store.get_job(job_id) is None:
+        click.echo(f"❌ Unknown job: {job_id}", err=True)
+        sys.exit(1)
+    try:
+        _echo_progress(asyncio.run(run_job(job_id, store, concurrency=concurrency)))
+    except JobRunningError as e:
+        click.echo(f"❌ {e} (retry once its runner has stopped)", err=True)
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument("job_id", required=False)
+@click.pass_context
+def status(ctx, job_id):
+    """Show progress of one job, or of the most recent jobs."""
+    store = ctx.obj["store"]
+    if job_id:
+        progress = store.progress(job_id)
+        if progress is None:
+            click.echo(f"❌ Unknown job: {job_id}", err=True)
+            sys.exit(1)
+        _echo_progress(progress)
+        return
+    for progress in store.list_jobs():
+        _echo_progress(progress)
+
+
+@cli.command("retry-failed")
+@click.argument("job_id")
+@click.pass_context
+def retry_failed(ctx, job_id):
+    """Requeue failed documents at their last checkpoint (then use `run`)."""
+    click.echo(f"🔁 Requeued {ctx.obj['store'].retry_failed(job_id)} failed documents")
+
+
+@cli.command()
+@click.argument("job_id")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write results to this JSON file.")
+@click.pass_context
+def results(ctx, job_id, output):
+    """Print or save the per-document outputs of a job."""
+    rows = ctx.obj["store"].results(job_id)
+    text = json.dumps(rows, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+        click.echo(f"💾 Wrote {len(rows)} results to {output}")
+    else:
+        click.echo(text)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+"""
+Work done for abandoned requests with and without cancellation, using the
+local Bedrock stand-in. Every client gives up after --abandon-after-ms: it
+either just walks away, sends the "cancel" action for its session, or (SSE)
+disconnects from the progressive stream. No AWS calls.
+
+    python -m scripts.bench_cancellation --sessions 20 --abandon-after-ms 400
+"""
+import asyncio
+import json
+import os
+import time
+
+import click
+
+
+@click.command()
+@click.option("--sessions", default=20, show_default=True, help="Abandoned requests per mode.")
+@click.option("--abandon-after-ms", default=400, show_default=True, help="When the client gives up.")
+@click.option("--latency-ms", default=1500, show_default=True, help="Fake model latency.")
+def main(sessions, abandon_after_ms, latency_ms):
+    """Compare model output streamed and evaluator calls made per mode."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_JITTER_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_TRAILING_CHARS"] = "0"
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    provider = install()
+    abandon_s = abandon_after_ms / 1000
+
+    def _payload(mode: str, i: int, **extra) -> dict:
+        return {
+            "prompt": f"Patient {i}: A1c 8.9, sedentary, drinks soda daily.",
+            "session_id": f"{mode}-{i}",
+            "priority": "interactive",
+            **extra,
+        }
+
+    async def walk_away(i):
+        # Nobody reads the answer, but the runtime cannot know that
+        return await runtime.invoke(_payload("walk-away", i))
+
+    async def cancel_action(i):
+        task = asyncio.ensure_future(runtime.invoke(_payload("cancel", i)))
+        await asyncio.sleep(abandon_s)
+        await runtime.invoke({"action": "cancel", "session_id": f"cancel-{i}"})
+        return await task
+
+    async def disconnect(i):
+        stream = await runtime.invoke(_payload("disconnect", i, progressive=True, draft_model_id="fake-draft"))
+
+        async def read():
+            async for _ in stream:
+                pass
+
+        try:
+            await asyncio.wait_for(read(), abandon_s)
+        except asyncio.TimeoutError:
+            pass  # wait_for closed the stream, like a dropped SSE connection
+        await stream.aclose()
+        await asyncio.sleep(0.05)  # let the cancelled runs unwind
+
+    for name, job in (("walk away", walk_away), ("cancel action", cancel_action), ("sse disconnect", disconnect)):
+        streamed, evaluations = provider.stats["streamed_chars"], provider.stats["evaluations"]
+        started = time.perf_counter()
+
+        async def run():
+            return await asyncio.gather(*(job(i) for i in range(sessions)))
+
+        asyncio.run(run())
+        click.echo(
+            f"{name:>15}: streamed {provider.stats['streamed_chars'] - streamed:6d} chars, "
+            f"evaluator calls {provider.stats['evaluations'] - evaluations:3d}, "
+            f"wall {time.perf_counter() - started:.1f}s"
+        )
+
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])
+    click.echo(json.dumps(metrics["cancellation"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+"""
+DOCX text extraction: python-docx (Document(...).paragraphs, the previous
+implementation) versus the streaming word/document.xml parser. Builds a large
+clinical-style document (visit notes plus lab and medication tables) and runs
+each extractor in a fresh interpreter to compare time, peak RSS and how many of
+the table values make it into the text. Needs python-docx installed.
+
+    python -m scripts.bench_docx_extraction --visits 2000 --runs 3
+"""
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+LABS = (("A1c", "%"), ("Glucose", "mg/dL"), ("LDL", "mg/dL"), ("Creatinine", "mg/dL"), ("BP systolic", "mmHg"))
+
+
+def _build_document(visits: int) -> bytes:
+    from docx import Document
+
+    d = Document()
+    for v in range(visits):
+        d.add_paragraph(f"Visit {v}: patient reports fatigue, sedentary lifestyle, two sodas a day.")
+        d.add_paragraph("Plan: follow up in 3 months; dietary counselling; walking program.")
+        labs = d.add_table(rows=len(LABS) + 1, cols=3)
+        for c, header in enumerate(("Lab", "Value", "Unit")):
+            labs.cell(0, c).text = header
+        for r, (name, unit) in enumerate(LABS, start=1):
+            labs.cell(r, 0).text = name
+            labs.cell(r, 1).text = f"{v}.{r}"
+            labs.cell(r, 2).text = unit
+        meds = d.add_table(rows=2, cols=2)
+        meds.cell(0, 0).text, meds.cell(0, 1).text = "Metformin", "500 mg twice daily"
+        meds.cell(1, 0).text, meds.cell(1, 1).text = "Lisinopril", "10 mg daily"
+    buf = io.BytesIO()
+    d.save(buf)
+    return buf.getvalue()
+
+
+def _extract_python_docx(content: bytes) -> str:
+    from docx import Document
+
+    d = Document(io.BytesIO(content))
+    return "\n".join(p.text for p in d.paragraphs if p.text)
+
+
+def _extract_streaming(content: bytes) -> str:
+    from lab_helpers.smartgoalgenerator_extractors import iter_docx_blocks
+
+    return "\n".join(iter_docx_blocks(content))
+
+
+EXTRACTORS = {"python-docx": _extract_python_docx, "streaming": _extract_streaming}
+
+
+def _peak_rss_kb() -> int:
+    """This process's peak RSS. VmHWM (Linux) starts fresh at exec, unlike ru_maxrss,
+    which keeps the high-water mark of the parent process at fork time."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _child(extractor: str, path: str, visits: int):
+    """Run one extractor in this (fresh) process and print its measurements as JSON."""
+    with open(path, "rb") as f:
+        content = f.read()
+    fn = EXTRACTORS[extractor]
+    # Import the parser before measuring
+    __import__("docx" if extractor == "python-docx" else "lab_helpers.smartgoalgenerator_extractors")
+    rss_before = _peak_rss_kb()
+    started = time.perf_counter()
+    text = fn(content)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    rss_peak = _peak_rss_kb()
+    found = sum(1 for v in range(visits) for r in range(1, len(LABS) + 1) if f"{v}.{r} |" in text)
+    print(json.dumps({
+        "ms": elapsed_ms,
+        "peak_rss_mb": rss_peak / 1024,
+        "rss_growth_mb": (rss_peak - rss_before) / 1024,
+        "chars": len(text),
+        "lab_values_found": found,
+    }))
+
+
+@click.command()
+@click.option("--visits", default=2000, show_default=True, help="Visit sections in the generated document.")
+@click.option("--runs", default=3, show_default=True, help="Fresh interpreters per extractor.")
+@click.option("--child", type=click.Choice(sorted(EXTRACTORS)), hidden=True)
+@click.option("--path", hidden=True)
+def main(visits, runs, child, path):
+    """Print median time, peak RSS and table coverage per extractor."""
+    if child:
+        _child(child, path, visits)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "clinical.docx")
+        with open(path, "wb") as f:
+            f.write(_build_document(visits))
+        click.echo(f"{os.path.getsize(path) / 1024:.0f} KiB document, {visits * len(LABS)} lab values in tables")
+
+        for extractor in EXTRACTORS:
+            samples = []
+            for _ in range(runs):
+                proc = subprocess.run(
+                    [sys.executable, "-m", "scripts.bench_docx_extraction", "--visits", str(visits),
+                     "--child", extractor, "--path", path],
+                    capture_output=True, text=True, check=True,
+                )
+                samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            click.echo(
+                f"{extractor:>12}: {statistics.median(s['ms'] for s in samples):7.0f} ms  "
+                f"peak RSS {statistics.median(s['peak_rss_mb'] for s in samples):6.1f} MB "
+                f"(+{statistics.median(s['rss_growth_mb'] for s in samples):6.1f} MB)  "
+                f"{samples[0]['chars']} chars, lab values {samples[0]['lab_values_found']}/{visits * len(LABS)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+"""
+Latency and output tokens with and without early stop, using the local Bedrock
+stand-in configured to keep talking after the SMART-goals object (as Mistral
+and Cohere do). No AWS calls.
+
+    python -m scripts.bench_early_stop --sessions 20 --trailing-chars 2000
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import click
+
+
+@click.command()
+@click.option("--sessions", default=20, show_default=True, help="Sequential invocations per mode.")
+@click.option("--latency-ms", default=600, show_default=True, help="Fake time to emit the goals object.")
+@click.option("--trailing-chars", default=2000, show_default=True, help="Text emitted after the object.")
+def main(sessions, latency_ms, trailing_chars):
+    """Compare full generation with early stop."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_JITTER_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_TRAILING_CHARS"] = str(trailing_chars)
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    install()
+
+    async def run(early_stop: bool):
+        latencies, tokens, goals = [], [], []
+        for i in range(sessions):
+            started = time.perf_counter()
+            response = await runtime.invoke({
+                "prompt": f"Patient {i}: A1c 8.9, sedentary, drinks soda daily.",
+                "early_stop": early_stop,
+            })
+            latencies.append((time.perf_counter() - started) * 1000)
+            body = json.loads(response["body"])
+            tokens.append(body["metadata"]["generation"]["output_tokens"] or 0)
+            goals.append(len(body["model_output"]["smart_goals"]))
+        return latencies, tokens, goals
+
+    for name, early_stop in (("full", False), ("early-stop", True)):
+        latencies, tokens, goals = asyncio.run(run(early_stop))
+        click.echo(
+            f"{name:>10}: p50 {statistics.median(latencies):7.0f} ms  "
+            f"output tokens/run {statistics.mean(tokens):7.0f}  goals/run {statistics.mean(goals):.1f}"
+        )
+
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])
+    click.echo(json.dumps(metrics["early_stop"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
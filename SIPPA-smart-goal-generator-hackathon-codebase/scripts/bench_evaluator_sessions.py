@@ -0,0 +1,70 @@
+#!/usr/bin/python
+"""
+Evaluator latency with session-less calls, sticky sessions, and sticky
+sessions pre-warmed at login, using the local Bedrock stand-in with a
+simulated evaluator cold start. No AWS calls.
+
+    python -m scripts.bench_evaluator_sessions --users 10 --evaluations 3 --cold-ms 4000
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import click
+
+
+@click.command()
+@click.option("--users", default=10, show_default=True, help="Concurrent user sessions.")
+@click.option("--evaluations", default=3, show_default=True, help="Documents per user, one after another.")
+@click.option("--cold-ms", default=4000, show_default=True, help="Evaluator cold-start penalty.")
+@click.option("--login-lead-ms", default=5000, show_default=True, help="Time between login (pre-warm) and first upload.")
+def main(users, evaluations, cold_ms, login_lead_ms):
+    """Print p50 evaluate-stage latency, and the first evaluation's, per mode."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = "200"
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = "1500"
+    os.environ["SMARTGOAL_FAKE_EVAL_COLD_MS"] = str(cold_ms)
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    install()
+
+    async def user(mode: str, u: int):
+        session_id = f"{mode}-user-{u}"
+        if mode == "sticky+prewarm":
+            await runtime.invoke({"action": "prewarm", "session_id": session_id})
+            await asyncio.sleep(login_lead_ms / 1000)
+        latencies = []
+        for doc in range(evaluations):
+            response = await runtime.invoke({
+                "prompt": f"Patient {u}-{doc}: A1c 8.9, sedentary, drinks soda daily.",
+                "session_id": session_id,
+            })
+            body = json.loads(response["body"])
+            latencies.append(body["metadata"]["stage_timings_ms"]["evaluate"])
+        return latencies
+
+    for mode in ("session-less", "sticky", "sticky+prewarm"):
+        runtime.EVALUATOR_STICKY_SESSIONS = mode != "session-less"
+
+        async def run():
+            return await asyncio.gather(*(user(mode, u) for u in range(users)))
+
+        started = time.perf_counter()
+        per_user = asyncio.run(run())
+        everything = [ms for latencies in per_user for ms in latencies]
+        first = [latencies[0] for latencies in per_user]
+        click.echo(
+            f"{mode:>15}: evaluate p50 {statistics.median(everything):6.0f} ms, "
+            f"first evaluation p50 {statistics.median(first):6.0f} ms, wall {time.perf_counter() - started:.1f}s"
+        )
+
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])
+    click.echo(json.dumps(metrics["evaluator"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
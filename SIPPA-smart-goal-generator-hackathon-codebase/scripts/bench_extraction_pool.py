@@ -0,0 +1,80 @@
+#!/usr/bin/python
+"""
+Event-loop stalls while large PDFs are parsed, inline versus in the extraction
+process pool. A heartbeat task ticks every 10 ms on the runtime's loop (as the
+other sessions' coroutines would) while --uploads PDFs go through
+fetch_data_async at once. No AWS calls; needs PyPDF2 installed.
+
+    python -m scripts.bench_extraction_pool --uploads 8 --pages 60
+"""
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import click
+
+from scripts.bench_workers import _pdf_bytes
+
+TICK_S = 0.01
+
+
+@click.command()
+@click.option("--uploads", default=8, show_default=True, help="PDFs parsed concurrently per mode.")
+@click.option("--pages", default=60, show_default=True, help="Pages in the synthetic PDF.")
+def main(uploads, pages):
+    """Print heartbeat lag and wall time with the pool off and on."""
+    os.environ["SMARTGOAL_EXTRACTION_CACHE"] = "0"  # every upload must be parsed
+
+    from lab_helpers.smartgoalgenerator_mcp_tools import fetch_data_async, get_extraction_pool
+
+    pool = get_extraction_pool()
+    pool_size = pool.size
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "summary.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(_pdf_bytes(pages, 60))
+        click.echo(f"{os.path.getsize(pdf_path)} byte PDF, pool size {pool_size}")
+
+        for mode in ("inline", "pool"):
+            pool.size = 0 if mode == "inline" else pool_size
+            pool.min_bytes = 0
+            if mode == "pool":
+                pool.prestart()
+            paths = []
+            for i in range(uploads):
+                paths.append(os.path.join(tmp, f"{mode}_{i}.pdf"))
+                shutil.copyfile(pdf_path, paths[-1])
+
+            async def run():
+                lags, done = [], asyncio.Event()
+
+                async def heartbeat():
+                    while not done.is_set():
+                        expected = time.perf_counter() + TICK_S
+                        await asyncio.sleep(TICK_S)
+                        lags.append((time.perf_counter() - expected) * 1000)
+
+                ticker = asyncio.create_task(heartbeat())
+                results = await asyncio.gather(*(fetch_data_async(p) for p in paths))
+                done.set()
+                await ticker
+                return lags, results
+
+            started = time.perf_counter()
+            lags, results = asyncio.run(run())
+            wall = time.perf_counter() - started
+            errors = sum(1 for r in results if r.get("error"))
+            lags.sort()
+            click.echo(
+                f"{mode:>6}: heartbeat lag p50 {statistics.median(lags):6.1f} ms  "
+                f"p99 {lags[int(len(lags) * 0.99)]:6.1f} ms  max {lags[-1]:6.1f} ms  "
+                f"wall {wall:.2f}s  errors {errors}"
+            )
+    click.echo(pool.snapshot())
+
+
+if __name__ == "__main__":
+    main()
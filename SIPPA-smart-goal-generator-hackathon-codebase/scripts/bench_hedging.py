@@ -0,0 +1,75 @@
+#!/usr/bin/python
+"""
+p50/p99 latency with and without hedged model calls, using the local Bedrock
+stand-in with injected tail-latency spikes. No AWS calls.
+
+    python -m scripts.bench_hedging --sessions 300 --tail-rate 0.05 --tail-ms 10000
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import click
+
+
+def _p(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+@click.command()
+@click.option("--sessions", default=300, show_default=True, help="Invocations per mode.")
+@click.option("--concurrency", default=20, show_default=True, help="Sessions in flight at once.")
+@click.option("--latency-ms", default=300, show_default=True, help="Fake model latency.")
+@click.option("--tail-rate", default=0.05, show_default=True, help="Share of calls with a slow start.")
+@click.option("--tail-ms", default=10000, show_default=True, help="Length of a slow start.")
+def main(sessions, concurrency, latency_ms, tail_rate, tail_ms):
+    """Compare unhedged calls with calls hedged to a second region."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_JITTER_MS"] = str(latency_ms // 5)
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_TAIL_RATE"] = str(tail_rate)
+    os.environ["SMARTGOAL_FAKE_TAIL_MS"] = str(tail_ms)
+    os.environ["SMARTGOAL_MAX_CONCURRENCY"] = str(concurrency)
+    os.environ["SMARTGOAL_LIMIT_INITIAL"] = str(concurrency)
+    os.environ.setdefault("SMARTGOAL_HEDGE_MIN_SAMPLES", "20")
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_hedging as hedging
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    install()
+
+    async def run():
+        gate = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(i):
+            async with gate:
+                started = time.perf_counter()
+                response = await runtime.invoke({
+                    "prompt": f"Patient {i}: A1c 8.9, sedentary, drinks soda daily.",
+                    "priority": "interactive",
+                })
+                assert response["statusCode"] == 200, response
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*(one(i) for i in range(sessions)))
+        return sorted(latencies)
+
+    for name, region in (("unhedged", ""), ("hedged", "us-west-2")):
+        hedging.HEDGE_REGION = region
+        latencies = asyncio.run(run())
+        click.echo(
+            f"{name:>9}: p50 {statistics.median(latencies):6.0f} ms  "
+            f"p95 {_p(latencies, 95):6.0f} ms  p99 {_p(latencies, 99):6.0f} ms"
+        )
+
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])
+    click.echo(json.dumps(metrics["hedging"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
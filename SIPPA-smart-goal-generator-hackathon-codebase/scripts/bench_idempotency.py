@@ -0,0 +1,71 @@
+#!/usr/bin/python
+"""
+Duplicate submissions (double-clicks, Streamlit reruns) with and without
+idempotency, using the local Bedrock stand-in. Every submission uploads the
+same document to a new path, like the Streamlit page does. No AWS calls.
+
+    python -m scripts.bench_idempotency --documents 10 --duplicates 3
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import click
+
+
+@click.command()
+@click.option("--documents", default=10, show_default=True, help="Distinct documents.")
+@click.option("--duplicates", default=3, show_default=True, help="Submissions per document (1 first, rest near-simultaneous).")
+@click.option("--latency-ms", default=800, show_default=True, help="Fake model latency.")
+def main(documents, duplicates, latency_ms):
+    """Count model calls and evaluator runs per mode."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = str(latency_ms)
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    provider = install(idempotency=True)
+
+    async def run(tmp: str, use_cache: bool, tag: str):
+        async def submit(doc: int, copy: int, delay_s: float):
+            await asyncio.sleep(delay_s)
+            path = os.path.join(tmp, f"{tag}_{doc}_{copy}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"Patient {doc}: A1c 8.9@Sedentary@Drinks two sodas a day@")
+            response = await runtime.invoke({
+                "prompt": f"Generate SMART goals. [UPLOADED_FILE: {path}]",
+                "actor_id": "clinician",
+                "use_cache": use_cache,
+            })
+            return response["statusCode"], (response.get("headers") or {}).get("Idempotent-Replayed")
+
+        # The last copy arrives after the first has finished (cache), the others while it runs (coalesce)
+        jobs = [
+            submit(doc, copy, 0.05 * copy if copy < duplicates - 1 else 3 * latency_ms / 1000)
+            for doc in range(documents) for copy in range(duplicates)
+        ]
+        return await asyncio.gather(*jobs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, use_cache in (("no-idempotency", False), ("idempotent", True)):
+            calls, evaluations = provider.stats["calls"], provider.stats["evaluations"]
+            started = time.perf_counter()
+            results = asyncio.run(run(tmp, use_cache, name))
+            elapsed = time.perf_counter() - started
+            replayed = sum(1 for _, how in results if how)
+            click.echo(
+                f"{name:>15}: {len(results)} submissions, model calls {provider.stats['calls'] - calls:3d}, "
+                f"evaluations {provider.stats['evaluations'] - evaluations:3d}, replayed {replayed:3d}, "
+                f"wall {elapsed:.1f}s"
+            )
+
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])
+    click.echo(json.dumps(metrics["idempotency"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+"""
+Import time of the runtime modules, measured with `python -X importtime` in a
+fresh interpreter per run, with a budget check for CI: exits 1 when the
+median import of any module is over --budget-ms.
+
+    python -m scripts.bench_import_time --runs 5 --budget-ms 2500 --top 15
+"""
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+import click
+
+DEFAULT_MODULES = (
+    "lab_helpers.smartgoalgenerator_runtime",
+    "lab_helpers.smartgoalgenerator_mcp_tools",
+    "lab_helpers.smartgoalgenerator_model_util",
+)
+# import time: self [us] | cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _import_once(module: str) -> dict:
+    """{package: cumulative us} for one cold import of module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-5:])
+        raise click.ClickException(f"import {module} failed:\n{tail}")
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            # First (outermost) entry wins for packages imported more than once
+            cumulative.setdefault(match.group(4), int(match.group(2)))
+    return cumulative
+
+
+@click.command()
+@click.option("--module", "modules", multiple=True, help="Module to import (repeatable).")
+@click.option("--runs", default=5, show_default=True, help="Fresh interpreters per module.")
+@click.option("--budget-ms", default=float(os.environ.get("SMARTGOAL_IMPORT_BUDGET_MS", "2500")),
+              show_default=True, help="Median import budget per module (SMARTGOAL_IMPORT_BUDGET_MS).")
+@click.option("--top", default=10, show_default=True, help="Slowest dependencies to list per module.")
+def main(modules, runs, budget_ms, top):
+    """Print median import time and the heaviest dependencies; fail over budget."""
+    over_budget = []
+    for module in modules or DEFAULT_MODULES:
+        samples = [_import_once(module) for _ in range(runs)]
+        median_ms = statistics.median(s.get(module, 0) for s in samples) / 1000
+        status = "ok" if median_ms <= budget_ms else "OVER BUDGET"
+        click.echo(f"{module}: {median_ms:7.1f} ms (budget {budget_ms:.0f} ms) {status}")
+
+        heaviest = sorted(
+            ((statistics.median(s.get(pkg, 0) for s in samples) / 1000, pkg)
+             for pkg in samples[0] if pkg != module and "." not in pkg),
+            reverse=True,
+        )
+        for ms, pkg in heaviest[:top]:
+            click.echo(f"    {ms:7.1f} ms  {pkg}")
+        if median_ms > budget_ms:
+            over_budget.append(module)
+
+    if over_budget:
+        click.echo(f"❌ Import time over budget: {', '.join(over_budget)}", err=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+"""
+Benchmark "latest N analyzer runs" on results.jsonl files of increasing size:
+full read + sort (the original load path) vs. the reverse mmap tail reader.
+
+    python -m scripts.bench_jsonl_tail --lines 10000 --lines 1000000 --limit 50
+"""
+import json
+import os
+import tempfile
+import time
+
+import click
+
+from lab_helpers.smartgoalgenerator_mcp_tools import _read_jsonl, _tail_jsonl
+
+
+def _write_results(path: str, lines: int):
+    base = time.mktime(time.strptime("2025-01-01", "%Y-%m-%d"))
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(json.dumps({
+                "model_id": "mistral.mistral-7b-instruct-v0:2",
+                "data_source": f"s3://bucket/uploads/patient{i % 500}.docx",
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(base + i)),
+                "smart_goals": [
+                    {"goal_number": 1, "description": "Walk 30 minutes five days a week for the next 4 weeks."},
+                    {"goal_number": 2, "description": "Check fasting glucose every morning and log it for 2 weeks."},
+                ],
+            }) + "\n")
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+@click.command()
+@click.option("--lines", multiple=True, type=int, default=[10_000, 1_000_000], show_default=True)
+@click.option("--limit", default=50, show_default=True)
+@click.option("--repeat", default=3, show_default=True)
+def main(lines, limit, repeat):
+    """Time full-read vs tail-read of the newest LIMIT records."""
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in lines:
+            path = os.path.join(tmp, f"results_{n}.jsonl")
+            _write_results(path, n)
+            size_mb = os.path.getsize(path) / 1e6
+
+            def full():
+                runs = _read_jsonl(path)
+                runs.sort(key=lambda r: r.get("timestamp", ""))
+                return runs[-limit:]
+
+            def tail():
+                return _tail_jsonl(path, limit)
+
+            assert full() == tail(), "tail reader disagrees with full read"
+            full_ms = _best_of(full, repeat)
+            tail_ms = _best_of(tail, repeat)
+            click.echo(
+                f"{n:>10,} lines ({size_mb:7.1f} MB)  full read+sort: {full_ms:9.1f} ms  "
+                f"tail: {tail_ms:7.2f} ms  speedup: {full_ms / tail_ms:8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+"""
+End-to-end failures caused by malformed model JSON, with and without
+structured output / repair, using the local Bedrock stand-in (no AWS calls).
+
+The fake model breaks MALFORMED_RATE of its free-text answers (code fences with
+trailing commas, truncation, or unquoted keys/values). A tool-capable model and
+a free-text model are each invoked SESSIONS times on an uploaded document.
+
+    python -m scripts.bench_output_parsing --sessions 50 --malformed-rate 0.3
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+import click
+
+TOOL_MODEL = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+TEXT_MODEL = "mistral.mistral-7b-instruct-v0:2"
+
+
+@click.command()
+@click.option("--sessions", default=50, show_default=True, help="Invocations per model and mode.")
+@click.option("--malformed-rate", default=0.3, show_default=True, help="Share of broken free-text answers.")
+def main(sessions, malformed_rate):
+    """Count 500s per model with the legacy parser vs structured output + repair."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = "20"
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_MALFORMED_RATE"] = str(malformed_rate)
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    install()
+
+    async def run(model_id: str, tmp: str):
+        failures = 0
+        for i in range(sessions):
+            path = os.path.join(tmp, f"patient_{i}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("A1c 8.9@Sedentary@Drinks two sodas a day@")
+            response = await runtime.invoke({
+                "prompt": f"Generate SMART goals. [UPLOADED_FILE: {path}]",
+                "model_id": model_id,
+            })
+            failures += response["statusCode"] != 200
+        return failures
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, enabled in (("legacy", False), ("structured+repair", True)):
+            runtime.STRUCTURED_OUTPUT_ENABLED = enabled
+            for model_id in (TOOL_MODEL, TEXT_MODEL):
+                failures = asyncio.run(run(model_id, tmp))
+                click.echo(f"{mode:>18}  {model_id:<45} failed {failures:3d}/{sessions}")
+
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])
+    click.echo(json.dumps(metrics["output_parsing"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
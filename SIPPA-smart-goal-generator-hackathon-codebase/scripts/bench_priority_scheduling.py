@@ -0,0 +1,80 @@
+#!/usr/bin/python
+"""
+Interactive latency while a bulk job saturates the container, using the local
+Bedrock stand-in (no AWS calls).
+
+A nightly job submits BATCH documents at once; while it runs, a clinician
+submits INTERACTIVE requests one after another. Three runs:
+
+  fifo       : one class and one actor for everything (plain FIFO)
+  fair-share : one class, but the job and the clinician are separate actors
+  priority   : the job tagged "batch", the clinician "interactive"
+
+    python -m scripts.bench_priority_scheduling --batch 200 --interactive 10
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import click
+
+
+@click.command()
+@click.option("--batch", default=200, show_default=True, help="Documents in the bulk job.")
+@click.option("--interactive", default=10, show_default=True, help="Sequential clinician requests.")
+@click.option("--latency-ms", default=300, show_default=True, help="Fake model latency.")
+@click.option("--max-concurrency", default=8, show_default=True, help="Per-container limit.")
+def main(batch, interactive, latency_ms, max_concurrency):
+    """Compare clinician latency with and without priority classes."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = "0"
+    os.environ["SMARTGOAL_MAX_CONCURRENCY"] = str(max_concurrency)
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    install()
+
+    async def scenario(batch_priority: str, batch_actor: str):
+        job = [
+            runtime.invoke({
+                "prompt": f"Patient {i}: A1c 8.9, sedentary.",
+                "priority": batch_priority,
+                "actor_id": batch_actor,
+            })
+            for i in range(batch)
+        ]
+        job_task = asyncio.gather(*job)
+        await asyncio.sleep(latency_ms / 1000)  # let the job fill the queue
+
+        latencies = []
+        for i in range(interactive):
+            started = time.perf_counter()
+            await runtime.invoke({"prompt": f"Clinician request {i}", "priority": "interactive", "actor_id": "clinician"})
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        job_started = time.perf_counter()
+        await job_task
+        return latencies, time.perf_counter() - job_started
+
+    scenarios = (
+        ("fifo", "interactive", "clinician"),
+        ("fair-share", "interactive", "nightly-regeneration"),
+        ("priority", "batch", "nightly-regeneration"),
+    )
+    for name, batch_priority, batch_actor in scenarios:
+        latencies, job_tail_s = asyncio.run(scenario(batch_priority, batch_actor))
+        click.echo(
+            f"{name:>10}: clinician p50 {statistics.median(latencies):8.0f} ms  "
+            f"max {max(latencies):8.0f} ms  (job finished {job_tail_s:5.1f} s after the last click)"
+        )
+
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])
+    click.echo(json.dumps(metrics["invocations"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+"""
+Time to first goals with and without progressive mode, using the local Bedrock
+stand-in with a slow selected model and a fast draft model. No AWS calls.
+
+    python -m scripts.bench_progressive --sessions 10 --draft-ms 500 --final-ms 4000
+"""
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import click
+
+FINAL_MODEL = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+DRAFT_MODEL = "mistral.mistral-7b-instruct-v0:2"
+
+
+@click.command()
+@click.option("--sessions", default=10, show_default=True, help="Sequential invocations per mode.")
+@click.option("--draft-ms", default=500, show_default=True, help="Fake latency of the draft model.")
+@click.option("--final-ms", default=4000, show_default=True, help="Fake latency of the selected model.")
+def main(sessions, draft_ms, final_ms):
+    """Compare single-model invocations with draft + refine."""
+    os.environ["SMARTGOAL_FAKE_JITTER_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_MODEL_LATENCY_MS"] = f"mistral={draft_ms},anthropic={final_ms}"
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    install()
+
+    def _payload(i: int, progressive: bool) -> dict:
+        return {
+            "prompt": f"Patient {i}: A1c 8.9, sedentary, drinks soda daily.",
+            "model_id": FINAL_MODEL,
+            "draft_model_id": DRAFT_MODEL,
+            "progressive": progressive,
+        }
+
+    async def run(progressive: bool):
+        first, final = [], []
+        for i in range(sessions):
+            started = time.perf_counter()
+            result = await runtime.invoke(_payload(i, progressive))
+            if not progressive:
+                assert result["statusCode"] == 200, result
+                first.append((time.perf_counter() - started) * 1000)
+                final.append(first[-1])
+                continue
+            async for event in result:
+                assert event["response"]["statusCode"] == 200, event
+                elapsed = (time.perf_counter() - started) * 1000
+                if len(first) == len(final):
+                    first.append(elapsed)
+                if event["event"] == "final":
+                    final.append(elapsed)
+        return first, final
+
+    for name, progressive in (("single", False), ("progressive", True)):
+        first, final = asyncio.run(run(progressive))
+        click.echo(
+            f"{name:>11}: first goals p50 {statistics.median(first):6.0f} ms  "
+            f"final goals p50 {statistics.median(final):6.0f} ms"
+        )
+
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])
+    click.echo(json.dumps(metrics["progressive"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+"""
+Routing decisions and latency of model_id "auto" for short and long documents,
+with and without budgets, using the local Bedrock stand-in. No AWS calls.
+
+    python -m scripts.bench_routing --latency-budget-ms 4000 --cost-budget-usd 0.002
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import click
+
+SIZES = {"short": 2_000, "long": 150_000}
+
+
+@click.command()
+@click.option("--latency-budget-ms", default=4000.0, show_default=True)
+@click.option("--cost-budget-usd", default=0.002, show_default=True)
+def main(latency_budget_ms, cost_budget_usd):
+    """Print the routed model, reason and latency per document size and budget."""
+    os.environ["SMARTGOAL_FAKE_JITTER_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_MODEL_LATENCY_MS"] = "mistral=300,gpt-oss=500,cohere=500,nova=800,anthropic=900"
+    os.environ["SMARTGOAL_PREFETCH_MAX_CHARS"] = str(max(SIZES.values()))
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    install()
+
+    budgets = {
+        "none": {},
+        "latency": {"latency_budget_ms": latency_budget_ms},
+        "cost": {"cost_budget_usd": cost_budget_usd},
+    }
+
+    async def run(path: str, extra: dict):
+        started = time.perf_counter()
+        response = await runtime.invoke({
+            "prompt": f"Generate SMART goals. [UPLOADED_FILE: {path}]",
+            "model_id": "auto",
+            **extra,
+        })
+        elapsed = (time.perf_counter() - started) * 1000
+        body = json.loads(response["body"])
+        return elapsed, body["metadata"]["routing"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_name, chars in SIZES.items():
+            for budget_name, extra in budgets.items():
+                path = os.path.join(tmp, f"{size_name}_{budget_name}.txt")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(("Patient reports A1c 8.9, sedentary lifestyle, two sodas a day. " * chars)[:chars])
+                elapsed, routing = asyncio.run(run(path, extra))
+                click.echo(
+                    f"{size_name:>5} doc, budget {budget_name:<7} -> {routing['model_id']:<45} "
+                    f"{elapsed:6.0f} ms  ({routing['reason']})"
+                )
+
+
+if __name__ == "__main__":
+    main()
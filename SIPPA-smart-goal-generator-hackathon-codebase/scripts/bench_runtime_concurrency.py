@@ -0,0 +1,55 @@
+#!/usr/bin/python
+"""
+Concurrent-session throughput of one runtime container, using the local
+Bedrock stand-in (no AWS calls).
+
+  serial : one invocation at a time, as the synchronous entrypoint behaved
+  async  : SESSIONS invocations in flight, bounded by SMARTGOAL_MAX_CONCURRENCY
+
+    python -m scripts.bench_runtime_concurrency --sessions 32 --latency-ms 800
+"""
+import asyncio
+import os
+import time
+
+import click
+
+
+@click.command()
+@click.option("--sessions", default=32, show_default=True, help="Number of simulated user sessions.")
+@click.option("--latency-ms", default=800, show_default=True, help="Fake model latency.")
+@click.option("--eval-latency-ms", default=1500, show_default=True, help="Fake evaluator latency.")
+@click.option("--max-concurrency", default=16, show_default=True, help="Per-container limit.")
+def main(sessions, latency_ms, eval_latency_ms, max_concurrency):
+    """Compare serial vs async invocation throughput."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = str(eval_latency_ms)
+    os.environ["SMARTGOAL_MAX_CONCURRENCY"] = str(max_concurrency)
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import install
+
+    install()
+
+    payloads = [
+        {"prompt": f"Patient {i}: A1c 8.9, sedentary, drinks soda daily.", "model_id": runtime.MODEL_ID}
+        for i in range(sessions)
+    ]
+
+    async def serial():
+        for p in payloads:
+            await runtime.invoke(p)
+
+    async def concurrent():
+        await asyncio.gather(*(runtime.invoke(p) for p in payloads))
+
+    for name, fn in (("serial", serial), ("async", concurrent)):
+        started = time.perf_counter()
+        asyncio.run(fn())
+        elapsed = time.perf_counter() - started
+        click.echo(f"{name:>6}: {sessions} sessions in {elapsed:6.2f} s  ->  {sessions / elapsed:6.2f} sessions/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+"""
+Text upload decoding: the previous fallback (a full UTF-8 decode, then a second
+full Latin-1 decode when that fails) versus decode_text (encoding detected from
+a sample, one decode, control-character noise stripped). Generates multi-MB
+EHR-style exports in several encodings and compares time, output size and
+how many characters of noise or mojibake reach the model.
+
+    python -m scripts.bench_text_decoding --size-mb 8 --runs 5
+"""
+import codecs
+import re
+import statistics
+import time
+
+import click
+
+from lab_helpers.smartgoalgenerator_extractors import decode_text, detect_encoding
+
+ROW = "{i},Jos\xe9 N\xfa\xf1ez,2024-03-{d:02d},A1c,8.{d},%,“walks 20 min” – follow up\r\n"
+# Characters that should never reach the model: controls, BOMs, replacement
+# characters, and C1 controls / "Ã"-style sequences left by a wrong 8-bit decode
+_NOISE = re.compile("[\x00-\x08\x0b-\x1f\x7f-\x9f\ufeff\ufffd]|\xc3[\x80-\xbf]|\xe2\x80")
+
+
+def _export(size_mb: float, noise: bool = False) -> str:
+    rows, total, i = [], 0, 0
+    while total < size_mb * 1024 * 1024:
+        row = ROW.format(i=i, d=i % 28 + 1)
+        if noise and i % 10 == 0:
+            row = row.replace(",A1c", "\x00\x00\x00,A1c\x1b[0m")  # NUL padding and terminal escapes
+        rows.append(row)
+        total += len(row)
+        i += 1
+    return "".join(rows)
+
+
+def _cases(size_mb: float) -> dict:
+    text = _export(size_mb)
+    ascii_head = "".join(f"{n},Header row {n} without accents\r\n" for n in range(4000))
+    return {
+        "utf-8": text.encode("utf-8"),
+        "utf-8 + NUL/ESC noise": _export(size_mb, noise=True).encode("utf-8"),
+        "cp1252": text.encode("cp1252"),
+        "cp1252, ASCII head": (ascii_head + text).encode("cp1252"),
+        "utf-16 (BOM)": text.encode("utf-16"),
+    }
+
+
+def _decode_previous(content: bytes) -> str:
+    for bom, encoding in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"),
+                          (codecs.BOM_UTF16_BE, "utf-16")):
+        if content.startswith(bom):
+            return content.decode(encoding, errors="replace")
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return content.decode("latin-1", errors="ignore")
+
+
+DECODERS = {"previous": _decode_previous, "decode_text": decode_text}
+
+
+@click.command()
+@click.option("--size-mb", default=8.0, show_default=True, help="Approximate size of each export.")
+@click.option("--runs", default=5, show_default=True)
+def main(size_mb, runs):
+    """Print median decode time, output characters and noise characters per encoding."""
+    for case, content in _cases(size_mb).items():
+        click.echo(f"{case} ({len(content) / 1024 / 1024:.1f} MB, detected {detect_encoding(content)}):")
+        for name, decode in DECODERS.items():
+            times = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                text = decode(content)
+                times.append((time.perf_counter() - started) * 1000)
+            noise = sum(1 for _ in _NOISE.finditer(text))
+            click.echo(f"  {name:>12}: {statistics.median(times):7.1f} ms  {len(text):>9} chars  "
+                       f"{noise:>7} noise/mojibake chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+"""
+Adaptive concurrency under a simulated Bedrock quota, using the local stand-in
+(no AWS calls). The fake provider throttles any call beyond QUOTA in flight per
+model; the runtime's AIMD limiter should settle near the quota with few
+throttles and no failed sessions.
+
+    python -m scripts.bench_throttling --sessions 64 --quota 6 --latency-ms 400
+"""
+import asyncio
+import json
+import os
+import time
+
+import click
+
+
+@click.command()
+@click.option("--sessions", default=64, show_default=True, help="Number of simulated user sessions.")
+@click.option("--quota", default=6, show_default=True, help="Concurrent calls per model before throttling.")
+@click.option("--throttle-rate", default=0.0, show_default=True, help="Extra random throttle probability.")
+@click.option("--latency-ms", default=400, show_default=True, help="Fake model latency.")
+@click.option("--max-concurrency", default=64, show_default=True, help="Per-container limit.")
+def main(sessions, quota, throttle_rate, latency_ms, max_concurrency):
+    """Run SESSIONS concurrent invocations against a quota-limited fake model."""
+    os.environ["SMARTGOAL_FAKE_LATENCY_MS"] = str(latency_ms)
+    os.environ["SMARTGOAL_FAKE_EVAL_LATENCY_MS"] = "0"
+    os.environ["SMARTGOAL_FAKE_QUOTA"] = str(quota)
+    os.environ["SMARTGOAL_FAKE_THROTTLE_RATE"] = str(throttle_rate)
+    os.environ["SMARTGOAL_MAX_CONCURRENCY"] = str(max_concurrency)
+    os.environ.setdefault("SMARTGOAL_EVALUATOR_RUNTIME_ARN", "arn:aws:bedrock-agentcore:local:0:runtime/fake")
+
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+    from scripts.fake_provider import get_fake_provider, install
+
+    install()
+
+    model_id = runtime.MODEL_ID
+    payloads = [
+        {"prompt": f"Patient {i}: A1c 8.9, sedentary, drinks soda daily.", "model_id": model_id}
+        for i in range(sessions)
+    ]
+
+    async def run():
+        return await asyncio.gather(*(runtime.invoke(p) for p in payloads))
+
+    started = time.perf_counter()
+    responses = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for r in responses:
+        statuses[r["statusCode"]] = statuses.get(r["statusCode"], 0) + 1
+    metrics = json.loads(asyncio.run(runtime.invoke({"action": "metrics"}))["body"])["concurrency"]
+
+    click.echo(f"{sessions} sessions in {elapsed:.2f} s ({sessions / elapsed:.2f} sessions/s)")
+    click.echo(f"status codes : {statuses}")
+    click.echo(f"provider     : {get_fake_provider().stats}")
+    click.echo(f"limiter      : {metrics.get(model_id)}")
+
+
+if __name__ == "__main__":
+    main()
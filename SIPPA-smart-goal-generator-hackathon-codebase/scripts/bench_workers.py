@@ -0,0 +1,142 @@
+#!/usr/bin/python
+"""
+Mixed CPU and I/O load against the runtime server at 1, 2 and 4 workers,
+using the local Bedrock stand-in. CPU clients upload a text-heavy PDF (PyPDF2
+extraction holds the GIL); I/O clients send plain prompts that only wait on the
+fake model. No AWS calls; needs uvicorn and PyPDF2 installed.
+
+    python -m scripts.bench_workers --workers 1 2 4 --duration-s 20
+"""
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import click
+import requests
+
+
+def _pdf_bytes(pages: int, lines_per_page: int) -> bytes:
+    """A minimal PDF whose pages are full of text operators (slow to extract in pure Python)."""
+    text = " ".join(
+        f"(Line {i}: A1c 8.9, BP 142/91, sedentary, two sodas a day, follow up in 3 months.) Tj T*"
+        for i in range(lines_per_page)
+    )
+    stream = f"BT /F1 8 Tf 10 TL 20 820 Td {text} ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(f"{5 + i} 0 R".encode() for i in range(pages))
+        + f"] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+    ]
+    objects += [
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 3 0 R >> >> /Contents 4 0 R >>"
+        for _ in range(pages)
+    ]
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(workers: int, port: int, tmp: str, latency_ms: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "SMARTGOAL_WORKERS": str(workers),
+        "SMARTGOAL_PORT": str(port),
+        "SMARTGOAL_EXTRACTION_CACHE": "0",  # every upload must be parsed
+        "SMARTGOAL_SHARED_CACHE": os.path.join(tmp, f"shared_{workers}.sqlite"),
+        "SMARTGOAL_FAKE_LATENCY_MS": str(latency_ms),
+        "SMARTGOAL_FAKE_JITTER_MS": "0",
+        "SMARTGOAL_MAX_CONCURRENCY": "256",
+        "SMARTGOAL_EVALUATOR_RUNTIME_ARN": "arn:aws:bedrock-agentcore:local:0:runtime/fake",
+    }
+    env.pop("DOCKER_CONTAINER", None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "scripts.fake_runtime"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/ping", timeout=1).ok:
+                return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.kill()
+    raise click.ClickException(f"Server with {workers} workers did not become ready")
+
+
+@click.command()
+@click.option("--workers", "worker_counts", multiple=True, type=int, default=(1, 2, 4), show_default=True)
+@click.option("--cpu-clients", default=4, show_default=True, help="Clients uploading the PDF in a loop.")
+@click.option("--io-clients", default=16, show_default=True, help="Clients sending plain prompts in a loop.")
+@click.option("--duration-s", default=20.0, show_default=True)
+@click.option("--pages", default=30, show_default=True, help="Pages in the synthetic PDF.")
+@click.option("--latency-ms", default=300, show_default=True, help="Fake model latency.")
+def main(worker_counts, cpu_clients, io_clients, duration_s, pages, latency_ms):
+    """Print I/O request latency and throughput of both request kinds per worker count."""
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "summary.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(_pdf_bytes(pages, 60))
+
+        for workers in worker_counts:
+            port = _free_port()
+            server = _start_server(workers, port, tmp, latency_ms)
+            url = f"http://127.0.0.1:{port}/invocations"
+            latencies = {"cpu": [], "io": []}
+            stop_at = time.time() + duration_s
+
+            def client(kind: str, n: int):
+                i = 0
+                while time.time() < stop_at:
+                    prompt = f"Patient {n}-{i}: A1c 8.9, sedentary, drinks soda daily."
+                    if kind == "cpu":
+                        # The runtime deletes processed uploads, so every request gets its own copy
+                        path = os.path.join(tmp, f"upload_{workers}_{n}_{i}.pdf")
+                        shutil.copyfile(pdf_path, path)
+                        prompt = f"Generate SMART goals. [UPLOADED_FILE: {path}]"
+                    started = time.perf_counter()
+                    response = requests.post(url, json={"prompt": prompt, "evaluate": False}, timeout=300)
+                    if response.ok:
+                        latencies[kind].append((time.perf_counter() - started) * 1000)
+                    i += 1
+
+            threads = [threading.Thread(target=client, args=("cpu", n)) for n in range(cpu_clients)]
+            threads += [threading.Thread(target=client, args=("io", n)) for n in range(io_clients)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            server.terminate()
+            server.wait(timeout=30)
+
+            io, cpu = sorted(latencies["io"]), sorted(latencies["cpu"])
+            click.echo(
+                f"{workers} worker(s): io p50 {statistics.median(io):6.0f} ms  "
+                f"p95 {io[int(len(io) * 0.95)]:6.0f} ms  io {len(io) / duration_s:5.1f}/s  "
+                f"pdf {len(cpu) / duration_s:5.2f}/s (p50 {statistics.median(cpu):6.0f} ms)"
+            )
+
+
+if __name__ == "__main__":
+    main()
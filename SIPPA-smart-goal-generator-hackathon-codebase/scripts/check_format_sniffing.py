@@ -0,0 +1,55 @@
+#!/usr/bin/python
+"""
+Regression cases for sniff_format: uploads that were detected as the wrong
+format (e.g. clinical prose with commas parsed as a CSV table). Prints one
+line per case and exits non-zero if any case is detected wrongly.
+
+    python -m scripts.check_format_sniffing
+"""
+import sys
+
+import click
+
+from lab_helpers.smartgoalgenerator_extractors import sniff_format
+
+PROSE = (
+    "Patient reports fatigue, dizziness, and occasional nausea after meals.\n"
+    "She walks twice a week, mostly on weekends, and drinks two sodas a day.\n"
+    "A1c was 8.9 in March, up from 8.1, and she would like to lose 10 lb.\n"
+    "Discussed diet, exercise, and a referral to the diabetes educator.\n"
+)
+LABS = "Date,Lab,Value,Unit\n2024-03-01,A1c,8.9,%\n2024-03-01,LDL,131,mg/dL\n2024-06-02,A1c,8.1,%\n"
+HEADERLESS = "".join(f"2024-03-{d:02d},A1c,8.{d},%\n" for d in range(1, 7))
+
+# (name, uri, content, expected format)
+CASES = [
+    ("comma prose, .txt", "s3://bucket/note.txt", PROSE.encode(), "text"),
+    ("comma prose, no extension", "s3://bucket/note", PROSE.encode(), "text"),
+    ("comma prose, unknown extension", "s3://bucket/note.dat", PROSE.encode(), "text"),
+    ("comma prose, CRLF", "s3://bucket/note", PROSE.replace("\n", "\r\n").encode("cp1252"), "text"),
+    ("lab table, .txt", "s3://bucket/labs.txt", LABS.encode(), "text"),
+    ("lab table, .csv", "s3://bucket/labs.csv", LABS.encode(), "csv"),
+    ("lab table with header, no extension", "s3://bucket/labs", LABS.encode(), "csv"),
+    ("tab-separated with header, no extension", "s3://bucket/labs", LABS.replace(",", "\t").encode(), "csv"),
+    ("headerless table, no extension", "s3://bucket/labs", HEADERLESS.encode(), "csv"),
+    ("short headerless table, no extension", "s3://bucket/labs", HEADERLESS[:90].encode(), "text"),
+    ("PDF named .txt", "s3://bucket/summary.txt", b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n1 0 obj\n", "pdf"),
+    ("FHIR bundle, .txt", "s3://bucket/export.txt", b'{"resourceType": "Bundle", "entry": []}', "fhir_json"),
+]
+
+
+@click.command()
+def main():
+    """Run every case and report mismatches."""
+    failures = 0
+    for name, uri, content, expected in CASES:
+        detected = sniff_format(content, uri)
+        ok = detected == expected
+        failures += not ok
+        click.echo(f"{'✅' if ok else '❌'} {name:<42} expected {expected:<9} got {detected}")
+    click.echo(f"{len(CASES) - failures}/{len(CASES)} cases passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
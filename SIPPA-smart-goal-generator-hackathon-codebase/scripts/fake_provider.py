@@ -0,0 +1,335 @@
+"""
+Local stand-in for Bedrock used by benchmarks and offline testing.
+
+FakeAgent mimics the parts of the Strands Agent API the runtime uses
+(__call__, invoke_async, stream_async) and FakeProvider simulates model
+latency, throttling and chatty output, so the runtime can be exercised without
+AWS credentials. install() points the runtime's model, agent and evaluator
+factories at it; the runtime itself has no knowledge of the stand-in.
+
+Environment knobs (all optional):
+    SMARTGOAL_FAKE_LATENCY_MS        mean generation latency          (default 800)
+    SMARTGOAL_FAKE_JITTER_MS         +/- uniform jitter               (default 100)
+    SMARTGOAL_FAKE_EVAL_LATENCY_MS   evaluator runtime latency        (default 1500)
+    SMARTGOAL_FAKE_QUOTA             concurrent calls per model before
+                                     ThrottlingException              (default 0 = unlimited)
+    SMARTGOAL_FAKE_THROTTLE_RATE     probability of a random throttle (default 0)
+    SMARTGOAL_FAKE_TRAILING_CHARS    prose emitted after the goals
+                                     object, like Mistral             (default 0)
+    SMARTGOAL_FAKE_MALFORMED_RATE    probability of broken JSON in a
+                                     free-text answer                 (default 0)
+    SMARTGOAL_FAKE_MODEL_LATENCY_MS  per-model mean latency overrides,
+                                     "mistral=300,anthropic=2500"; keys
+                                     match as model id substrings     (default none)
+    SMARTGOAL_FAKE_TAIL_RATE         probability of a tail-latency spike
+                                     before the first token           (default 0)
+    SMARTGOAL_FAKE_TAIL_MS           length of a spike                (default 20000)
+    SMARTGOAL_FAKE_EVAL_COLD_MS      extra evaluator latency on a new
+                                     (or session-less) instance       (default 0)
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+class FakeThrottlingException(Exception):
+    """Shaped like botocore's ClientError for a ThrottlingException."""
+
+    def __init__(self, model_id: str):
+        self.response = {
+            "Error": {"Code": "ThrottlingException", "Message": f"Too many requests for {model_id}"}
+        }
+        super().__init__(f"An error occurred (ThrottlingException): Too many requests for {model_id}")
+
+
+class _FakeMetrics:
+    def __init__(self, input_tokens: int, output_tokens: int):
+        self.cycle_count = 1
+        self.accumulated_usage = {
+            "inputTokens": input_tokens,
+            "outputTokens": output_tokens,
+            "totalTokens": input_tokens + output_tokens,
+        }
+
+
+class FakeAgentResult:
+    """Same surface as strands AgentResult: message, metrics and str()."""
+
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.message = {"role": "assistant", "content": [{"text": text}]}
+        self.metrics = _FakeMetrics(len(prompt) // 4, len(text) // 4)
+
+    def __str__(self):
+        return self.text
+
+
+class FakeProvider:
+    """Simulated model endpoint with configurable latency and failure injection."""
+
+    def __init__(
+        self,
+        latency_ms: float = 800,
+        jitter_ms: float = 100,
+        eval_latency_ms: float = 1500,
+        quota: int = 0,
+        throttle_rate: float = 0.0,
+        trailing_chars: int = 0,
+        malformed_rate: float = 0.0,
+        model_latency_ms: Optional[Dict[str, float]] = None,
+        tail_rate: float = 0.0,
+        tail_ms: float = 20000,
+        eval_cold_ms: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.eval_latency_ms = eval_latency_ms
+        self.quota = quota
+        self.throttle_rate = throttle_rate
+        self.trailing_chars = trailing_chars
+        self.malformed_rate = malformed_rate
+        self.model_latency_ms = model_latency_ms or {}
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.eval_cold_ms = eval_cold_ms
+        self._warm_sessions = set()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {"calls": 0, "evaluations": 0, "throttles": 0, "streamed_chars": 0, "tail_spikes": 0}
+
+    # ----- simulated behaviour -----
+    def _latency_s(self, model_id: str) -> float:
+        latency_ms = next(
+            (ms for key, ms in self.model_latency_ms.items() if key in model_id), self.latency_ms
+        )
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, latency_ms + jitter) / 1000
+
+    def _tail_s(self) -> float:
+        """Occasional spike before the first token (a slow Bedrock stream start)."""
+        with self._lock:
+            if self._rng.random() >= self.tail_rate:
+                return 0.0
+            self.stats["tail_spikes"] += 1
+        return self.tail_ms / 1000
+
+    def _before_call(self, model_id: str):
+        """Count the call and inject a throttle when over quota or by chance."""
+        with self._lock:
+            self.stats["calls"] += 1
+            in_flight = self._in_flight.get(model_id, 0)
+            if (self.quota and in_flight >= self.quota) or self._rng.random() < self.throttle_rate:
+                self.stats["throttles"] += 1
+                raise FakeThrottlingException(model_id)
+            self._in_flight[model_id] = in_flight + 1
+
+    def _after_call(self, model_id: str):
+        with self._lock:
+            self._in_flight[model_id] -= 1
+
+    def output_for(self, model_id: str, prompt: str) -> str:
+        goals = self._goals_json()
+        if "BROKEN OUTPUT:" in prompt:
+            return goals  # the "fix this JSON" retry always succeeds
+        with self._lock:
+            malformed = self._rng.random() < self.malformed_rate
+            variant = self._rng.randrange(3)
+        if malformed:
+            goals = self._malformed(goals, variant)
+        if not self.trailing_chars:
+            return goals
+        chatter = (
+            "\n\nThese goals follow the SMART framework: each one is specific, measurable, "
+            "achievable, relevant and time-bound, and can be adjusted at the next visit."
+        )
+        return goals + (chatter * (self.trailing_chars // len(chatter) + 1))[: self.trailing_chars]
+
+    @staticmethod
+    def _malformed(goals: str, variant: int) -> str:
+        """Typical breakage: trailing comma + code fence, truncation, or prose-mangled JSON."""
+        if variant == 0:
+            return "```json\n" + goals.replace("}]}", "},]}") + "\n```"
+        if variant == 1:
+            return goals[: int(len(goals) * 0.8)]
+        return goals.replace('"description": "', "description: ").replace('."}', ".}")
+
+    def _goals_json(self) -> str:
+        return json.dumps({
+            "smart_goals": [
+                {"goal_number": 1, "description": "Walk 30 minutes at least 5 days a week for the next 4 weeks."},
+                {"goal_number": 2, "description": "Check fasting blood glucose every morning and log it for 2 weeks."},
+                {"goal_number": 3, "description": "Replace sugary drinks with water at lunch and dinner for 30 days."},
+            ]
+        })
+
+    # ----- model calls -----
+    def _generation_s(self, model_id: str, text: str) -> float:
+        """Latency covers the goals object; trailing text takes proportionally longer."""
+        return self._latency_s(model_id) * len(text) / max(len(self._goals_json()), 1)
+
+    def generate(self, model_id: str, prompt: str) -> str:
+        text = self.output_for(model_id, prompt)
+        self._before_call(model_id)
+        try:
+            time.sleep(self._tail_s() + self._generation_s(model_id, text))
+        finally:
+            self._after_call(model_id)
+        return text
+
+    async def generate_async(self, model_id: str, prompt: str) -> str:
+        text = self.output_for(model_id, prompt)
+        self._before_call(model_id)
+        try:
+            await asyncio.sleep(self._tail_s() + self._generation_s(model_id, text))
+        finally:
+            self._after_call(model_id)
+        return text
+
+    async def stream_async(self, model_id: str, prompt: str, chunk_chars: int = 16):
+        """Yield the output in chunks; latency is spread over the goals object, and trailing text costs extra."""
+        text = self.output_for(model_id, prompt)
+        per_char_s = self._latency_s(model_id) / max(len(self._goals_json()), 1)
+        self._before_call(model_id)
+        try:
+            await asyncio.sleep(self._tail_s())
+            for i in range(0, len(text), chunk_chars):
+                chunk = text[i:i + chunk_chars]
+                await asyncio.sleep(per_char_s * len(chunk))
+                with self._lock:
+                    self.stats["streamed_chars"] += len(chunk)
+                yield chunk
+        finally:
+            self._after_call(model_id)
+
+    async def evaluate_async(self, payload: dict, session_id: Optional[str] = None) -> dict:
+        """Evaluator runtime: a session's first call (or any call without a session) starts a cold instance."""
+        with self._lock:
+            cold = session_id is None or session_id not in self._warm_sessions
+            if session_id is not None:
+                self._warm_sessions.add(session_id)
+        if cold:
+            await asyncio.sleep(self.eval_cold_ms / 1000)
+        instance = {"cold_start": cold}
+        if payload.get("action") == "ping":
+            return {"statusCode": 200, "body": json.dumps({"status": "ready", "instance": instance})}
+
+        with self._lock:
+            self.stats["evaluations"] += 1
+        await asyncio.sleep(self.eval_latency_ms / 1000)
+        goals = (payload.get("analyzer_payload") or {}).get("smart_goals") or []
+        scores = [
+            {"case_id": f"goal_{g.get('goal_number')}", "metric_scores": {"specific": 0.8}, "agreement": "n/a", "notes": "fake"}
+            for g in goals
+        ]
+        body = {
+            "evaluator_output": {"evaluation_type": "smart_goals_rubric", "cases_scored": len(scores), "scores": scores},
+            "instance": instance,
+        }
+        return {"statusCode": 200, "body": json.dumps(body)}
+
+
+class FakeAgent:
+    """Drop-in for strands.Agent backed by a FakeProvider."""
+
+    def __init__(self, provider: FakeProvider, model_id: str, system_prompt: Optional[str] = None, tools=None,
+                 **_agent_kwargs):
+        self.provider = provider
+        self.model_id = model_id
+        self.system_prompt = system_prompt or ""
+        self.tools = tools or []
+        self.messages = []
+
+    def __call__(self, prompt: str) -> FakeAgentResult:
+        text = self.provider.generate(self.model_id, prompt)
+        return FakeAgentResult(text, self.system_prompt + prompt)
+
+    async def invoke_async(self, prompt: str) -> FakeAgentResult:
+        text = await self.provider.generate_async(self.model_id, prompt)
+        return FakeAgentResult(text, self.system_prompt + prompt)
+
+    async def structured_output_async(self, output_model, prompt: str):
+        """Forced tool call: the answer always matches the schema."""
+        await self.provider.generate_async(self.model_id, prompt)
+        return output_model.model_validate_json(self.provider._goals_json())
+
+    async def stream_async(self, prompt: str):
+        parts = []
+        async for chunk in self.provider.stream_async(self.model_id, prompt):
+            parts.append(chunk)
+            yield {"data": chunk}
+        yield {"result": FakeAgentResult("".join(parts), self.system_prompt + prompt)}
+
+
+_provider: Optional[FakeProvider] = None
+
+
+def _parse_model_latency(spec: str) -> Dict[str, float]:
+    """Parse "mistral=300,anthropic=2500" into {"mistral": 300.0, "anthropic": 2500.0}."""
+    out = {}
+    for item in spec.split(","):
+        key, _, ms = item.partition("=")
+        if key.strip() and ms.strip():
+            out[key.strip()] = float(ms)
+    return out
+
+
+def get_fake_provider() -> FakeProvider:
+    """Process-wide provider configured from the SMARTGOAL_FAKE_* environment variables."""
+    global _provider
+    if _provider is None:
+        _provider = FakeProvider(
+            latency_ms=float(os.environ.get("SMARTGOAL_FAKE_LATENCY_MS", "800")),
+            jitter_ms=float(os.environ.get("SMARTGOAL_FAKE_JITTER_MS", "100")),
+            eval_latency_ms=float(os.environ.get("SMARTGOAL_FAKE_EVAL_LATENCY_MS", "1500")),
+            quota=int(os.environ.get("SMARTGOAL_FAKE_QUOTA", "0")),
+            throttle_rate=float(os.environ.get("SMARTGOAL_FAKE_THROTTLE_RATE", "0")),
+            trailing_chars=int(os.environ.get("SMARTGOAL_FAKE_TRAILING_CHARS", "0")),
+            malformed_rate=float(os.environ.get("SMARTGOAL_FAKE_MALFORMED_RATE", "0")),
+            model_latency_ms=_parse_model_latency(os.environ.get("SMARTGOAL_FAKE_MODEL_LATENCY_MS", "")),
+            tail_rate=float(os.environ.get("SMARTGOAL_FAKE_TAIL_RATE", "0")),
+            tail_ms=float(os.environ.get("SMARTGOAL_FAKE_TAIL_MS", "20000")),
+            eval_cold_ms=float(os.environ.get("SMARTGOAL_FAKE_EVAL_COLD_MS", "0")),
+        )
+    return _provider
+
+
+def set_fake_provider(provider: FakeProvider):
+    """Use a specific provider (benchmarks/tests)."""
+    global _provider
+    _provider = provider
+
+
+def install(provider: Optional[FakeProvider] = None, idempotency: bool = False) -> FakeProvider:
+    """
+    Replace the runtime's client factories (_acquire_model, _create_agent,
+    _call_evaluator) so every model and evaluator call goes to provider
+    (default: the one configured from SMARTGOAL_FAKE_*). Returns the provider.
+    Idempotent replay is off unless asked for, so every bench request runs the
+    pipeline instead of replaying an identical earlier one.
+    """
+    from lab_helpers import smartgoalgenerator_runtime as runtime
+
+    if provider is not None:
+        set_fake_provider(provider)
+    provider = get_fake_provider()
+
+    def _acquire_model(model_id: str, region: Optional[str] = None):
+        return None
+
+    def _create_agent(model_id: str, model=None, **agent_kwargs) -> FakeAgent:
+        return FakeAgent(provider, model_id, **agent_kwargs)
+
+    async def _call_evaluator(payload: dict, runtime_arn: Optional[str] = None, session_id: Optional[str] = None):
+        return await provider.evaluate_async(payload, session_id)
+
+    runtime._acquire_model = _acquire_model
+    runtime._create_agent = _create_agent
+    runtime._call_evaluator = _call_evaluator
+    runtime.IDEMPOTENCY_ENABLED = idempotency
+    return provider
@@ -0,0 +1,17 @@
+#!/usr/bin/python
+"""
+The runtime server with every model and evaluator call going to the local
+stand-in (scripts/fake_provider.py, configured by the SMARTGOAL_FAKE_*
+variables). Server workers import this module's app, so each installs the
+stand-in before it serves. Used by scripts.bench_workers.
+
+    SMARTGOAL_WORKERS=2 python -m scripts.fake_runtime
+"""
+from lab_helpers import smartgoalgenerator_runtime as runtime
+from scripts.fake_provider import install
+
+install()
+app = runtime.app
+
+if __name__ == "__main__":
+    runtime._serve("scripts.fake_runtime:app")
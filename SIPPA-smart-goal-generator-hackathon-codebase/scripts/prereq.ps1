@@ -56,14 +56,20 @@ try {
 
 # ----- 2. Zip Lambda code -----
 Write-Host "Zipping contents of $LambdaSrc into $ZipFile..." -ForegroundColor Cyan
+# fetch_data uses the runtime's extractor registry (standard library only)
+$ExtractorsCopy = Join-Path $LambdaSrc "smartgoalgenerator_extractors.py"
+Copy-Item "lab_helpers/smartgoalgenerator_extractors.py" -Destination $ExtractorsCopy -Force
 Push-Location $LambdaSrc
 try {
     Compress-Archive -Path "." -DestinationPath "../../../$ZipFile" -Force
 } catch {
     Write-Host "Failed to create zip file. Ensure you have PowerShell 5.0+ or install 7-Zip." -ForegroundColor Red
+    Pop-Location
+    Remove-Item $ExtractorsCopy -Force
     exit 1
 }
 Pop-Location
+Remove-Item $ExtractorsCopy -Force
 
 # ----- 3. Upload to S3 -----
 Write-Host "Uploading $ZipFile to s3://$FullBucketName/$S3Key..." -ForegroundColor Cyan
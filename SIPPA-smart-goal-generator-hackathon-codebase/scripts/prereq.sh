@@ -62,8 +62,11 @@ echo "✅ S3 bucket ownership verified"
 # ----- 2. Zip Lambda code -----
 sudo apt install zip
 echo "📦 Zipping contents of $LAMBDA_SRC into $ZIP_FILE..."
+# fetch_data uses the runtime's extractor registry (standard library only)
+cp lab_helpers/smartgoalgenerator_extractors.py "$LAMBDA_SRC/"
 cd "$LAMBDA_SRC"
 zip -r "../../../$ZIP_FILE" . > /dev/null
+rm -f smartgoalgenerator_extractors.py
 
 cd - > /dev/null
 